@@ -0,0 +1,73 @@
+# benchmarks/backtest_benchmark.py
+#
+# 参数扫描基准测试：在排名立方体上评估 config.SWEEP_GRID 的全部组合，比较单进程与多进程的吞吐量，
+# 并抽样与 ScreeningPanel.screen 的结果核对。数值条件的列中混入恰好等于阈值和比阈值略小一点的取值，
+# 检查排名立方体的数值比较与 float64 的比较结果一致。
+# 用法：python benchmarks/backtest_benchmark.py --stocks 5000 --periods 14
+
+import sys
+import os
+import time
+import argparse
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import numpy as np
+from config import SWEEP_GRID
+import screening
+import backtest
+from screening_benchmark import make_panel_frame
+
+def add_boundary_values(df, share=0.01, seed=1):
+    """
+    将数值条件列中 share 比例的取值改为某个候选阈值，同样比例改为比阈值小一个 float64 最小间隔的值。
+    """
+    rng = np.random.default_rng(seed)
+    for metric, _, thresholds in SWEEP_GRID['criteria']:
+        for threshold in thresholds:
+            if screening._is_quantile(threshold):
+                continue
+            for value in (threshold, np.nextafter(threshold, -np.inf)):
+                df.loc[rng.uniform(size=len(df)) < share, metric] = value
+    return df
+
+def run(n_stocks, n_periods, sample_size=200):
+    df = add_boundary_values(make_panel_frame(n_stocks, n_periods))
+    metrics = [metric for metric, _, _ in SWEEP_GRID['criteria']]
+    panel = screening.ScreeningPanel(df, metrics)
+
+    start = time.perf_counter()
+    cube = backtest.RankCube.from_panel(panel, metrics)
+    build_seconds = time.perf_counter() - start
+    cube_mb = (cube.ranks.nbytes + cube.values.nbytes) / 1e6
+    print(f"规模：{n_stocks} 只股票 × {n_periods} 个报告期 × {len(metrics)} 个指标")
+    print(f"构建排名立方体：{build_seconds * 1000:.0f} ms，{cube_mb:.1f} MB")
+
+    for workers in (1, None):
+        start = time.perf_counter()
+        results = backtest.sweep(cube, SWEEP_GRID, workers=workers)
+        seconds = time.perf_counter() - start
+        label = '单进程' if workers == 1 else f'{os.cpu_count()} 个进程'
+        print(f"{label}：评估 {len(results)} 组条件 {seconds:.2f} 秒，每秒 {len(results) / seconds:.0f} 组")
+
+    matches = True
+    for _, row in results.sample(min(sample_size, len(results)), random_state=0).iterrows():
+        criteria = []
+        for metric, op, _ in SWEEP_GRID['criteria']:
+            label = row[f'{metric}{op}']
+            threshold = screening.quantile(float(label[1:])) if isinstance(label, str) else float(label)
+            criteria.append((metric, op, threshold))
+        expected = set(panel.codes[panel.screen(criteria, int(row['统计期数']), int(row['最少满足次数']))])
+        actual = set(row['股票代码'].split(',')) if row['股票代码'] else set()
+        matches &= expected == actual
+    print(f"抽样 {sample_size} 组与 ScreeningPanel.screen 一致：{matches}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='参数扫描基准测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=14)
+    args = parser.parse_args()
+    run(args.stocks, args.periods)
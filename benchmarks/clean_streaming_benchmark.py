@@ -0,0 +1,81 @@
+# benchmarks/clean_streaming_benchmark.py
+#
+# 对比清洗阶段一次性合并（batch）与逐个报告期流式处理（streaming）的耗时和峰值内存。
+# 用法：python benchmarks/clean_streaming_benchmark.py --stocks 5000 --periods 100
+#
+# 默认使用季度报告期，模拟 2000 年以来约 100 个报告期的规模。子进程使用系统内存分配器
+# （ARROW_DEFAULT_MEMORY_POOL=system），避免 mimalloc 保留已释放内存影响峰值内存的比较。
+
+import sys
+import os
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+from config import STATEMENT_TYPES
+import synthetic
+
+RESULT_MARKER = 'BENCHMARK_RESULT '
+MODES = ('batch', 'streaming')
+
+def run_clean(mode, report_dates):
+    """
+    在当前目录下以指定模式运行清洗阶段，返回耗时和峰值内存。
+    """
+    import warnings
+    warnings.simplefilter('ignore')
+    import data_clean
+
+    start = time.perf_counter()
+    for statement_type in STATEMENT_TYPES:
+        data_clean.clean_financial_statements(report_dates, statement_type, use_cache=False,
+                                              streaming=(mode == 'streaming'))
+    wall = time.perf_counter() - start
+    # Linux 下 ru_maxrss 单位为 KB
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'mode': mode, 'wall_seconds': round(wall, 3), 'peak_rss_mb': round(peak_rss_mb, 1)}
+
+def bench_mode(mode, workdir, report_dates):
+    env = dict(os.environ, ARROW_DEFAULT_MEMORY_POOL='system')
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', mode, '--dates', ','.join(report_dates)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"{mode} 基准测试没有输出结果：\n{completed.stderr}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='流式清洗基准测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=100)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--dates', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_clean(args.child, args.dates.split(','))
+        print(RESULT_MARKER + json.dumps(result))
+        sys.exit(0)
+
+    report_dates = synthetic.make_report_dates(args.periods, quarterly=True)
+    print(f"规模：{args.stocks} 只股票 × {len(report_dates)} 个报告期 × {len(STATEMENT_TYPES)} 张报表")
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            synthetic.write_raw_dataset(report_dates, args.stocks)
+        finally:
+            os.chdir(cwd)
+        results = [bench_mode(mode, workdir, report_dates) for mode in MODES]
+    print(f"{'模式':<12}{'耗时(秒)':>12}{'峰值内存(MB)':>16}")
+    for result in results:
+        print(f"{result['mode']:<12}{result['wall_seconds']:>12.2f}{result['peak_rss_mb']:>16.1f}")
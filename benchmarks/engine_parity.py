@@ -0,0 +1,221 @@
+# benchmarks/engine_parity.py
+#
+# pandas 与 polars 执行引擎的一致性检查：用同一份合成原始数据分别运行清洗、分析、宽表和选股，
+# 逐表逐列比较两者的结果（列名、顺序、类型和取值须完全相同），并对比耗时和峰值内存。
+# 原始数据中会随机删除部分行（模拟停牌、新上市造成的缺期）、加入重复行和同键不同值的行，并把部分分母置零，
+# 覆盖回看、去重和分母为零的处理。存在差异，或含分红条件的选股结果为空时以非零状态退出。
+# 用法：python benchmarks/engine_parity.py --stocks 2000 --periods 40 --quarterly [--backend csv]
+
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import numpy as np
+import pandas as pd
+from config import STATEMENT_CONFIG, STATEMENT_TYPES
+import synthetic
+
+RESULT_MARKER = 'BENCHMARK_RESULT '
+ENGINES = ('pandas', 'polars')
+
+# 各报表中置零的分母列
+ZERO_COLUMNS = {
+    'income_statement': ['营业总收入', '营业总支出-营业支出'],
+    'cash_flow_statement': ['经营性现金流-现金流量净额'],
+    'balance_sheet': ['股东权益合计', '负债-应付账款', '负债-预收账款'],
+    'dividend': ['每股收益', '现金分红-现金分红比例'],
+}
+
+# 默认选股条件在合成数据上常常选不出股票，另用一组较宽松的分位数条件检查窗口计算和计数
+QUANTILE_SELECTION = {
+    'criteria': [('营业收入', '>=', ('quantile', 0.5)), ('资产总额 / 营业收入', '<=', ('quantile', 0.6))],
+    'window': 3,
+    'min_passes': 2,
+    'output_file': os.path.join('data', 'analysis', 'selected_quantile.csv'),
+}
+# 含分红指标的条件：分红只有年报，季度报告期的宽表行缺少分红列，须只在条件列都有取值的行上选股，
+# 否则季度数据上统计期数内凑不够满足次数。该条件在年度和季度报告期上都必须选出股票
+DIVIDEND_SELECTION = {
+    'criteria': [('营业收入', '>=', ('quantile', 0.5)), ('股息率', '>=', 0)],
+    'window': 3,
+    'min_passes': 2,
+    'output_file': os.path.join('data', 'analysis', 'selected_dividend.csv'),
+}
+SELECTION_FILES = [os.path.join('data', 'analysis', 'selected_stocks.csv'), QUANTILE_SELECTION['output_file'],
+                   DIVIDEND_SELECTION['output_file']]
+NONEMPTY_SELECTIONS = [DIVIDEND_SELECTION['output_file']]
+
+def perturb_raw(report_dates, seed=0, drop=0.05, zero=0.02, duplicate=0.01, conflict=0.01):
+    """
+    在当前目录下改写合成原始数据：删除 drop 比例的行，把 zero 比例的分母置零，复制 duplicate 比例的行，
+    另复制 conflict 比例的行并改动其中的金额，检查各引擎按 (股票代码, 报告期) 去重时保留的是同一条。
+    """
+    import storage
+    import data_clean
+
+    rng = np.random.default_rng(seed)
+    for statement_type in STATEMENT_TYPES:
+        for report_date in report_dates:
+            path = data_clean.raw_table_path(statement_type, report_date)
+            backend, _ = storage.resolve_table(path)
+            df = storage.read_table(path)
+            df = df[rng.uniform(size=len(df)) >= drop]
+            for col in ZERO_COLUMNS[statement_type]:
+                df.loc[rng.uniform(size=len(df)) < zero, col] = 0
+            conflicting = df[rng.uniform(size=len(df)) < conflict].copy()
+            conflicting[ZERO_COLUMNS[statement_type][0]] += 1
+            df = pd.concat([df, df[rng.uniform(size=len(df)) < duplicate], conflicting], ignore_index=True)
+            storage.write_table(df, path, backend=backend)
+
+def run_engine(engine, report_dates):
+    """
+    在当前目录下用指定引擎运行清洗、分析、宽表和选股，返回耗时和峰值内存。
+    """
+    import warnings
+    warnings.simplefilter('ignore')
+    import storage
+    import data_clean
+    import analysis
+    import fact_table
+    import stock_selection
+    import lazy_engine
+
+    start = time.perf_counter()
+    for statement_type in STATEMENT_TYPES:
+        config = STATEMENT_CONFIG[statement_type]
+        if engine == 'polars':
+            lazy_engine.clean_statement(report_dates, statement_type)
+            lazy_engine.analyze_statement(statement_type)
+        else:
+            data_clean.clean_financial_statements(report_dates, statement_type, use_cache=False)
+            getattr(analysis, config['analysis_function'])(
+                os.path.join('data', 'clean', config['clean_file']),
+                os.path.join('data', 'analysis', config['analysis_file']), use_cache=False)
+    # 宽表两种引擎都使用 pandas 实现，用于检查 polars 写出的分析表能被下游正常读取
+    fact_table.build_fact_table(use_cache=False)
+    select = lazy_engine.select_stocks if engine == 'polars' else stock_selection.select_stocks
+    select()
+    select(**QUANTILE_SELECTION)
+    select(**DIVIDEND_SELECTION)
+    wall = time.perf_counter() - start
+    # Linux 下 ru_maxrss 单位为 KB
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'engine': engine, 'wall_seconds': round(wall, 3), 'peak_rss_mb': round(peak_rss_mb, 1)}
+
+def bench_engine(engine, workdir, report_dates, backend):
+    env = dict(os.environ, ARROW_DEFAULT_MEMORY_POOL='system')
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', engine, '--dates', ','.join(report_dates),
+         '--backend', backend], cwd=workdir, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"{engine} 引擎没有输出结果：\n{completed.stderr[-3000:]}")
+
+def compare_frames(expected, actual):
+    """
+    逐列比较两个 DataFrame，返回差异说明列表。分类列比较取值而不比较类别的排列顺序，浮点列要求逐位相同。
+    """
+    if list(expected.columns) != list(actual.columns):
+        return [f"列不同：{list(expected.columns)} != {list(actual.columns)}"]
+    if len(expected) != len(actual):
+        return [f"行数不同：{len(expected)} != {len(actual)}"]
+    differences = []
+    for col in expected.columns:
+        left, right = expected[col], actual[col]
+        if isinstance(left.dtype, pd.CategoricalDtype) or isinstance(right.dtype, pd.CategoricalDtype):
+            if not (isinstance(left.dtype, pd.CategoricalDtype) and isinstance(right.dtype, pd.CategoricalDtype)):
+                differences.append(f"{col} 类型不同：{left.dtype} != {right.dtype}")
+            elif not left.astype(object).equals(right.astype(object)):
+                differences.append(f"{col} 取值不同")
+            continue
+        if left.dtype != right.dtype:
+            differences.append(f"{col} 类型不同：{left.dtype} != {right.dtype}")
+        elif not np.array_equal(left.to_numpy(), right.to_numpy(), equal_nan=left.dtype.kind == 'f'):
+            mismatch = ~((left == right) | (left.isna() & right.isna()))
+            differences.append(f"{col} 有 {int(mismatch.sum())} 个取值不同，如第 {mismatch.idxmax()} 行："
+                               f"{left[mismatch.idxmax()]} != {right[mismatch.idxmax()]}")
+    return differences
+
+def compare_outputs(dirs):
+    """
+    比较两种引擎写出的各张表，返回 {表名: 差异说明列表}。
+    """
+    import storage
+
+    tables = [os.path.join('data', 'clean', STATEMENT_CONFIG[st]['clean_file']) for st in STATEMENT_TYPES]
+    tables += [os.path.join('data', 'analysis', STATEMENT_CONFIG[st]['analysis_file']) for st in STATEMENT_TYPES]
+    tables.append(os.path.join('data', 'analysis', 'fact_table'))
+    results = {}
+    for table in tables:
+        expected, actual = (storage.read_table(os.path.join(dirs[engine], table)) for engine in ENGINES)
+        results[storage.table_stem(table)] = compare_frames(expected, actual)
+    for selected in SELECTION_FILES:
+        expected, actual = (pd.read_csv(os.path.join(dirs[engine], selected), dtype={'股票代码': str})
+                            for engine in ENGINES)
+        results[selected] = compare_frames(expected, actual)
+        if selected in NONEMPTY_SELECTIONS and (expected.empty or actual.empty):
+            results[selected].append("没有选出股票")
+        elif results[selected] == [] and expected.empty:
+            print(f"提示：{selected} 两种引擎都没有选出股票")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='pandas 与 polars 执行引擎的一致性检查')
+    parser.add_argument('--stocks', type=int, default=1000)
+    parser.add_argument('--periods', type=int, default=20)
+    parser.add_argument('--quarterly', action='store_true', help='使用季度报告期')
+    parser.add_argument('--backend', choices=['parquet', 'csv'], default='parquet', help='原始数据和各阶段输出的存储格式')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--dates', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    import storage
+    storage.BACKEND = args.backend
+
+    if args.child:
+        result = run_engine(args.child, args.dates.split(','))
+        print(RESULT_MARKER + json.dumps(result))
+        sys.exit(0)
+
+    report_dates = synthetic.make_report_dates(args.periods, args.quarterly)
+    print(f"规模：{args.stocks} 只股票 × {len(report_dates)} 个报告期，存储格式 {args.backend}")
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, 'source')
+        os.makedirs(source)
+        cwd = os.getcwd()
+        os.chdir(source)
+        try:
+            synthetic.write_raw_dataset(report_dates, args.stocks, backend=args.backend)
+            perturb_raw(report_dates)
+        finally:
+            os.chdir(cwd)
+
+        dirs, results = {}, []
+        for engine in ENGINES:
+            dirs[engine] = os.path.join(workdir, engine)
+            shutil.copytree(os.path.join(source, 'data', 'raw'), os.path.join(dirs[engine], 'data', 'raw'))
+            results.append(bench_engine(engine, dirs[engine], report_dates, args.backend))
+        differences = compare_outputs(dirs)
+
+    print(f"{'引擎':<12}{'耗时(秒)':>12}{'峰值内存(MB)':>16}")
+    for result in results:
+        print(f"{result['engine']:<12}{result['wall_seconds']:>12.2f}{result['peak_rss_mb']:>16.1f}")
+    failed = False
+    for table, problems in differences.items():
+        print(f"{table}：{'一致' if not problems else '存在差异'}")
+        for problem in problems:
+            print(f"  - {problem}")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
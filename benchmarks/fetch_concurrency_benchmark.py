@@ -0,0 +1,121 @@
+# benchmarks/fetch_concurrency_benchmark.py
+#
+# 数据获取的并发检查：用固定延迟的替身接口（返回合成数据，不访问网络）代替 AkShare，
+# 运行 data_fetch.fetch_all_statements，记录每个接口和全部接口同时执行的调用数的峰值，
+# 以及第一次调用返回之前的并发数（线程池刚启动时应立即按各接口上限占满，不应有线程在等待接口名额）。
+# 每个接口的峰值超过其 fetch_concurrency，或启动时的并发数达不到 min(max_workers, 各接口上限之和)
+# 时以非零状态退出。
+# 用法：python benchmarks/fetch_concurrency_benchmark.py --periods 12 --quarterly [--latency 0.2] [--max-workers 8]
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+import threading
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+from config import STATEMENT_CONFIG, STATEMENT_TYPES, FETCH_MAX_WORKERS
+import synthetic
+
+class ConcurrencyProbe:
+    """
+    记录替身接口同时执行的调用数：每个接口的当前值和峰值，全部接口合计的峰值，
+    第一次调用返回之前的合计峰值，以及各次调用的总耗时（用于计算平均并发数）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = {}
+        self.peak = {}
+        self.total = 0
+        self.total_peak = 0
+        self.initial_peak = 0
+        self.returned = False
+        self.busy_seconds = 0.0
+
+    def _enter(self, statement_type):
+        with self._lock:
+            self.current[statement_type] = self.current.get(statement_type, 0) + 1
+            self.peak[statement_type] = max(self.peak.get(statement_type, 0), self.current[statement_type])
+            self.total += 1
+            self.total_peak = max(self.total_peak, self.total)
+            if not self.returned:
+                self.initial_peak = max(self.initial_peak, self.total)
+
+    def _exit(self, statement_type, seconds):
+        with self._lock:
+            self.current[statement_type] -= 1
+            self.total -= 1
+            self.returned = True
+            self.busy_seconds += seconds
+
+    def fetch_function(self, statement_type, latency, n_stocks):
+        """
+        返回替身接口：等待 latency 秒后返回合成的原始数据。
+        """
+        def fetch(date):
+            self._enter(statement_type)
+            start = time.perf_counter()
+            try:
+                time.sleep(latency)
+                return synthetic.generate_statement(statement_type, date, n_stocks)
+            finally:
+                self._exit(statement_type, time.perf_counter() - start)
+        fetch.__name__ = STATEMENT_CONFIG[statement_type]['fetch_function']
+        return fetch
+
+def run(report_dates, max_workers, latency, n_stocks):
+    import data_fetch
+
+    probe = ConcurrencyProbe()
+    data_fetch.get_fetch_function = lambda statement_type: probe.fetch_function(statement_type, latency, n_stocks)
+    start = time.perf_counter()
+    results = data_fetch.fetch_all_statements(report_dates, STATEMENT_TYPES, max_workers=max_workers, force=True)
+    wall = time.perf_counter() - start
+
+    units = {st: sum(1 for r in results if r['statement_type'] == st) for st in STATEMENT_TYPES}
+    limits = {st: STATEMENT_CONFIG[st].get('fetch_concurrency', 1) for st in STATEMENT_TYPES}
+    expected_total = min(max_workers, sum(min(limits[st], units[st]) for st in STATEMENT_TYPES))
+    # 每个接口按自己的上限分批执行所需的时间取最慢的接口，且不少于线程池占满时分批执行的时间
+    ideal = max([-(-units[st] // limits[st]) * latency for st in STATEMENT_TYPES if units[st]]
+                + [-(-len(results) // max_workers) * latency])
+
+    failed = False
+    print(f"\n{'接口':<24}{'单元数':>8}{'并发上限':>10}{'峰值':>8}")
+    for st in STATEMENT_TYPES:
+        peak = probe.peak.get(st, 0)
+        print(f"{st:<24}{units[st]:>8}{limits[st]:>10}{peak:>8}")
+        if peak > limits[st]:
+            print(f"  - {st} 的同时调用数超过了并发上限")
+            failed = True
+    print(f"合计峰值 {probe.total_peak}，启动时的并发数 {probe.initial_peak}，应达到 {expected_total}"
+          f"（max_workers={max_workers}）")
+    if probe.initial_peak < expected_total:
+        print("  - 启动时的总并发没有达到各接口上限之和，有线程占着线程池的位置等待接口名额")
+        failed = True
+    print(f"耗时 {wall:.2f} 秒（平均并发 {probe.busy_seconds / wall:.1f}），各接口按上限并发时的下限约 {ideal:.2f} 秒")
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='数据获取的接口并发检查（替身接口，不访问网络）')
+    parser.add_argument('--periods', type=int, default=12)
+    parser.add_argument('--quarterly', action='store_true', help='使用季度报告期')
+    parser.add_argument('--max-workers', type=int, default=FETCH_MAX_WORKERS, help='线程池大小')
+    parser.add_argument('--latency', type=float, default=0.2, help='替身接口每次调用的延迟（秒）')
+    parser.add_argument('--stocks', type=int, default=50, help='每次调用返回的股票数')
+    args = parser.parse_args()
+
+    report_dates = synthetic.make_report_dates(args.periods, args.quarterly)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            failed = run(report_dates, args.max_workers, args.latency, args.stocks)
+        finally:
+            os.chdir(cwd)
+    sys.exit(1 if failed else 0)
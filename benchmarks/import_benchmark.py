@@ -0,0 +1,88 @@
+# benchmarks/import_benchmark.py
+#
+# 命令行启动耗时的基准测试：在新的解释器进程中导入 finance 各子命令需要的模块，
+# 测量导入耗时和整个进程的耗时（含解释器启动），并检查是否导入了不需要的重型依赖。
+# 离线子命令（clean、analyze、select、run、shard）的导入耗时超过预算，或导入了 akshare、matplotlib、
+# polars、duckdb 时以非零状态退出；只解析命令行参数（finance --help）时不应导入 pandas。
+# 用法：python benchmarks/import_benchmark.py [--budget 1.5] [--repeat 5]
+
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+RESULT_MARKER = 'BENCHMARK_RESULT '
+
+# 离线子命令的导入耗时预算（秒）
+IMPORT_BUDGET = 1.5
+
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'akshare', 'matplotlib', 'polars', 'duckdb']
+
+# 各子命令不应导入的模块；None 表示只导入命令行入口本身
+FORBIDDEN = {
+    None: ['pandas', 'akshare', 'matplotlib', 'polars', 'duckdb'],
+    'fetch': ['matplotlib', 'polars', 'duckdb'],
+    'clean': ['akshare', 'matplotlib', 'polars', 'duckdb'],
+    'analyze': ['akshare', 'matplotlib', 'polars', 'duckdb'],
+    'select': ['akshare', 'matplotlib', 'polars', 'duckdb'],
+    'run': ['akshare', 'matplotlib', 'polars', 'duckdb'],
+    'plot': ['akshare', 'polars', 'duckdb'],
+    'shard': ['akshare', 'matplotlib', 'polars', 'duckdb'],
+}
+OFFLINE = [None, 'clean', 'analyze', 'select', 'run', 'shard']
+
+_CHILD = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+import cli
+if {command!r} is not None:
+    cli.load_command({command!r})
+seconds = time.perf_counter() - start
+print({marker!r} + json.dumps({{'seconds': seconds, 'modules': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(command):
+    """
+    在新进程中导入子命令需要的模块，返回 (导入耗时, 进程总耗时, 已导入的重型模块)。
+    """
+    code = _CHILD.format(src=os.path.join(ROOT, 'src'), command=command, marker=RESULT_MARKER, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+            return result['seconds'], wall, result['modules']
+    raise RuntimeError(f"子命令 {command} 的模块导入失败：\n{completed.stderr[-3000:]}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='finance 命令行各子命令的启动耗时')
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET, help='离线子命令的导入耗时预算（秒）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个子命令测量的次数，取最小值')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'子命令':<12}{'导入(秒)':>10}{'进程(秒)':>10}  已导入的重型模块")
+    for command in FORBIDDEN:
+        runs = [measure(command) for _ in range(args.repeat)]
+        seconds = min(run[0] for run in runs)
+        wall = min(run[1] for run in runs)
+        modules = runs[0][2]
+        name = command or '(--help)'
+        print(f"{name:<12}{seconds:>10.3f}{wall:>10.3f}  {', '.join(modules) or '无'}")
+        unexpected = [m for m in FORBIDDEN[command] if m in modules]
+        if unexpected:
+            print(f"  - 导入了不需要的模块：{', '.join(unexpected)}")
+            failed = True
+        if command in OFFLINE and seconds > args.budget:
+            print(f"  - 导入耗时超过预算 {args.budget:.2f} 秒")
+            failed = True
+    sys.exit(1 if failed else 0)
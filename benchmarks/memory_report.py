@@ -0,0 +1,55 @@
+# benchmarks/memory_report.py
+#
+# 对比清洗后多年合并数据在旧的列类型（object/int64/float64）与 schema 定义的紧凑类型下的内存占用。
+# 用法：python benchmarks/memory_report.py --stocks 5000 --periods 14
+
+import sys
+import os
+import argparse
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import pandas as pd
+from config import STATEMENT_TYPES
+import synthetic
+import schema
+import data_clean
+
+def legacy_layout(df):
+    """
+    还原为引入 schema 之前的列类型：文本列为 object，报告期为 int64，数值列为 float64。
+    """
+    legacy = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            legacy[col] = series.astype(object)
+        elif col == '报告期':
+            legacy[col] = series.astype('int64')
+        elif pd.api.types.is_float_dtype(series):
+            legacy[col] = series.astype('float64')
+        else:
+            legacy[col] = series
+    return pd.DataFrame(legacy)
+
+def run(n_stocks, n_periods):
+    report_dates = synthetic.make_report_dates(n_periods)
+    print(f"规模：{n_stocks} 只股票 × {len(report_dates)} 个报告期")
+    print(f"{'报表':<22}{'行数':>10}{'旧类型(MB)':>14}{'schema(MB)':>14}{'压缩比':>10}")
+    for statement_type in STATEMENT_TYPES:
+        frames = {report_date: synthetic.generate_statement(statement_type, report_date, n_stocks)
+                  for report_date in report_dates}
+        compact = data_clean.clean_statement_frames(report_dates, statement_type, frames=frames)
+        before = schema.memory_usage_mb(legacy_layout(compact))
+        after = schema.memory_usage_mb(compact)
+        print(f"{statement_type:<22}{len(compact):>10}{before:>14.1f}{after:>14.1f}{before / after:>9.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='清洗后数据的内存占用报告')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=14)
+    args = parser.parse_args()
+    run(args.stocks, args.periods)
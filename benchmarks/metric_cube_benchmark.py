@@ -0,0 +1,111 @@
+# benchmarks/metric_cube_benchmark.py
+#
+# 指标立方体基准测试：对比交互式查询时逐次 pd.read_csv 分析结果与打开内存映射立方体的耗时，
+# 查询为“50只股票自2015年以来的流动比率”和“按2021年毛利率对全部股票排名”。
+# 用法：python benchmarks/metric_cube_benchmark.py --stocks 5000 --periods 14
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import numpy as np
+import pandas as pd
+from config import STATEMENT_CONFIG, STATEMENT_TYPES
+import synthetic
+
+def prepare(report_dates, n_stocks):
+    """
+    在当前目录下生成合成数据，依次清洗、分析，导出分析结果 CSV，并构建宽表和指标立方体。
+    """
+    import warnings
+    warnings.simplefilter('ignore')
+    import storage
+    import data_clean
+    import analysis
+    import fact_table
+    import metric_cube
+
+    synthetic.write_raw_dataset(report_dates, n_stocks)
+    for statement_type in STATEMENT_TYPES:
+        config = STATEMENT_CONFIG[statement_type]
+        data_clean.clean_financial_statements(report_dates, statement_type)
+        output_file = os.path.join('data', 'analysis', config['analysis_file'])
+        getattr(analysis, config['analysis_function'])(os.path.join('data', 'clean', config['clean_file']), output_file)
+        storage.export_csv(output_file)
+    fact_table.build_fact_table()
+    start = time.perf_counter()
+    metric_cube.build_metric_cube()
+    return time.perf_counter() - start
+
+def query_csv(codes, since, rank_period):
+    balance_df = pd.read_csv('data/analysis/balance_sheet_analysis.csv', dtype={'股票代码': str})
+    recent = balance_df[balance_df['股票代码'].isin(codes) & (balance_df['报告期'] >= since)]
+    history = recent.pivot(index='报告期', columns='股票代码', values='流动比率')
+    income_df = pd.read_csv('data/analysis/income_statement_analysis.csv', dtype={'股票代码': str})
+    section = income_df[income_df['报告期'] == rank_period].set_index('股票代码')['毛利率']
+    return history, section.rank(ascending=False, method='min')
+
+def query_cube(codes, since, rank_period):
+    import metric_cube
+
+    cube = metric_cube.MetricCube.open()
+    history = cube.history('流动比率', codes=codes, start=since)
+    ranks = cube.rank('毛利率', rank_period).set_index('股票代码')['排名']
+    return history, ranks
+
+def timed(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+def run(n_stocks, n_periods):
+    report_dates = synthetic.make_report_dates(n_periods)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            build_seconds = prepare(report_dates, n_stocks)
+            import metric_cube
+
+            start = time.perf_counter()
+            cube = metric_cube.MetricCube.open()
+            open_ms = (time.perf_counter() - start) * 1000
+            codes = cube.codes[::max(1, len(cube.codes) // 50)][:50]
+            since, rank_period = 20150101, int(report_dates[-3])
+
+            (csv_history, csv_ranks), csv_seconds = timed(query_csv, codes, since, rank_period)
+            (cube_history, cube_ranks), cube_seconds = timed(query_cube, codes, since, rank_period)
+            matches = (np.allclose(csv_history[codes].to_numpy(), cube_history.to_numpy(), equal_nan=True)
+                       and csv_ranks.equals(cube_ranks.reindex(csv_ranks.index)))
+
+            stock_view = cube.stock(codes[0]).to_numpy()
+            section_view = cube.cross_section('毛利率', rank_period).to_numpy()
+            zero_copy = np.shares_memory(stock_view, cube.values) and np.shares_memory(section_view, cube.values)
+        finally:
+            os.chdir(cwd)
+
+    print(f"规模：{n_stocks} 只股票 × {n_periods} 个报告期，立方体 {cube.values.shape}，"
+          f"{cube.values.nbytes / 1e6:.1f} MB")
+    print(f"构建立方体：{build_seconds:.2f} 秒；打开：{open_ms:.1f} ms")
+    print(f"{'方式':<16}{'两次查询耗时(ms)':<16}")
+    print(f"{'pd.read_csv':<16}{csv_seconds * 1000:<16.1f}")
+    print(f"{'内存映射立方体':<16}{cube_seconds * 1000:<16.1f}")
+    print(f"结果一致：{matches}；单只股票历史和截面均为零拷贝视图：{zero_copy}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='指标立方体基准测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=14)
+    args = parser.parse_args()
+    run(args.stocks, args.periods)
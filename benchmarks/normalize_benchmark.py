@@ -0,0 +1,95 @@
+# benchmarks/normalize_benchmark.py
+#
+# 对比逐行 apply(lambda) 与向量化实现的耗时，规模为 5000 只股票 × 14 个报告期。
+# 用法：python benchmarks/normalize_benchmark.py --stocks 5000 --periods 14
+
+import sys
+import os
+import argparse
+import timeit
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import numpy as np
+import pandas as pd
+import normalize
+
+def best_ms(stmt, repeat=5):
+    """
+    返回多次运行中最快一次的耗时（毫秒）。
+    """
+    return min(timeit.repeat(stmt, number=1, repeat=repeat)) * 1000
+
+def make_frame(n_stocks, n_periods, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = rng.choice(np.arange(1, 700000), size=n_stocks, replace=False)
+    return pd.DataFrame({
+        '股票代码_int': np.tile(codes, n_periods),
+        '股票代码': np.tile(codes.astype(str), n_periods),
+        '营业总支出-财务费用': rng.normal(0, 1e7, n_stocks * n_periods),
+        '是否满足所有条件': rng.uniform(size=n_stocks * n_periods) < 0.3,
+    })
+
+def run(n_stocks, n_periods):
+    df = make_frame(n_stocks, n_periods)
+    padded = normalize.normalize_stock_codes(df['股票代码'])
+    selected = pd.DataFrame({'股票代码': padded, '是否满足所有条件': df['是否满足所有条件']})
+
+    operations = {
+        '获取阶段代码规范化': (
+            lambda: df['股票代码_int'].apply(lambda x: str(x).zfill(6)),
+            lambda: normalize.normalize_stock_codes(df['股票代码_int'])),
+        '读取后补零': (
+            lambda: padded.apply(lambda x: x.zfill(6)),
+            # 代码在进入系统时已补零，下游不再需要任何处理
+            lambda: None),
+        '财务费用调整': (
+            lambda: df['营业总支出-财务费用'].apply(lambda x: x if x > 0 else 0),
+            lambda: df['营业总支出-财务费用'].where(df['营业总支出-财务费用'] > 0, 0)),
+        '满足条件次数统计': (
+            lambda: selected.groupby('股票代码').apply(
+                lambda group: pd.Series({'满足条件次数': group['是否满足所有条件'].sum()})),
+            lambda: selected.groupby('股票代码', observed=True)['是否满足所有条件'].sum()),
+    }
+    timings = {name: (best_ms(old), best_ms(new)) for name, (old, new) in operations.items()}
+
+    print(f"规模：{n_stocks} 只股票 × {n_periods} 个报告期（{len(df)} 行）")
+    print(f"{'操作':<16}{'逐行实现(ms)':>14}{'向量化(ms)':>14}{'加速比':>10}")
+    for name, (old, new) in timings.items():
+        speedup = f'{old / new:.0f}x' if new > 0.01 else '已移除'
+        print(f"{name:<16}{old:>14.2f}{new:>14.2f}{speedup:>10}")
+
+    # 各函数中被替换的操作，汇总为每次调用节省的时间
+    functions = {
+        'data_fetch.save_raw_statement': ['获取阶段代码规范化'],
+        'analyze_income_statement': ['读取后补零', '财务费用调整'],
+        'analyze_cash_flow_statement': ['读取后补零'],
+        'analyze_balance_sheet': ['读取后补零'],
+        'analyze_dividend': ['读取后补零'],
+        'analyze_company_scale': ['读取后补零'] * 3,
+        'select_stocks': ['读取后补零'] * 3 + ['满足条件次数统计'],
+        'visualize_*（每个）': ['读取后补零'],
+    }
+    print()
+    print(f"{'函数':<32}{'逐行实现(ms)':>14}{'向量化(ms)':>14}{'加速比':>10}")
+    for function, names in functions.items():
+        old = sum(timings[name][0] for name in names)
+        new = sum(timings[name][1] for name in names)
+        speedup = f'{old / new:.0f}x' if new > 0.01 else '已移除'
+        print(f"{function:<32}{old:>14.2f}{new:>14.2f}{speedup:>10}")
+
+    memory_object = padded.memory_usage(deep=True) / 1e6
+    memory_category = normalize.stock_code_category(padded).memory_usage(deep=True) / 1e6
+    memory_key = normalize.stock_key(padded).memory_usage(deep=True) / 1e6
+    print()
+    print(f"股票代码内存：字符串 {memory_object:.2f} MB，分类 {memory_category:.2f} MB，int32 键 {memory_key:.2f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='向量化规范化微基准测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=14)
+    args = parser.parse_args()
+    run(args.stocks, args.periods)
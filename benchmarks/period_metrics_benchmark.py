@@ -0,0 +1,67 @@
+# benchmarks/period_metrics_benchmark.py
+#
+# 对比按公司逐个循环与期序键二分查找两种方式计算单季值、TTM、同比、环比的耗时。
+# 用法：python benchmarks/period_metrics_benchmark.py --stocks 5000 --periods 100
+
+import sys
+import os
+import time
+import argparse
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import numpy as np
+import pandas as pd
+import periods
+import synthetic
+
+def per_company_loop(df, col):
+    """
+    按公司逐个循环、用字典查找往期数据的实现，作为对照。
+    """
+    results = []
+    for code, group in df.groupby('股票代码', observed=True):
+        values = dict(zip(group['报告期'], group[col]))
+        for report_date, value in values.items():
+            year, month_day = divmod(int(report_date), 10000)
+            quarter = periods.QUARTER_ENDS[f'{month_day:04d}']
+            previous_quarter = {2: 331, 3: 630, 4: 930}.get(quarter)
+            single = value if quarter == 1 else value - values.get(year * 10000 + previous_quarter, np.nan)
+            last_year = values.get((year - 1) * 10000 + month_day, np.nan)
+            ttm = value if quarter == 4 else value + values.get((year - 1) * 10000 + 1231, np.nan) - last_year
+            results.append((code, report_date, single, ttm, (value - last_year) / abs(last_year)))
+    return pd.DataFrame(results, columns=['股票代码', '报告期', '单季', 'TTM', '同比'])
+
+def run(n_stocks, n_periods):
+    report_dates = synthetic.make_report_dates(n_periods, quarterly=True)
+    frames = [synthetic.generate_statement('income_statement', report_date, n_stocks)[['股票代码', '营业总收入']]
+              .assign(报告期=int(report_date)) for report_date in report_dates]
+    df = pd.concat(frames, ignore_index=True)
+    print(f"规模：{n_stocks} 只股票 × {len(report_dates)} 个季度报告期（{len(df)} 行）")
+
+    start = time.perf_counter()
+    vectorized = periods.add_period_metrics(df, ['营业总收入'])
+    vectorized_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    looped = per_company_loop(df, '营业总收入')
+    loop_seconds = time.perf_counter() - start
+
+    looped = looped.sort_values(['股票代码', '报告期'], ignore_index=True)
+    matches = np.allclose(looped[['单季', 'TTM', '同比']].to_numpy(dtype='float64'),
+                          vectorized[['单季营业总收入', '营业总收入TTM', '营业总收入同比']].to_numpy(),
+                          equal_nan=True)
+    print(f"{'实现':<12}{'耗时(秒)':>12}")
+    print(f"{'逐公司循环':<12}{loop_seconds:>12.2f}")
+    print(f"{'期序键查找':<12}{vectorized_seconds:>12.2f}")
+    print(f"加速比 {loop_seconds / vectorized_seconds:.0f}x，结果一致：{matches}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='季度指标计算基准测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=100)
+    args = parser.parse_args()
+    run(args.stocks, args.periods)
@@ -0,0 +1,105 @@
+# benchmarks/screening_benchmark.py
+#
+# 选股引擎基准测试：与按报告期 groupby().transform('quantile') + 透视表的 pandas 实现核对结果，
+# 并测量扫描阈值组合时每秒可评估的条件组合数。
+# 用法：python benchmarks/screening_benchmark.py --stocks 5000 --periods 14 --screens 2000
+
+import sys
+import os
+import time
+import argparse
+import itertools
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import numpy as np
+import pandas as pd
+from config import SELECTION_CRITERIA, SELECTION_WINDOW, SELECTION_MIN_PASSES
+import screening
+import synthetic
+
+def make_panel_frame(n_stocks, n_periods, seed=0):
+    """
+    生成选股所需的合并数据：营业收入、资产总额为对数正态分布，股息率、股利支付率为均匀分布，约5%缺失。
+    """
+    rng = np.random.default_rng(seed)
+    report_dates = [int(d) for d in synthetic.make_report_dates(n_periods)]
+    n = n_stocks * len(report_dates)
+    df = pd.DataFrame({
+        '股票代码': np.repeat([f'{i:06d}' for i in range(n_stocks)], len(report_dates)),
+        '报告期': np.tile(report_dates, n_stocks),
+        '营业收入': rng.lognormal(21, 1.5, n),
+        '资产总额': rng.lognormal(22, 1.5, n),
+        '股息率': rng.uniform(0, 0.08, n),
+        '股利支付率': rng.uniform(0, 1.0, n),
+    })
+    for col in ['营业收入', '股息率']:
+        df.loc[rng.uniform(size=n) < 0.05, col] = np.nan
+    return df
+
+def pandas_reference(df, criteria, window, min_passes):
+    """
+    逐条件用 groupby('报告期').transform('quantile') 计算截面阈值，再透视统计满足次数。
+    """
+    passed = pd.Series(True, index=df.index)
+    for expression, op, value in criteria:
+        if isinstance(value, tuple):
+            threshold = df.groupby('报告期')[expression].transform('quantile', value[1])
+        else:
+            threshold = value
+        passed &= screening._OPS[op](df[expression], threshold)
+    matrix = df.assign(满足=passed).pivot(index='股票代码', columns='报告期', values='满足')
+    counts = matrix.iloc[:, -window:].sum(axis=1)
+    return set(counts[counts >= min_passes].index)
+
+def run(n_stocks, n_periods, n_screens):
+    df = make_panel_frame(n_stocks, n_periods)
+    columns = screening.criteria_columns(SELECTION_CRITERIA)
+    print(f"规模：{n_stocks} 只股票 × {n_periods} 个报告期")
+
+    start = time.perf_counter()
+    panel = screening.ScreeningPanel(df, columns)
+    build_seconds = time.perf_counter() - start
+
+    # 核对默认条件的结果
+    expected = pandas_reference(df, SELECTION_CRITERIA, SELECTION_WINDOW, SELECTION_MIN_PASSES)
+    selected = panel.screen(SELECTION_CRITERIA, SELECTION_WINDOW, SELECTION_MIN_PASSES)
+    print(f"默认条件选中 {selected.sum()} 只，与 pandas 实现一致：{set(panel.codes[selected]) == expected}")
+
+    # 构造阈值网格：两个分位数条件 × 两个数值条件
+    grid = itertools.product(np.linspace(0.5, 0.9, 10), np.linspace(0.5, 0.9, 10),
+                             np.linspace(0.0, 0.06, 10), np.linspace(0.1, 0.6, 10))
+    screens = {}
+    for revenue_q, asset_q, dividend_yield, payout in itertools.islice(grid, n_screens):
+        screens[(revenue_q, asset_q, dividend_yield, payout)] = [
+            ('营业收入', '>=', screening.quantile(revenue_q)),
+            ('资产总额', '>=', screening.quantile(asset_q)),
+            ('股息率', '>=', dividend_yield),
+            ('股利支付率', '>=', payout),
+        ]
+
+    start = time.perf_counter()
+    results = panel.sweep(screens, SELECTION_WINDOW, SELECTION_MIN_PASSES)
+    sweep_seconds = time.perf_counter() - start
+
+    sample = list(screens)[::max(1, len(screens) // 20)]
+    start = time.perf_counter()
+    matches = all(pandas_reference(df, screens[key], SELECTION_WINDOW, SELECTION_MIN_PASSES)
+                  == set(results.loc[list(screens).index(key), '股票代码']) for key in sample)
+    pandas_seconds = (time.perf_counter() - start) / len(sample)
+
+    print(f"构建透视数组：{build_seconds * 1000:.1f} ms")
+    print(f"扫描 {len(screens)} 组条件：{sweep_seconds:.2f} 秒，每秒 {len(screens) / sweep_seconds:.0f} 组")
+    print(f"pandas 实现：每组 {pandas_seconds * 1000:.1f} ms，每秒 {1 / pandas_seconds:.0f} 组")
+    print(f"抽样 {len(sample)} 组与 pandas 实现一致：{matches}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='选股引擎基准测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=14)
+    parser.add_argument('--screens', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.stocks, args.periods, args.screens)
@@ -0,0 +1,151 @@
+# benchmarks/shard_parity.py
+#
+# 分片执行的一致性检查：用同一份合成原始数据先在单进程中运行 pandas 的清洗、分析、宽表和选股，
+# 再按股票代码分成 N 个分片，在进程池中运行映射阶段、归并分位数阈值并逐片选股。
+# 各分片的清洗、分析表和宽表合并后与单进程的结果逐列比较，默认条件和分位数条件的选股结果须逐位相同，
+# 另外检查归并阶段的阈值与单进程按全市场计算的阈值相同。存在差异时以非零状态退出。
+# 用法：python benchmarks/shard_parity.py --stocks 3000 --periods 20 --shards 4 [--quarterly] [--backend csv]
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+import warnings
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import numpy as np
+import pandas as pd
+from config import STATEMENT_CONFIG, STATEMENT_TYPES, SELECTION_CRITERIA, SELECTION_WINDOW, SELECTION_MIN_PASSES
+import synthetic
+import engine_parity
+
+def _sorted_frame(df, keys):
+    """
+    分类列转换为文本列，按 keys 排序并重置索引，分片合并后的表与单进程的表按行比较。
+    """
+    categorical = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    df = df.astype({c: str for c in categorical})
+    return df.sort_values(keys, kind='stable', ignore_index=True)
+
+def compare_tables(shards):
+    """
+    比较各分片合并后的清洗、分析表和宽表与单进程的结果，返回 {表名: 差异说明列表}。
+    """
+    import storage
+    import sharding
+
+    tables = [('clean', STATEMENT_CONFIG[st]['clean_file']) for st in STATEMENT_TYPES]
+    tables += [('analysis', STATEMENT_CONFIG[st]['analysis_file']) for st in STATEMENT_TYPES]
+    tables.append(('analysis', 'fact_table'))
+    results = {}
+    for stage_dir, name in tables:
+        expected = storage.read_table(os.path.join('data', stage_dir, name))
+        actual = pd.concat([storage.read_table(sharding.shard_path(shard, shards, stage_dir, name))
+                            for shard in range(shards)], ignore_index=True)
+        keys = ['股票代码', '报告期']
+        results[storage.table_stem(os.path.join('data', stage_dir, name))] = engine_parity.compare_frames(
+            _sorted_frame(expected, keys), _sorted_frame(actual, keys)[list(expected.columns)])
+    return results
+
+def compare_thresholds(reduced, criteria):
+    """
+    比较归并阶段的阈值与单进程在全市场宽表上计算的阈值，返回差异说明列表。
+    """
+    import screening
+    import fact_table
+
+    columns = screening.criteria_columns(criteria)
+    panel = screening.ScreeningPanel(screening.complete_rows(fact_table.read_facts(columns), columns), columns)
+    problems = []
+    if list(panel.periods) != reduced['periods']:
+        problems.append("报告期序列不同")
+        return problems
+    for threshold in reduced['thresholds']:
+        expected = panel.threshold(threshold['expression'], threshold['q'])
+        if not np.array_equal(expected, np.asarray(threshold['values'], dtype='float64'), equal_nan=True):
+            problems.append(f"{threshold['expression']} 的 {threshold['q']:g} 分位数阈值不同")
+    return problems
+
+def run(n_stocks, n_periods, quarterly, shards, workers):
+    import storage
+    import sharding
+
+    report_dates = synthetic.make_report_dates(n_periods, quarterly)
+    print(f"规模：{n_stocks} 只股票 × {len(report_dates)} 个报告期，{shards} 个分片，存储格式 {storage.BACKEND}")
+    synthetic.write_raw_dataset(report_dates, n_stocks, backend=storage.BACKEND)
+    engine_parity.perturb_raw(report_dates)
+
+    single = engine_parity.run_engine('pandas', report_dates)['wall_seconds']
+
+    selections = {engine_parity.SELECTION_FILES[0]: {'criteria': SELECTION_CRITERIA}}
+    for selection in (engine_parity.QUANTILE_SELECTION, engine_parity.DIVIDEND_SELECTION):
+        selections[selection['output_file']] = {k: v for k, v in selection.items() if k != 'output_file'}
+    start = time.perf_counter()
+    sharding.for_each_shard(sharding.map_shard, shards, workers, report_dates, STATEMENT_TYPES, SELECTION_CRITERIA)
+    map_time = time.perf_counter() - start
+
+    differences = compare_tables(shards)
+    reduce_time = select_time = 0.0
+    for selected_file, params in selections.items():
+        criteria = params['criteria']
+        start = time.perf_counter()
+        # 有序分段与整组条件对应，换一组条件时只重新写出有序分段
+        if criteria != SELECTION_CRITERIA:
+            sharding.for_each_shard(sharding.write_partials, shards, workers, criteria)
+        reduced = sharding.reduce_thresholds(shards, criteria)
+        reduce_time += time.perf_counter() - start
+        start = time.perf_counter()
+        sharding.for_each_shard(sharding.select_shard, shards, workers, criteria,
+                                params.get('window', SELECTION_WINDOW),
+                                params.get('min_passes', SELECTION_MIN_PASSES))
+        output_file = os.path.join('out', os.path.basename(selected_file))
+        sharding.gather_selection(shards, output_file)
+        select_time += time.perf_counter() - start
+
+        differences[f'{selected_file} 的阈值'] = compare_thresholds(reduced, criteria)
+        expected, actual = (pd.read_csv(path, dtype={'股票代码': str}) for path in (selected_file, output_file))
+        differences[selected_file] = engine_parity.compare_frames(expected, actual)
+        if selected_file in engine_parity.NONEMPTY_SELECTIONS and (expected.empty or actual.empty):
+            differences[selected_file].append("没有选出股票")
+        elif not differences[selected_file] and expected.empty:
+            print(f"提示：{selected_file} 单进程和分片执行都没有选出股票")
+
+    rows = [len(storage.read_table(sharding.shard_path(shard, shards, 'analysis', 'fact_table'), columns=['报告期']))
+            for shard in range(shards)]
+    print(f"\n单进程：{single:.2f} 秒；分片：映射 {map_time:.2f} 秒，归并（含重写有序分段） {reduce_time:.3f} 秒，选股 {select_time:.2f} 秒")
+    print(f"各分片宽表行数：{', '.join(str(r) for r in rows)}")
+    failed = False
+    for name, problems in differences.items():
+        print(f"{name}：{'一致' if not problems else '存在差异'}")
+        for problem in problems:
+            print(f"  - {problem}")
+        failed = failed or bool(problems)
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='分片执行与单进程结果的一致性检查')
+    parser.add_argument('--stocks', type=int, default=2000)
+    parser.add_argument('--periods', type=int, default=20)
+    parser.add_argument('--quarterly', action='store_true', help='使用季度报告期')
+    parser.add_argument('--shards', type=int, default=4, help='分片数')
+    parser.add_argument('--workers', type=int, default=None, help='并行的进程数，默认为全部 CPU 核心')
+    parser.add_argument('--backend', choices=['parquet', 'csv'], default='parquet', help='各阶段输出的存储格式')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    import storage
+    storage.BACKEND = args.backend
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            failed = run(args.stocks, args.periods, args.quarterly, args.shards, args.workers)
+        finally:
+            os.chdir(cwd)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,138 @@
+# benchmarks/sql_screening_benchmark.py
+#
+# DuckDB 分析库的核对与基准测试：用合成数据运行 pandas 的清洗、分析和宽表，导入分析库后，
+# 将参考 SQL 的选股和公司规模排名与 pandas 实现逐列比较（取值须完全相同），并对比两者的耗时。
+# 另外改写宽表最新报告期的分区，检查增量导入只重新导入该分区且结果仍然一致。存在差异时以非零状态退出。
+# 用法：python benchmarks/sql_screening_benchmark.py --stocks 5000 --periods 14 [--quarterly] [--backend csv]
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+import warnings
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import pandas as pd
+import synthetic
+import engine_parity
+
+DB_FILE = 'finance.duckdb'
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def _normalize(df):
+    """
+    分类列转换为文本列并重置索引，pandas 的分类列与 SQL 返回的文本列按取值比较。
+    """
+    categorical = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: str for c in categorical}).reset_index(drop=True)
+
+def compare_selections(report_dates):
+    """
+    比较默认条件和分位数条件的选股、公司规模排名，返回 ({名称: 差异说明列表}, {名称: (pandas 耗时, SQL 耗时)})。
+    """
+    import stock_selection
+    import analysis
+    import sql_store
+
+    selections = {
+        '默认条件选股': {},
+        '分位数条件选股': {k: v for k, v in engine_parity.QUANTILE_SELECTION.items() if k != 'output_file'},
+        '分红条件选股': {k: v for k, v in engine_parity.DIVIDEND_SELECTION.items() if k != 'output_file'},
+    }
+    differences, timings = {}, {}
+    for name, params in selections.items():
+        expected, pandas_time = _timed(stock_selection.select_stocks, output_file=os.path.join('out', 'pandas.csv'),
+                                       **params)
+        actual, sql_time = _timed(sql_store.select_stocks, DB_FILE, **params)
+        if expected.empty and actual.empty:
+            # pandas 的空结果中满足条件次数为 float64，只比较列名
+            differences[name] = [] if list(expected.columns) == list(actual.columns) else ['列不同']
+        else:
+            differences[name] = engine_parity.compare_frames(_normalize(expected), _normalize(actual))
+        timings[name] = (pandas_time, sql_time)
+
+    years = sorted({d[:4] for d in report_dates if d.endswith('1231')})
+    dates = [f'{year}1231' for year in years]
+    start = time.perf_counter()
+    expected, _, expected_passed = analysis.rank_company_scale(analysis.load_company_scale_data(dates))
+    pandas_time = time.perf_counter() - start
+    (actual, actual_passed), sql_time = _timed(sql_store.company_scales, dates, DB_FILE)
+    problems = engine_parity.compare_frames(_normalize(expected), _normalize(actual))
+    if not (expected_passed == actual_passed).all():
+        problems.append(f"达标标记有 {int((expected_passed != actual_passed).sum())} 行不同")
+    differences['公司规模排名'] = problems
+    timings['公司规模排名'] = (pandas_time, sql_time)
+    return differences, timings
+
+def touch_latest_partition(report_dates):
+    """
+    将宽表最新报告期的营业收入放大 1%，模拟重新获取并处理了最新一期。
+    """
+    import storage
+    import fact_table
+
+    latest = int(report_dates[-1])
+    df = storage.read_table(fact_table.FACT_TABLE, filters=[('报告期', '==', latest)])
+    df['营业收入'] = df['营业收入'] * 1.01
+    storage.update_partitions(df, fact_table.FACT_TABLE, '报告期', [latest])
+
+def run(n_stocks, n_periods, quarterly):
+    import storage
+    import sql_store
+
+    report_dates = synthetic.make_report_dates(n_periods, quarterly)
+    print(f"规模：{n_stocks} 只股票 × {len(report_dates)} 个报告期，存储格式 {storage.BACKEND}")
+    synthetic.write_raw_dataset(report_dates, n_stocks, backend=storage.BACKEND)
+    engine_parity.perturb_raw(report_dates)
+    engine_parity.run_engine('pandas', report_dates)
+
+    _, full_time = _timed(sql_store.load_store, DB_FILE)
+    statuses, noop_time = _timed(sql_store.load_store, DB_FILE)
+    results = [compare_selections(report_dates)]
+    touch_latest_partition(report_dates)
+    statuses, partial_time = _timed(sql_store.load_store, DB_FILE, ['fact_table'])
+    results.append(compare_selections(report_dates))
+
+    print(f"\n导入：全部 {full_time:.2f} 秒，未变化 {noop_time:.2f} 秒，宽表改写一个报告期后 {partial_time:.2f} 秒"
+          f"（{statuses['fact_table']}）")
+    print(f"{'查询':<14}{'pandas(秒)':>12}{'SQL(秒)':>12}")
+    for name, (pandas_time, sql_time) in results[0][1].items():
+        print(f"{name:<14}{pandas_time:>12.3f}{sql_time:>12.3f}")
+    failed = False
+    for label, (differences, _) in zip(['首次导入', '增量导入后'], results):
+        for name, problems in differences.items():
+            print(f"{label} {name}：{'一致' if not problems else '存在差异'}")
+            for problem in problems:
+                print(f"  - {problem}")
+            failed = failed or bool(problems)
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='DuckDB 分析库的 SQL 选股核对与基准测试')
+    parser.add_argument('--stocks', type=int, default=2000)
+    parser.add_argument('--periods', type=int, default=14)
+    parser.add_argument('--quarterly', action='store_true', help='使用季度报告期')
+    parser.add_argument('--backend', choices=['parquet', 'csv'], default='parquet', help='各阶段输出的存储格式')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    import storage
+    storage.BACKEND = args.backend
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            failed = run(args.stocks, args.periods, args.quarterly)
+        finally:
+            os.chdir(cwd)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,95 @@
+# benchmarks/storage_benchmark.py
+#
+# 对比 CSV 与 Parquet 存储后端下 clean -> analyze -> facts -> select 的端到端耗时和峰值内存。
+# 用法：python benchmarks/storage_benchmark.py --stocks 5000 --periods 14
+#
+# Parquet 后端的峰值内存受 Arrow 内存分配器影响：默认的 mimalloc 会保留已释放的内存，
+# 设置环境变量 ARROW_DEFAULT_MEMORY_POOL=system 可以得到更接近实际占用的数字。
+
+import sys
+import os
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+from config import STATEMENT_CONFIG, STATEMENT_TYPES
+import synthetic
+
+RESULT_MARKER = 'BENCHMARK_RESULT '
+
+def run_pipeline(backend, report_dates):
+    """
+    在当前目录下以指定后端运行 clean -> analyze -> facts -> select，返回耗时和峰值内存。
+    """
+    import storage
+    storage.BACKEND = backend
+
+    start = time.perf_counter()
+    import data_clean
+    import analysis
+    import fact_table
+    import stock_selection
+    for statement_type in STATEMENT_TYPES:
+        data_clean.clean_financial_statements(report_dates, statement_type)
+    for statement_type in STATEMENT_TYPES:
+        config = STATEMENT_CONFIG[statement_type]
+        input_file = os.path.join('data', 'clean', config['clean_file'])
+        output_file = os.path.join('data', 'analysis', config['analysis_file'])
+        getattr(analysis, config['analysis_function'])(input_file, output_file)
+    fact_table.build_fact_table()
+    stock_selection.select_stocks()
+    wall = time.perf_counter() - start
+    # Linux 下 ru_maxrss 单位为 KB
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'backend': backend, 'wall_seconds': round(wall, 3), 'peak_rss_mb': round(peak_rss_mb, 1)}
+
+def bench_backend(backend, n_stocks, report_dates):
+    """
+    在独立的临时目录和子进程中测量一个后端，避免两次测量互相影响峰值内存。
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            synthetic.write_raw_dataset(report_dates, n_stocks, backend=backend)
+        finally:
+            os.chdir(cwd)
+        os.makedirs(os.path.join(workdir, 'data', 'analysis'), exist_ok=True)
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', backend, '--dates', ','.join(report_dates)],
+            cwd=workdir, capture_output=True, text=True, check=True)
+    # 子进程中的弃用、性能等警告原样显示
+    if completed.stderr.strip():
+        print(f"{backend} 的警告：\n{completed.stderr.strip()}", file=sys.stderr)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"{backend} 基准测试没有输出结果：\n{completed.stderr}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='存储后端端到端基准测试')
+    parser.add_argument('--stocks', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=14)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--dates', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_pipeline(args.child, args.dates.split(','))
+        print(RESULT_MARKER + json.dumps(result))
+        sys.exit(0)
+
+    report_dates = synthetic.make_report_dates(args.periods)
+    print(f"规模：{args.stocks} 只股票 × {len(report_dates)} 个报告期 × {len(STATEMENT_TYPES)} 张报表")
+    results = [bench_backend(backend, args.stocks, report_dates) for backend in ('csv', 'parquet')]
+    print(f"{'后端':<10}{'耗时(秒)':>12}{'峰值内存(MB)':>16}")
+    for result in results:
+        print(f"{result['backend']:<10}{result['wall_seconds']:>12.2f}{result['peak_rss_mb']:>16.1f}")
@@ -0,0 +1,227 @@
+# benchmarks/suite.py
+#
+# 可复现的端到端基准测试：用固定种子生成与 AkShare 接口列名一致的合成原始 CSV，依次测量清洗、
+# 各报表分析、宽表、公司规模分析和选股的耗时与峰值内存，并与 benchmarks/baselines 下保存的基线比较，
+# 超出容差时以非零状态退出。每个步骤在独立的子进程中运行，峰值内存互不影响。
+# 用法：
+#   python benchmarks/suite.py --scale small                    # 与基线比较
+#   python benchmarks/suite.py --scale small --update-baseline  # 重新生成基线
+#   python benchmarks/suite.py --stocks 20000 --periods 40 --quarterly
+
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+from config import STATEMENT_CONFIG, STATEMENT_TYPES
+import synthetic
+
+RESULT_MARKER = 'BENCHMARK_RESULT '
+BASELINE_DIR = os.path.join(ROOT, 'benchmarks', 'baselines')
+
+# 预设规模：(股票数, 报告期数, 是否季报)
+SCALES = {
+    'small': (100, 14, False),
+    'medium': (5000, 14, False),
+    'large': (5000, 100, True),
+    'xlarge': (50000, 100, True),
+}
+
+# 按依赖顺序排列的步骤
+STEPS = ([f'clean:{st}' for st in STATEMENT_TYPES] + [f'analyze:{st}' for st in STATEMENT_TYPES]
+         + ['facts', 'company_scale', 'select'])
+
+# 与基线比较时允许的相对增幅；耗时增加不足 MIN_TIME_DELTA 秒时视为计时误差
+# （small 规模下各步骤只需约 0.1 秒，两次运行之间的波动可达 0.1 秒以上）
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.15
+MIN_TIME_DELTA = 0.25
+# 默认重复运行次数，每个步骤取耗时的中位数
+REPEAT = 3
+
+def run_step(step, report_dates):
+    """
+    在当前目录下运行一个步骤（不使用构建缓存），返回耗时、内存和读写计数。
+    """
+    import instrumentation
+    import data_clean
+    import analysis
+    import fact_table
+    import stock_selection
+
+    instrumentation.RUN_LOG = None
+    kind, _, statement_type = step.partition(':')
+    baseline_rss = instrumentation.peak_rss_mb()
+    with instrumentation.stage(step) as record:
+        if kind == 'clean':
+            output = data_clean.clean_financial_statements(report_dates, statement_type, use_cache=False)
+        elif kind == 'analyze':
+            config = STATEMENT_CONFIG[statement_type]
+            output = getattr(analysis, config['analysis_function'])(
+                os.path.join('data', 'clean', config['clean_file']),
+                os.path.join('data', 'analysis', config['analysis_file']), use_cache=False)
+        elif kind == 'facts':
+            output = fact_table.build_fact_table(use_cache=False)
+        elif kind == 'company_scale':
+            output, _ = analysis.analyze_company_scales(sorted({d[:4] for d in report_dates if d.endswith('1231')}))
+        elif kind == 'select':
+            output = stock_selection.select_stocks()
+        else:
+            raise ValueError(f"未知的步骤：{step}")
+        # 步骤返回结果的行数用于核对结果是否变化
+        instrumentation.count(rows_out=len(output) if output is not None else 0)
+    result = {key: record.get(key, 0) for key in ('wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'rows_read',
+                                                   'rows_written', 'rows_out', 'bytes_read', 'bytes_written')}
+    result['step_rss_mb'] = round(record['peak_rss_mb'] - baseline_rss, 1)
+    return result
+
+def bench_step(step, workdir, report_dates, shown_warnings=None):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', step, '--dates', ','.join(report_dates)],
+        cwd=workdir, capture_output=True, text=True)
+    # 子进程中的弃用、性能等警告原样显示，重复运行时同样的警告只显示一次
+    warnings = completed.stderr.strip()
+    if completed.returncode == 0 and warnings and (shown_warnings is None or warnings not in shown_warnings):
+        print(f"步骤 {step} 的警告：\n{warnings}", file=sys.stderr)
+        if shown_warnings is not None:
+            shown_warnings.add(warnings)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"步骤 {step} 没有输出结果：\n{completed.stderr[-2000:]}")
+
+def run_suite(n_stocks, n_periods, quarterly, repeat=REPEAT):
+    """
+    生成合成数据并依次测量全部步骤；repeat > 1 时整套重复运行，每个步骤取耗时为中位数的一次。
+    """
+    import pandas as pd
+
+    report_dates = synthetic.make_report_dates(n_periods, quarterly)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            synthetic.write_raw_dataset(report_dates, n_stocks, backend='csv')
+            print(f"生成合成原始数据：{n_stocks} 只股票 × {len(report_dates)} 个报告期，"
+                  f"耗时 {time.perf_counter() - start:.1f} 秒")
+        finally:
+            os.chdir(cwd)
+        os.makedirs(os.path.join(workdir, 'data', 'analysis'), exist_ok=True)
+        shown_warnings = set()
+        for _ in range(repeat):
+            for step in STEPS:
+                results.setdefault(step, []).append(bench_step(step, workdir, report_dates, shown_warnings))
+    medians = {step: sorted(runs, key=lambda result: result['wall_seconds'])[len(runs) // 2]
+               for step, runs in results.items()}
+    return pd.DataFrame.from_dict(medians, orient='index')
+
+def _environment():
+    import numpy
+    import pandas
+    import pyarrow
+
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'pandas': pandas.__version__, 'numpy': numpy.__version__, 'pyarrow': pyarrow.__version__}
+
+def baseline_file(name):
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+def save_baseline(name, params, result_df):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    baseline = {'params': params, 'environment': _environment(), 'steps': result_df.to_dict(orient='index')}
+    with open(baseline_file(name), 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+    print(f"基线已保存至 {baseline_file(name)}")
+
+def compare(result_df, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    与基线逐步骤比较，返回 (对比表, 回退说明列表)。输出行数不同说明结果发生了变化，同样视为失败。
+    """
+    import pandas as pd
+
+    base_df = pd.DataFrame.from_dict(baseline['steps'], orient='index')
+    table = pd.DataFrame({
+        '耗时(秒)': result_df['wall_seconds'],
+        '基线耗时': base_df['wall_seconds'],
+        '峰值内存(MB)': result_df['peak_rss_mb'],
+        '基线内存': base_df['peak_rss_mb'],
+        '输出行数': result_df['rows_out'],
+        '基线行数': base_df['rows_out'],
+    })
+    table['耗时比'] = (table['耗时(秒)'] / table['基线耗时']).round(2)
+    table['内存比'] = (table['峰值内存(MB)'] / table['基线内存']).round(2)
+
+    regressions = []
+    for step, row in table.iterrows():
+        if pd.isna(row['基线耗时']):
+            continue
+        if row['耗时比'] > 1 + time_tolerance and row['耗时(秒)'] - row['基线耗时'] > MIN_TIME_DELTA:
+            regressions.append(f"{step} 耗时 {row['耗时(秒)']:.3f} 秒，超过基线 {row['基线耗时']:.3f} 秒的 {1 + time_tolerance:.2f} 倍")
+        if row['内存比'] > 1 + memory_tolerance:
+            regressions.append(f"{step} 峰值内存 {row['峰值内存(MB)']:.1f} MB，超过基线 {row['基线内存']:.1f} MB 的 {1 + memory_tolerance:.2f} 倍")
+        if row['输出行数'] != row['基线行数']:
+            regressions.append(f"{step} 输出 {row['输出行数']} 行，基线为 {row['基线行数']} 行，结果发生了变化")
+    return table, regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='端到端基准测试套件')
+    parser.add_argument('--scale', choices=list(SCALES), default='small', help='预设规模')
+    parser.add_argument('--stocks', type=int, help='自定义股票数（覆盖预设）')
+    parser.add_argument('--periods', type=int, help='自定义报告期数（覆盖预设）')
+    parser.add_argument('--quarterly', action='store_true', help='自定义规模时使用季度报告期')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='重复运行次数，每个步骤取耗时的中位数')
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument('--update-baseline', action='store_true', help='将本次结果保存为基线')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--dates', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(RESULT_MARKER + json.dumps(run_step(args.child, args.dates.split(','))))
+        sys.exit(0)
+
+    import pandas as pd
+
+    n_stocks, n_periods, quarterly = SCALES[args.scale]
+    name = args.scale
+    if args.stocks or args.periods:
+        n_stocks, n_periods = args.stocks or n_stocks, args.periods or n_periods
+        quarterly = args.quarterly
+        name = f"{n_stocks}x{n_periods}{'q' if quarterly else ''}"
+    params = {'stocks': n_stocks, 'periods': n_periods, 'quarterly': quarterly}
+
+    result_df = run_suite(n_stocks, n_periods, quarterly, args.repeat)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        if args.update_baseline:
+            print(result_df)
+            save_baseline(name, params, result_df)
+            sys.exit(0)
+        if not os.path.exists(baseline_file(name)):
+            print(result_df)
+            print(f"没有 {name} 的基线，使用 --update-baseline 生成")
+            sys.exit(0)
+        with open(baseline_file(name), encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['environment'] != _environment():
+            print(f"注意：基线的运行环境 {baseline['environment']} 与当前环境不同，耗时比较仅供参考")
+        table, regressions = compare(result_df, baseline, args.time_tolerance, args.memory_tolerance)
+        print(table)
+
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项性能回退：")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\n全部步骤均在基线容差范围内")
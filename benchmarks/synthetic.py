@@ -0,0 +1,138 @@
+# benchmarks/synthetic.py
+
+import sys
+import os
+
+# 添加项目根目录和 src 目录到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import numpy as np
+import pandas as pd
+from config import STATEMENT_CONFIG
+
+def make_report_dates(n_periods, quarterly=False):
+    """
+    生成最近 n_periods 个报告期（年报或季报），以 20231231 结束。
+    """
+    quarter_ends = ['0331', '0630', '0930', '1231'] if quarterly else ['1231']
+    dates = [f'{year}{end}' for year in range(2023 - n_periods, 2024) for end in quarter_ends]
+    return dates[-n_periods:]
+
+def _universe(n_stocks, seed):
+    """
+    生成股票池：代码、简称以及每只股票稳定的规模因子，使各期数据在时间上相关。
+    """
+    rng = np.random.default_rng(seed)
+    codes = np.array([str(600000 + i) if i % 2 else str(i).zfill(6) for i in range(1, n_stocks + 1)])
+    names = np.array([f'公司{code}' for code in codes])
+    scale = rng.lognormal(mean=21, sigma=1.5, size=n_stocks)
+    return codes, names, scale
+
+def generate_statement(statement_type, report_date, n_stocks, seed=0):
+    """
+    生成与 AkShare 接口输出列名一致的单个报告期原始数据。
+    """
+    codes, names, scale = _universe(n_stocks, seed)
+    rng = np.random.default_rng([seed, int(report_date), list(STATEMENT_CONFIG).index(statement_type)])
+    n = n_stocks
+    growth = rng.normal(1.05, 0.1, n)
+    notice = f'{int(report_date[:4]) + 1}-04-15'
+
+    if statement_type == 'income_statement':
+        revenue = scale * growth
+        return pd.DataFrame({
+            '序号': np.arange(1, n + 1),
+            '股票代码': codes,
+            '股票简称': names,
+            '净利润': revenue * rng.normal(0.1, 0.05, n),
+            '净利润同比': rng.normal(5, 30, n),
+            '营业总收入': revenue,
+            '营业总收入同比': (growth - 1) * 100,
+            '营业总支出-营业支出': revenue * rng.uniform(0.4, 0.9, n),
+            '营业总支出-销售费用': revenue * rng.uniform(0.01, 0.1, n),
+            '营业总支出-管理费用': revenue * rng.uniform(0.01, 0.08, n),
+            '营业总支出-财务费用': revenue * rng.normal(0.005, 0.01, n),
+            '营业总支出-营业总支出': revenue * rng.uniform(0.6, 0.95, n),
+            '营业利润': revenue * rng.normal(0.12, 0.06, n),
+            '利润总额': revenue * rng.normal(0.12, 0.06, n),
+            '公告日期': notice,
+        })
+    if statement_type == 'cash_flow_statement':
+        operating = scale * rng.normal(0.12, 0.1, n)
+        investing = scale * rng.normal(-0.08, 0.06, n)
+        financing = scale * rng.normal(-0.02, 0.06, n)
+        net = operating + investing + financing
+        return pd.DataFrame({
+            '序号': np.arange(1, n + 1),
+            '股票代码': codes,
+            '股票简称': names,
+            '净现金流-净现金流': net,
+            '净现金流-同比增长': rng.normal(0, 80, n),
+            '经营性现金流-现金流量净额': operating,
+            '经营性现金流-净现金流占比': operating / net * 100,
+            '投资性现金流-现金流量净额': investing,
+            '投资性现金流-净现金流占比': investing / net * 100,
+            '融资性现金流-现金流量净额': financing,
+            '融资性现金流-净现金流占比': financing / net * 100,
+            '公告日期': notice,
+        })
+    if statement_type == 'balance_sheet':
+        assets = scale * growth * rng.uniform(1.5, 3, n)
+        liabilities = assets * rng.uniform(0.1, 0.9, n)
+        return pd.DataFrame({
+            '序号': np.arange(1, n + 1),
+            '股票代码': codes,
+            '股票简称': names,
+            '资产-货币资金': assets * rng.uniform(0.05, 0.3, n),
+            '资产-应收账款': assets * rng.uniform(0.0, 0.2, n),
+            '资产-存货': assets * rng.uniform(0.0, 0.3, n),
+            '资产-总资产': assets,
+            '资产-总资产同比': (growth - 1) * 100,
+            '负债-应付账款': assets * rng.uniform(0.0, 0.15, n),
+            '负债-总负债': liabilities,
+            '负债-预收账款': assets * rng.uniform(0.0, 0.1, n),
+            '负债-总负债同比': rng.normal(5, 20, n),
+            '资产负债率': liabilities / assets * 100,
+            '股东权益合计': assets - liabilities,
+            '公告日期': notice,
+        })
+    if statement_type == 'dividend':
+        eps = rng.lognormal(-0.5, 0.8, n)
+        cash_ratio = np.where(rng.uniform(size=n) < 0.7, eps * rng.uniform(1, 6, n), np.nan)
+        return pd.DataFrame({
+            '代码': codes,
+            '名称': names,
+            '送转股份-送转总比例': np.where(rng.uniform(size=n) < 0.1, 10.0, np.nan),
+            '送转股份-送转比例': np.nan,
+            '送转股份-转股比例': np.nan,
+            '现金分红-现金分红比例': cash_ratio,
+            '现金分红-现金分红比例描述': '10派' + pd.Series(cash_ratio).round(2).astype(str) + '元(含税)',
+            '现金分红-股息率': rng.uniform(0, 0.08, n),
+            '每股收益': eps,
+            '每股净资产': eps * rng.uniform(3, 12, n),
+            '每股公积金': rng.uniform(0, 5, n),
+            '每股未分配利润': rng.uniform(0, 10, n),
+            '净利润同比增长': rng.normal(5, 30, n),
+            '总股本': np.round(scale / 10),
+            '预案公告日': notice,
+            '股权登记日': notice,
+            '除权除息日': notice,
+            '方案进度': '实施分配',
+            '最新公告日期': notice,
+        })
+    raise ValueError(f"未知的报表类型：{statement_type}")
+
+def write_raw_dataset(report_dates, n_stocks, statement_types=None, seed=0, backend=None):
+    """
+    按 data_fetch 的目录结构在当前目录下写出合成原始数据。
+    """
+    import storage
+
+    for statement_type in statement_types or list(STATEMENT_CONFIG):
+        file_prefix = STATEMENT_CONFIG[statement_type]['file_prefix']
+        for report_date in report_dates:
+            df = generate_statement(statement_type, report_date, n_stocks, seed)
+            output_file = os.path.join('data', 'raw', file_prefix, report_date, f'{file_prefix}_{report_date}')
+            storage.write_table(df, output_file, backend=backend)
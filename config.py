@@ -18,9 +18,18 @@ REPORT_DATES = [
     '20231231'
 ]
 
+# 也可以使用季度报告期，如 periods.report_dates_between(2000, 2023) 生成的 0331/0630/0930/1231 列表；
+# 利润表、现金流量表会据此计算单季值、TTM、同比和环比
+
 # 指定的公司列表，股票代码列表
 COMPANY_CODES = ['600519', '000858', '601318']  # 示例公司
 
+# 图表使用的中文字体路径（请根据你的系统调整路径），文件不存在时使用默认字体
+FONT_PATH = '/System/Library/Fonts/PingFang.ttc'  # macOS 苹方字体路径
+
+# 批量绘图时并行绘制的进程数，None 表示使用全部 CPU 核心
+VISUALIZATION_WORKERS = None
+
 # 财务报表类型列表
 STATEMENT_TYPES = ['income_statement', 'cash_flow_statement', 'balance_sheet', 'dividend']
 
@@ -28,14 +37,23 @@ STATEMENT_TYPES = ['income_statement', 'cash_flow_statement', 'balance_sheet', '
 STATEMENT_CONFIG = {
     'income_statement': {
         'fetch_function': 'stock_lrb_em',
+        'fetch_concurrency': 4,
         'file_prefix': 'income_statement',
         'clean_file': 'income_statement_clean.csv',
         'analysis_file': 'income_statement_analysis.csv',
         'analysis_function': 'analyze_income_statement',
         'visualization_function': 'visualize_income_statement',
+        # 比率指标：(名称, 分子, 分母[, 分母为零时的处理])，费用总额 = 销售费用 + 管理费用 + 正的财务费用
+        'ratios': [
+            ('毛利率', '营业收入 - 营业成本', '营业收入'),
+            ('费用率', '费用总额', '营业收入'),
+            ('营业利润率', '利润总额', '营业收入'),
+            ('毛利润费用占比', '费用总额', '营业收入 - 营业成本'),
+        ],
     },
     'cash_flow_statement': {
         'fetch_function': 'stock_xjll_em',
+        'fetch_concurrency': 4,
         'file_prefix': 'cash_flow_statement',
         'clean_file': 'cash_flow_statement_clean.csv',
         'analysis_file': 'cash_flow_statement_analysis.csv',
@@ -44,18 +62,109 @@ STATEMENT_CONFIG = {
     },
     'balance_sheet': {
         'fetch_function': 'stock_zcfz_em',
+        'fetch_concurrency': 4,
         'file_prefix': 'balance_sheet',
         'clean_file': 'balance_sheet_clean.csv',
         'analysis_file': 'balance_sheet_analysis.csv',
         'analysis_function': 'analyze_balance_sheet',
         'visualization_function': 'visualize_balance_sheet',
+        # 流动资产、流动负债只取接口提供的科目：流动资产 = 货币资金 + 应收账款 + 存货，流动负债 = 应付账款 + 预收账款
+        'ratios': [
+            ('产权比率', '`负债-总负债`', '股东权益合计'),
+            ('流动比率', '`资产-货币资金` + `资产-应收账款` + `资产-存货`', '`负债-应付账款` + `负债-预收账款`'),
+            ('速动比率', '`资产-货币资金` + `资产-应收账款`', '`负债-应付账款` + `负债-预收账款`'),
+            ('现金比率', '`资产-货币资金`', '`负债-应付账款` + `负债-预收账款`'),
+        ],
     },
     'dividend': {
         'fetch_function': 'stock_fhps_em',
+        'fetch_concurrency': 2,
+        # 分红接口只提供中报（0630）和年报（1231）；分红增长率按相邻报告期计算，默认只取年报
+        'report_periods': ['1231'],
         'file_prefix': 'dividend',
         'clean_file': 'dividend_clean.csv',
         'analysis_file': 'dividend_analysis.csv',
         'analysis_function': 'analyze_dividend',
         'visualization_function': 'visualize_dividend',
+        'ratios': [
+            ('股利支付率', '每股股利', '每股收益'),
+            ('股息覆盖率', '每股收益', '每股股利'),
+            ('分红增长率', '每股股利 - 上期每股股利', '上期每股股利'),
+        ],
     },
-}
\ No newline at end of file
+}
+
+# 跨报表的比率指标，在合并后的宽表上计算，格式同上。营业成本单位为元，存货单位为万元；
+# 存货取期末余额。某张报表缺少该行时结果为缺失值
+FACT_RATIOS = [
+    ('存货周转率', '营业成本 / 10000', '存货', 'nan'),
+]
+
+# 选股条件：(指标或表达式, 运算符, 阈值)，阈值为数值，或 ('quantile', q) 表示每个报告期截面的 q 分位数
+SELECTION_CRITERIA = [
+    ('营业收入', '>=', ('quantile', 0.7)),  # 营业收入排名前30%
+    ('资产总额', '>=', ('quantile', 0.7)),  # 总资产排名前30%
+    ('股息率', '>=', 0.03),  # 股息率 ≥ 3%
+    ('股利支付率', '>=', 0.3),  # 股利支付率 ≥ 30%
+]
+SELECTION_WINDOW = 5  # 统计最近 X 个报告期
+SELECTION_MIN_PASSES = 4  # 其中至少 X 个报告期满足全部条件
+
+# 参数扫描：每个选股条件的候选阈值，以及统计期数、最少满足次数的候选值（python src/backtest.py）
+# 分位数条件在排名立方体上只支持 >= 和 <
+SWEEP_GRID = {
+    'criteria': [
+        ('营业收入', '>=', [('quantile', q) for q in (0.5, 0.6, 0.7, 0.8, 0.9)]),
+        ('资产总额', '>=', [('quantile', q) for q in (0.5, 0.6, 0.7, 0.8, 0.9)]),
+        ('股息率', '>=', [0.01, 0.02, 0.03, 0.04, 0.05]),
+        ('股利支付率', '>=', [0.1, 0.2, 0.3, 0.4, 0.5]),
+    ],
+    'window': [3, 4, 5],
+    'min_passes': [2, 3, 4, 5],
+}
+SWEEP_WORKERS = None  # 并行评估的进程数，None 表示使用全部 CPU 核心
+
+# 数据获取的并发与重试配置
+FETCH_MAX_WORKERS = 8  # 线程池大小上限，每个接口的并发数由 STATEMENT_CONFIG 中的 fetch_concurrency 限制
+FETCH_RETRIES = 3  # 单次调用失败后的最大重试次数
+FETCH_BACKOFF = 1.0  # 重试退避的基础秒数，第 n 次重试等待 FETCH_BACKOFF * 2 ** (n - 1) 秒
+FETCH_CHECKPOINT_SECONDS = 5  # 获取结果和检查点最多每隔多少秒写入一次，中断时最多只需重新获取这段时间内完成的单元
+
+# AkShare 响应缓存：按接口名和参数缓存返回的数据，以 Arrow IPC 文件保存在本地（不使用 pickle，录制的目录可以共享），用于开发、调试时避免重复请求
+# 'off'：不使用缓存；'cache'：未过期的缓存直接返回，否则调用接口并写入缓存；
+# 'record'：总是调用接口并覆盖缓存（录制离线数据）；'replay'：只读缓存，从不访问网络，缓存缺失时报错
+AKSHARE_CACHE_MODE = 'off'
+AKSHARE_CACHE_DIR = 'data/cache/akshare'  # 缓存目录，回放模式下可指向录制好的离线数据
+AKSHARE_CACHE_TTL_HOURS = 24  # 缓存的有效期（小时），None 表示永不过期；回放模式忽略有效期
+AKSHARE_CACHE_MAX_MB = 1024  # 缓存总大小上限（MB），超出时按最近访问时间淘汰最久未用的响应
+
+# 增量获取的刷新策略：已完整获取的报告期默认跳过，以下范围内的报告期总是重新获取
+REFRESH_LATEST_PERIODS = 1  # 最近 N 个报告期
+REFRESH_PERIOD_AGE_DAYS = 180  # 报告期截止日距今不足 X 天的报告期（None 表示不按时间刷新）
+
+# 各阶段之间数据交接使用的存储格式：'parquet'（按报告期分区、保留列类型）或 'csv'
+STORAGE_BACKEND = 'parquet'
+
+# 清洗阶段是否逐个报告期流式处理并追加写出（报告期很多时可避免整表驻留内存）
+CLEAN_STREAMING = False
+
+# 清洗、分析、选股阶段的执行引擎：'pandas'，或 'polars'（惰性扫描、列和过滤条件下推、多线程流式执行，
+# 需要安装 polars，且清洗和分析结果必须落盘）
+EXECUTION_ENGINE = 'pandas'
+
+# 嵌入式分析库（DuckDB 单文件）：从清洗、分析结果和宽表增量导入，选股和排名以 SQL 执行（需要安装 duckdb）
+SQL_STORE_FILE = 'data/finance.duckdb'
+SQL_STORE_THREADS = None  # 查询使用的线程数，None 表示使用 DuckDB 的默认值（全部 CPU 核心）
+
+# 分片执行（python src/sharding.py 或 ./finance shard）：按股票代码的哈希把全市场分成 SHARD_COUNT 个分片，
+# 各分片独立清洗、分析并统计选股的满足次数，分位数阈值在归并阶段按全市场计算；
+# 多台机器共享 SHARD_DIR 所在的目录时，可以各自运行不同的分片
+SHARD_COUNT = 8
+SHARD_WORKERS = None  # 在本机运行全部分片时的进程数，None 表示使用全部 CPU 核心
+SHARD_DIR = 'data/shards'  # 各分片的中间结果、有序分段和全市场阈值的保存目录
+
+# 运行日志与性能剖析：流水线各阶段的耗时、CPU 时间、内存、读写行数和字节数、AkShare 调用延迟
+# 以 JSON Lines 格式追加写入 RUN_LOG_FILE（None 表示不记录）
+RUN_LOG_FILE = 'data/logs/run_log.jsonl'
+PROFILE_MODE = None  # 各阶段的性能剖析：None、'cprofile'（保存 .prof 文件）或 'tracemalloc'（记录内存分配热点）
+PROFILE_DIR = 'data/logs/profiles'  # cProfile 结果的保存目录
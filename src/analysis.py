@@ -8,63 +8,72 @@ sys.path.append('.')
 
 import pandas as pd
 import numpy as np
-from config import STATEMENT_CONFIG
+from config import STATEMENT_CONFIG, REPORT_DATES
+import storage
+import build_cache
+import periods
+import ratios
+import screening
+import schema
+import fact_table
+
+def fill_numeric_na(df, value=0):
+    """
+    只对数值列填充缺失值，股票代码等分类列保持不变。
+    """
+    return df.fillna({col: value for col in df.select_dtypes('number').columns})
+
+# 各分析函数共同调用的代码：缺失值填充、比率计算（ratios 模块及其使用的表达式求值）和清洗结果的列类型，
+# 其源码计入构建缓存的签名，修改后已缓存的分析结果视为失效
+ANALYSIS_DEPENDENCIES = (fill_numeric_na, ratios, screening, schema)
 
-def analyze_income_statement(input_file, output_file):
+# 同比、单季、TTM 指标需要回看之前的季度，增量重算时一并读取
+@build_cache.cached_analysis(partitioned=True, lookback=periods.MAX_LAG,
+                             depends_on=ANALYSIS_DEPENDENCIES + (periods,))
+def analyze_income_statement(input_file, output_file=None):
     """
     计算利润表的财务指标，并输出结果。
-    """
-    df = pd.read_csv(input_file, dtype={'股票代码': str})
 
-    # 确保股票代码长度为6位，填充前导零
-    df['股票代码'] = df['股票代码'].apply(lambda x: x.zfill(6))
+    input_file 可以是清洗后的表路径或 DataFrame；output_file 为 None 时只返回结果不写出。
+    """
+    # 清洗后的数据保留了缺失值，指标计算沿用缺失按0处理的口径
+    df = fill_numeric_na(storage.as_frame(input_file))
 
     # 计算财务指标
     df['营业收入'] = df['营业总收入']
 
-    # 确保分母不为零，避免除零错误
-    df['营业收入'].replace(0, np.nan, inplace=True)
-    df['营业成本'].replace(0, np.nan, inplace=True)
-    df['营业收入减营业成本'] = df['营业收入'] - df['营业成本']
-    df['营业收入减营业成本'].replace(0, np.nan, inplace=True)
-
-    # 毛利率 = （营业收入 - 营业成本） / 营业收入
-    df['毛利率'] = (df['营业收入'] - df['营业成本']) / df['营业收入']
-
-    # 对财务费用进行条件处理
-    # 如果财务费用小于0，则设置为0（即不计入总费用）
-    df['财务费用调整'] = df['营业总支出-财务费用'].apply(lambda x: x if x > 0 else 0)
-
-    # 费用总额 = 销售费用 + 管理费用 + 财务费用调整
-    df['费用总额'] = df['营业总支出-销售费用'] + df['营业总支出-管理费用'] + df['财务费用调整']
-
-    # 费用率 = 费用总额 / 营业收入
-    df['费用率'] = df['费用总额'] / df['营业收入']
-
-    # 营业利润率 = 利润总额 / 营业收入
-    df['营业利润率'] = df['利润总额'] / df['营业收入']
+    # 费用总额 = 销售费用 + 管理费用 + 财务费用（财务费用小于0时不计入）
+    expenses = (df['营业总支出-销售费用'].to_numpy() + df['营业总支出-管理费用'].to_numpy()
+                + np.maximum(df['营业总支出-财务费用'].to_numpy(), 0))
 
-    # 毛利润费用占比 = 费用总额 / （营业收入 - 营业成本）
-    df['毛利润费用占比'] = df['费用总额'] / (df['营业收入'] - df['营业成本'])
+    # 毛利率、费用率、营业利润率、毛利润费用占比，分母为零时记为0
+    df = pd.concat([df, ratios.compute_ratios(df, STATEMENT_CONFIG['income_statement']['ratios'],
+                                              inputs={'费用总额': expenses})], axis=1)
 
-    # 恢复被替换为 NaN 的值
-    df.fillna(0, inplace=True)
+    # 单季值、TTM、同比和单季环比，缺少所需报告期时为 NaN
+    growth_columns = ['营业收入', '净利润']
+    df = periods.add_period_metrics(df, growth_columns)
 
     # 选择需要的列
-    result_df = df[['股票代码', '股票简称', '报告期', '营业收入', '毛利率', '费用率', '营业利润率', '毛利润费用占比']]
-
-    result_df.to_csv(output_file, index=False)
-    print(f"利润表数据分析完成，保存至 {output_file}")
-
-def analyze_cash_flow_statement(input_file, output_file):
+    result_df = df[['股票代码', '股票简称', '报告期', '营业收入', '营业成本', '毛利率', '费用率', '营业利润率', '毛利润费用占比']
+                   + periods.period_metric_columns(growth_columns)]
+
+    if output_file is not None:
+        output_file = storage.write_table(result_df, output_file, partition_cols=['报告期'])
+        print(f"利润表数据分析完成，保存至 {output_file}")
+    return result_df
+
+# 同比、单季、TTM 指标需要回看之前的季度，增量重算时一并读取
+@build_cache.cached_analysis(partitioned=True, lookback=periods.MAX_LAG,
+                             depends_on=ANALYSIS_DEPENDENCIES + (periods,))
+def analyze_cash_flow_statement(input_file, output_file=None):
     """
     计算现金流量表的指标，并输出结果。
-    """
-    df = pd.read_csv(input_file, dtype={'股票代码': str})
 
-    # 确保股票代码长度为6位，填充前导零
-    df['股票代码'] = df['股票代码'].apply(lambda x: x.zfill(6))
-    print(df.columns)
+    input_file 可以是清洗后的表路径或 DataFrame；output_file 为 None 时只返回结果不写出。
+    """
+    # 清洗后的数据保留了缺失值，指标计算沿用缺失按0处理的口径
+    df = fill_numeric_na(storage.as_frame(input_file))
 
     # 计算需要的指标
     df['经营活动现金流净额'] = df['经营性现金流-现金流量净额']
@@ -80,162 +89,149 @@ def analyze_cash_flow_statement(input_file, output_file):
     df['融资活动现金流净额'] = df['融资活动现金流净额'] / 1e4
     df['自有经营现金净额'] = df['自有经营现金净额'] / 1e4
 
+    # 单季值、TTM、同比和单季环比，缺少所需报告期时为 NaN
+    growth_columns = ['经营活动现金流净额', '自有经营现金净额']
+    df = periods.add_period_metrics(df, growth_columns)
+
     # 选择需要的列
-    result_df = df[['股票代码', '股票简称', '报告期', '经营活动现金流净额', '投资活动现金流净额', '融资活动现金流净额', '自有经营现金净额']]
+    result_df = df[['股票代码', '股票简称', '报告期', '经营活动现金流净额', '投资活动现金流净额', '融资活动现金流净额', '自有经营现金净额']
+                   + periods.period_metric_columns(growth_columns)]
 
-    result_df.to_csv(output_file, index=False)
-    print(f"现金流量表数据分析完成，保存至 {output_file}")
+    if output_file is not None:
+        output_file = storage.write_table(result_df, output_file, partition_cols=['报告期'])
+        print(f"现金流量表数据分析完成，保存至 {output_file}")
+    return result_df
 
-def analyze_balance_sheet(input_file, output_file):
+@build_cache.cached_analysis(partitioned=True, depends_on=ANALYSIS_DEPENDENCIES)
+def analyze_balance_sheet(input_file, output_file=None):
     """
     计算资产负债表的财务指标，并输出结果。
-    """
-    df = pd.read_csv(input_file, dtype={'股票代码': str})
 
-    # 确保股票代码长度为6位，填充前导零
-    df['股票代码'] = df['股票代码'].apply(lambda x: x.zfill(6))
+    input_file 可以是清洗后的表路径或 DataFrame；output_file 为 None 时只返回结果不写出。
+    """
+    # 清洗后的数据保留了缺失值，指标计算沿用缺失按0处理的口径
+    df = fill_numeric_na(storage.as_frame(input_file))
 
     # 计算财务指标
     df['资产总额'] = df['资产-总资产'] / 1e4  # 转换为万元
     df['负债总额'] = df['负债-总负债'] / 1e4  # 转换为万元
     df['股东权益'] = df['股东权益合计'] / 1e4  # 转换为万元
+    df['存货'] = df['资产-存货'] / 1e4  # 转换为万元
 
     # 资产负债率已存在，转换为小数
     df['资产负债率'] = df['资产负债率'] / 100
 
-    # 计算产权比率 = 总负债 / 股东权益
-    df['产权比率'] = df['负债总额'] / df['股东权益']
-
-    # 计算流动比率 = （货币资金 + 应收账款 + 存货）/ （应付账款 + 预收账款）
-    df['流动资产合计'] = df['资产-货币资金'] + df['资产-应收账款'] + df['资产-存货']
-    df['流动负债合计'] = df['负债-应付账款'] + df['负债-预收账款']
-    df['流动比率'] = df['流动资产合计'] / df['流动负债合计']
-
-    # 计算速动比率 = （货币资金 + 应收账款）/ （应付账款 + 预收账款）
-    df['速动资产合计'] = df['资产-货币资金'] + df['资产-应收账款']
-    df['速动比率'] = df['速动资产合计'] / df['流动负债合计']
-
-    # 计算现金比率 = 货币资金 / （应付账款 + 预收账款）
-    df['现金比率'] = df['资产-货币资金'] / df['流动负债合计']
+    # 产权比率、流动比率、速动比率、现金比率，分母为零时记为0
+    df = pd.concat([df, ratios.compute_ratios(df, STATEMENT_CONFIG['balance_sheet']['ratios'])], axis=1)
 
     # 选择需要的列
-    result_df = df[['股票代码', '股票简称', '报告期', '资产总额', '负债总额', '股东权益',
+    result_df = df[['股票代码', '股票简称', '报告期', '资产总额', '负债总额', '股东权益', '存货',
                     '资产负债率', '产权比率', '流动比率', '速动比率', '现金比率']]
 
-    # 处理无限值和缺失值
-    result_df.replace([np.inf, -np.inf], np.nan, inplace=True)
-    result_df.fillna(0, inplace=True)
+    if output_file is not None:
+        output_file = storage.write_table(result_df, output_file, partition_cols=['报告期'])
+        print(f"资产负债表数据分析完成，保存至 {output_file}")
+    return result_df
 
-    result_df.to_csv(output_file, index=False)
-    print(f"资产负债表数据分析完成，保存至 {output_file}")
-
-def analyze_dividend(input_file, output_file):
+# 分红增长率依赖上一报告期的数据，任何报告期变化都需要整表重算
+@build_cache.cached_analysis(partitioned=False, depends_on=ANALYSIS_DEPENDENCIES)
+def analyze_dividend(input_file, output_file=None):
     """
     计算分红相关指标，并输出结果。
-    """
-    df = pd.read_csv(input_file, dtype={'股票代码': str})
 
-    # 确保股票代码长度为6位，填充前导零
-    df['股票代码'] = df['股票代码'].apply(lambda x: x.zfill(6))
+    input_file 可以是清洗后的表路径或 DataFrame；output_file 为 None 时只返回结果不写出。
+    """
+    # 清洗后的数据保留了缺失值，指标计算沿用缺失按0处理的口径
+    df = fill_numeric_na(storage.as_frame(input_file))
 
     # 计算财务指标
     # 使用 '现金分红-现金分红比例' 作为每股股利，单位是 元（需要确认）
     df['每股股利'] = df['现金分红-现金分红比例'] / 10
     df['每股收益'] = df['每股收益']
 
-    # 股利支付率 = 每股股利 / 每股收益
-    df['股利支付率'] = df['每股股利'] / df['每股收益']
-
     # 股息率 = 现金分红-股息率，直接使用
     df['股息率'] = df['现金分红-股息率']
 
-    # 股息覆盖率 = 每股收益 / 每股股利
-    df['股息覆盖率'] = df['每股收益'] / df['每股股利']
-
     # 分红增长率需要有前一期的每股股利，计算环比增长率
-    df.sort_values(by=['股票代码', '报告期'], inplace=True)
-    df['上期每股股利'] = df.groupby('股票代码')['每股股利'].shift(1)
-    df['分红增长率'] = (df['每股股利'] - df['上期每股股利']) / df['上期每股股利']
-    df['分红增长率'].fillna(0, inplace=True)
+    df = df.sort_values(by=['股票代码', '报告期'])
+    previous = df.groupby('股票代码', observed=True)['每股股利'].shift(1).to_numpy()
+
+    # 股利支付率、股息覆盖率、分红增长率，分母为零或没有上一期时记为0
+    df = pd.concat([df, ratios.compute_ratios(df, STATEMENT_CONFIG['dividend']['ratios'],
+                                              inputs={'上期每股股利': previous})], axis=1)
 
     # 选择需要的列
     result_df = df[['股票代码', '股票简称', '报告期', '每股股利', '每股收益', '股利支付率', '股息率', '股息覆盖率', '分红增长率']]
 
-    # 处理缺失值和无限值
-    result_df.replace([np.inf, -np.inf], np.nan, inplace=True)
-    result_df.fillna(0, inplace=True)
+    if output_file is not None:
+        output_file = storage.write_table(result_df, output_file, partition_cols=['报告期'])
+        print(f"分红数据分析完成，保存至 {output_file}")
+    return result_df
 
-    result_df.to_csv(output_file, index=False)
-    print(f"分红数据分析完成，保存至 {output_file}")
 
+# 公司规模指标及对应的排名列
+SCALE_RANKS = {'资产总额': '总资产排名', '净资产': '净资产排名', '营业收入': '营业收入排名'}
 
-def analyze_company_scale(year):
+def load_company_scale_data(report_dates):
+    """
+    从宽表一次读取多个报告期的公司规模数据（资产总额、净资产、营业收入及分红指标）。
     """
-    分析指定年份的公司规模，计算综合排名，并筛选出总资产、净资产、营业收入都进入前30%的企业。
+    filters = [('报告期', 'in', [int(d) for d in report_dates])]
+    df = fact_table.read_facts(['资产总额', '股东权益', '营业收入', '股息率', '股利支付率'], filters=filters)
+
+    # 只保留利润表和资产负债表都有数据的行，分红数据可能缺失
+    df = df.dropna(subset=['营业收入', '资产总额', '股东权益'])
+    data_df = df[['股票代码', '股票简称', '报告期', '资产总额', '股东权益', '营业收入', '股息率', '股利支付率']]
+    data_df = data_df.rename(columns={'股东权益': '净资产'}).reset_index(drop=True)
+    return fill_numeric_na(data_df)
+
+def rank_company_scale(data_df, quantile=0.7):
     """
-    import pandas as pd
-    import numpy as np
-
-    # 读取分析后的数据文件
-    income_df = pd.read_csv('data/analysis/income_statement_analysis.csv', dtype={'股票代码': str})
-    balance_df = pd.read_csv('data/analysis/balance_sheet_analysis.csv', dtype={'股票代码': str})
-    dividend_df = pd.read_csv('data/analysis/dividend_analysis.csv', dtype={'股票代码': str})
-
-    # 确保股票代码长度为6位，填充前导零
-    income_df['股票代码'] = income_df['股票代码'].apply(lambda x: x.zfill(6))
-    balance_df['股票代码'] = balance_df['股票代码'].apply(lambda x: x.zfill(6))
-    dividend_df['股票代码'] = dividend_df['股票代码'].apply(lambda x: x.zfill(6))
-
-    # 过滤指定年份的数据
-    report_date = f"{year}1231"  # 年报日期
-    report_date = int(report_date)
-    income_year = income_df[income_df['报告期'] == 20231231]
-    balance_year = balance_df[balance_df['报告期'] == report_date]
-    dividend_year = dividend_df[dividend_df['报告期'] == report_date]
-
-    # 合并数据
-    merged_df = pd.merge(income_year, balance_year, on=['股票代码', '股票简称', '报告期'], how='inner')
-    merged_df = pd.merge(merged_df, dividend_year, on=['股票代码', '股票简称', '报告期'], how='left')  # 分红数据可能缺失，用 left join
-
-    # 提取需要的字段
-    data_df = merged_df[['股票代码', '股票简称', '资产总额', '股东权益', '营业收入', '股息率', '股利支付率']]
-    data_df.rename(columns={'股东权益': '净资产'}, inplace=True)
-
-    # 处理缺失值
-    data_df.fillna(0, inplace=True)
-
-    # 计算综合排名
-    data_df['总资产排名'] = data_df['资产总额'].rank(ascending=False, method='min')
-    data_df['净资产排名'] = data_df['净资产'].rank(ascending=False, method='min')
-    data_df['营业收入排名'] = data_df['营业收入'].rank(ascending=False, method='min')
+    按报告期分组计算各规模指标的排名和综合排名，返回 (带排名的数据, 各报告期的分位数阈值, 是否全部达标)。
+    """
+    grouped = data_df.groupby('报告期')[list(SCALE_RANKS)]
+    ranks = grouped.rank(ascending=False, method='min')
+    data_df = data_df.assign(**{rank_col: ranks[col] for col, rank_col in SCALE_RANKS.items()})
     data_df['综合排名'] = ((data_df['总资产排名'] + data_df['净资产排名'] + data_df['营业收入排名']) / 3).round(0).astype(int)
 
-    # 计算前70%分位数（即前30%的阈值）
-    asset_threshold = data_df['资产总额'].quantile(0.7)
-    equity_threshold = data_df['净资产'].quantile(0.7)
-    revenue_threshold = data_df['营业收入'].quantile(0.7)
+    # 各报告期的分位数阈值，按行对齐后一次比较
+    thresholds = grouped.quantile(quantile)
+    aligned = thresholds.reindex(data_df['报告期']).to_numpy()
+    passed = (data_df[list(SCALE_RANKS)].to_numpy() >= aligned).all(axis=1)
+    return data_df, thresholds, passed
 
-    # 筛选总资产、净资产和营业收入都进入前30%的企业
-    filtered_df = data_df[
-        (data_df['资产总额'] >= asset_threshold) &
-        (data_df['净资产'] >= equity_threshold) &
-        (data_df['营业收入'] >= revenue_threshold)
-    ]
+def analyze_company_scales(years=None, output_file='data/analysis/top_companies'):
+    """
+    分析多个年份的公司规模，计算各年的综合排名，并筛选出总资产、净资产、营业收入都进入前30%的企业。
 
-    # 保存筛选结果
-    output_file = f'data/analysis/top_companies_{year}.csv'
-    filtered_df.to_csv(output_file, index=False)
-    print(f"筛选结果已保存至 {output_file}")
+    years 默认为 REPORT_DATES 中的全部年报年份。各年份只读取、合并一次，结果按报告期分区写入同一张表，
+    未参与本次计算的年份保持不变。返回 (全部数据及排名, 各年的阈值 DataFrame)。
+    """
+    if years is None:
+        years = sorted({d[:4] for d in REPORT_DATES if d.endswith('1231')})
+    report_dates = [int(f"{year}1231") for year in years]  # 年报日期
 
-    # 将所有数据和阈值返回，供可视化使用
-    thresholds = {
-        '资产总额': asset_threshold,
-        '净资产': equity_threshold,
-        '营业收入': revenue_threshold
-    }
+    data_df = load_company_scale_data(report_dates)
+    if data_df.empty:
+        # 年份不在 REPORT_DATES 内或对应年报尚未获取时宽表中没有这些报告期，不改动已有的筛选结果
+        print(f"宽表中没有 {', '.join(years)} 年的年报数据，请确认年份在 REPORT_DATES 内且数据已获取")
+        return data_df, pd.DataFrame(columns=list(SCALE_RANKS), dtype='float64')
+    data_df, thresholds, passed = rank_company_scale(data_df)
 
+    # 保存筛选结果
+    output_file = storage.update_partitions(data_df[passed], output_file, '报告期', report_dates)
+    print(f"{len(report_dates)} 个年份的筛选结果已保存至 {output_file}")
     return data_df, thresholds
 
+def analyze_company_scale(year):
+    """
+    分析指定年份的公司规模，返回 (数据及排名, 阈值字典)，供可视化使用。该年没有数据时返回空表和空字典。
+    """
+    data_df, thresholds = analyze_company_scales([str(year)])
+    if thresholds.empty:
+        return data_df.drop(columns='报告期'), {}
+    return data_df.drop(columns='报告期'), thresholds.iloc[0].to_dict()
+
 
 if __name__ == "__main__":
     '''
@@ -264,6 +260,5 @@ if __name__ == "__main__":
     analyze_dividend(input_file, output_file)
     '''
     
-    # 分析公司规模
-    year = '2023'
-    data_df, thresholds = analyze_company_scale(year)
\ No newline at end of file
+    # 分析各年份的公司规模
+    analyze_company_scales()
\ No newline at end of file
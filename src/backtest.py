@@ -0,0 +1,209 @@
+# src/backtest.py
+
+import sys
+import os
+import json
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+from config import SWEEP_GRID, SWEEP_WORKERS
+import build_cache
+import screening
+import fact_table
+
+# 排名立方体的缓存文件，宽表未变化时直接复用，不再重新读取、透视
+CUBE_FILE = os.path.join('data', 'analysis', 'rank_cube.npz')
+
+class RankCube:
+    """
+    预先计算好的 指标 × 报告期 × 股票 数组，用于快速评估大量选股条件组合。
+
+    - ranks：每个报告期截面内的排名位置（int16，从0开始，并列取最大位置，缺失为 -1）；
+    - counts：每个指标、报告期的有效值个数；
+    - values：指标原值（float64，与 ScreeningPanel 相同），用于股息率 ≥ 3% 这类数值阈值。
+      不降为 float32：与阈值相差不到 float32 精度的取值会被舍入到阈值上，比较结果与 select_stocks 不同。
+
+    对“≥ q 分位数”的条件，排名位置 ≥ q×(有效值个数-1) 与 值 ≥ 线性插值分位数 完全等价，
+    因此任一分位数阈值都只是一次整数比较，不需要重新排序。
+    """
+
+    def __init__(self, codes, periods, metrics, ranks, counts, values):
+        self.codes = codes
+        self.periods = periods
+        self.metrics = list(metrics)
+        self.ranks = ranks
+        self.counts = counts
+        self.values = values
+
+    @classmethod
+    def from_panel(cls, panel, metrics):
+        n_metrics, n_periods, n_codes = len(metrics), len(panel.periods), len(panel.codes)
+        rank_dtype = 'int16' if n_codes < np.iinfo('int16').max else 'int32'
+        ranks = np.full((n_metrics, n_periods, n_codes), -1, dtype=rank_dtype)
+        counts = np.zeros((n_metrics, n_periods), dtype='int32')
+        values = np.empty((n_metrics, n_periods, n_codes), dtype='float64')
+        for m, metric in enumerate(metrics):
+            column = panel.column(metric)
+            values[m] = column
+            for p in range(n_periods):
+                row = column[p]
+                valid = ~np.isnan(row)
+                ordered = np.sort(row[valid])
+                counts[m, p] = len(ordered)
+                ranks[m, p, valid] = np.searchsorted(ordered, row[valid], side='right') - 1
+        return cls(panel.codes, panel.periods, metrics, ranks, counts, values)
+
+    def save(self, path, inputs):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = json.dumps({'metrics': self.metrics, 'inputs': inputs}, ensure_ascii=False, sort_keys=True)
+        tmp_file = f'{path}.tmp.npz'
+        np.savez(tmp_file, codes=np.asarray(self.codes, dtype=str), periods=self.periods, ranks=self.ranks,
+                 counts=self.counts, values=self.values, meta=np.array(meta))
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path, metrics, inputs):
+        """
+        读取缓存的排名立方体，指标或输入的分析结果有变化时返回 None。
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['inputs'] != inputs or not set(metrics) <= set(meta['metrics']):
+                return None
+            index = [meta['metrics'].index(metric) for metric in metrics]
+            return cls(data['codes'], data['periods'], metrics, data['ranks'][index],
+                       data['counts'][index], data['values'][index])
+
+    def mask(self, metric, op, threshold):
+        """
+        返回单个条件在 报告期 × 股票 上是否满足，缺失值视为不满足。
+        """
+        m = self.metrics.index(metric)
+        if screening._is_quantile(threshold) and op in ('>=', '<'):
+            cutoff = threshold[1] * np.maximum(self.counts[m] - 1, 0)
+            above = self.ranks[m] >= cutoff[:, None]
+            return above if op == '>=' else (self.ranks[m] >= 0) & ~above
+        if screening._is_quantile(threshold):
+            raise ValueError(f"排名立方体只支持 >= 和 < 分位数条件：{metric} {op}")
+        return screening._OPS[op](self.values[m], threshold)
+
+def load_cube(metrics, source=fact_table.FACT_TABLE, path=CUBE_FILE):
+    """
+    读取或构建包含 metrics 的排名立方体。宽表的分区摘要和构建代码与缓存一致时直接读取缓存。
+
+    与 select_stocks 相同，只使用指标引用的列都有取值的行（screening.complete_rows）。
+    """
+    inputs = {'facts': build_cache.partition_fingerprints(source),
+              'code': build_cache.code_digest(RankCube, load_cube, screening)}
+    cube = RankCube.load(path, metrics, inputs)
+    if cube is not None:
+        print(f"排名立方体未变化，直接读取 {path}")
+        return cube
+    # 指标也可以是表达式，读取时展开为引用的列
+    columns = list(dict.fromkeys(c for metric in metrics for c in screening.expression_columns(metric)))
+    merged_df = screening.complete_rows(fact_table.read_facts(columns, source=source), columns)
+    cube = RankCube.from_panel(screening.ScreeningPanel(merged_df, columns), metrics)
+    cube.save(path, inputs)
+    print(f"排名立方体已保存至 {path}（{len(cube.metrics)} 个指标 × {len(cube.periods)} 个报告期 × {len(cube.codes)} 只股票）")
+    return cube
+
+# 工作进程共享的单条件掩码，由进程池的 initializer 设置
+_MASKS = None
+
+def _init_worker(masks):
+    global _MASKS
+    _MASKS = masks
+
+def _evaluate(combinations):
+    """
+    评估一批条件组合。每个组合为 (各条件的阈值序号, 统计期数, 最少满足次数)。
+
+    返回每个组合的 (最新选中的股票序号, 平均选中数量, 稳定性)。稳定性为相邻报告期选中集合的
+    平均 Jaccard 相似度（交集/并集），越接近 1 表示选中的股票随时间越稳定。
+    """
+    results = []
+    for levels, window, min_passes in combinations:
+        passed = _MASKS[0][levels[0]].copy()
+        for criterion, level in enumerate(levels[1:], start=1):
+            np.logical_and(passed, _MASKS[criterion][level], out=passed)
+        # 只从第一个完整的统计窗口开始统计；窗口很短，逐期错位相加比 cumsum 快
+        span = len(passed) - window + 1
+        flags = passed.view(np.uint8)
+        counts = flags[window - 1:].copy()
+        for k in range(1, window):
+            counts += flags[window - 1 - k:window - 1 - k + span]
+        selected = counts >= min_passes
+        # 按行调用不带 axis 的 count_nonzero，比沿轴归约快得多
+        sizes = np.array([np.count_nonzero(row) for row in selected])
+        both = selected[1:] & selected[:-1]
+        either = selected[1:] | selected[:-1]
+        intersection = np.array([np.count_nonzero(row) for row in both])
+        union = np.array([np.count_nonzero(row) for row in either])
+        # 相邻两期都没有选中股票时不计入，全部为空的组合稳定性为 NaN，排序时排在最后
+        nonempty = union > 0
+        stability = float((intersection[nonempty] / union[nonempty]).mean()) if nonempty.any() else np.nan
+        results.append((np.flatnonzero(selected[-1]), float(sizes.mean()), stability))
+    return results
+
+def _threshold_label(threshold):
+    return f'q{threshold[1]:g}' if screening._is_quantile(threshold) else threshold
+
+def sweep(cube, grid=SWEEP_GRID, workers=SWEEP_WORKERS, chunk_size=500):
+    """
+    在排名立方体上评估参数网格中的全部条件组合，各批组合在进程池中并行评估。
+
+    grid 的 criteria 为 [(指标, 运算符, [候选阈值, ...]), ...]，window 和 min_passes 为候选的统计期数
+    和最少满足次数（只取 min_passes ≤ window 的组合）。返回每个组合的阈值、最新选中的股票、
+    平均选中数量和稳定性。
+    """
+    criteria = grid['criteria']
+    # 每个条件、每个候选阈值的掩码只计算一次，组合时只需逐元素与运算
+    masks = [np.stack([cube.mask(metric, op, threshold) for threshold in thresholds])
+             for metric, op, thresholds in criteria]
+    windows = [(window, min_passes) for window in grid['window'] for min_passes in grid['min_passes']
+               if min_passes <= window and window <= len(cube.periods)]
+    combinations = [(levels, window, min_passes)
+                    for levels in itertools.product(*(range(len(thresholds)) for _, _, thresholds in criteria))
+                    for window, min_passes in windows]
+    chunks = [combinations[i:i + chunk_size] for i in range(0, len(combinations), chunk_size)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) <= 1:
+        _init_worker(masks)
+        results = [result for chunk in chunks for result in _evaluate(chunk)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(masks,)) as executor:
+            results = [result for chunk_results in executor.map(_evaluate, chunks) for result in chunk_results]
+
+    rows = []
+    for (levels, window, min_passes), (selected, mean_size, stability) in zip(combinations, results):
+        row = {f'{metric}{op}': _threshold_label(thresholds[level])
+               for (metric, op, thresholds), level in zip(criteria, levels)}
+        row.update({'统计期数': window, '最少满足次数': min_passes, '最新选中数量': len(selected),
+                    '平均选中数量': round(mean_size, 2), '稳定性': round(stability, 4),
+                    '股票代码': ','.join(cube.codes[selected])})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def run_sweep(grid=SWEEP_GRID, workers=SWEEP_WORKERS, output_file='data/analysis/screen_sweep.csv'):
+    """
+    读取或构建排名立方体，评估参数网格并保存结果（按稳定性、最新选中数量排序）。
+    """
+    metrics = [metric for metric, _, _ in grid['criteria']]
+    cube = load_cube(list(dict.fromkeys(metrics)))
+    result_df = sweep(cube, grid, workers)
+    result_df = result_df.sort_values(['稳定性', '最新选中数量'], ascending=False, ignore_index=True)
+    result_df.to_csv(output_file, index=False)
+    print(f"共评估 {len(result_df)} 组条件，结果已保存至 {output_file}")
+    print(result_df.drop(columns=['股票代码']).head(10))
+    return result_df
+
+if __name__ == "__main__":
+    run_sweep()
@@ -0,0 +1,189 @@
+# src/build_cache.py
+
+import sys
+import os
+import json
+import hashlib
+import inspect
+import functools
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import pandas as pd
+from config import STATEMENT_CONFIG
+import storage
+import periods
+from manifest import file_hash
+
+# 表示整张表为一个分区（CSV 或未分区的 Parquet 文件）
+WHOLE_TABLE = '*'
+
+def _digest(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def _source(obj):
+    if inspect.ismodule(obj) or callable(obj):
+        return inspect.getsource(inspect.unwrap(obj))
+    # 列表、字典等常量按 JSON 计入
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True)
+
+def code_digest(*objects):
+    """
+    计算函数或模块源码的摘要。传入模块时计入整个模块的源码，模块级常量和辅助函数的变化也能反映出来；
+    也可以传入 DEDUP_KEYS 这类常量。
+    """
+    return _digest(*(_source(obj) for obj in objects))
+
+def stage_signature(statement_type, *functions):
+    """
+    计算阶段的签名：相关 STATEMENT_CONFIG 条目（含 ratios 比率定义）和实现函数源码的摘要。
+
+    functions 可以包含模块和常量。任何一个发生变化，之前的缓存都视为失效。
+    """
+    config = json.dumps(STATEMENT_CONFIG[statement_type], ensure_ascii=False, sort_keys=True)
+    return {'config': _digest(config), 'code': code_digest(*functions)}
+
+def file_fingerprints(files):
+    """
+    计算 {分区键: 文件路径} 中每个文件的内容摘要。
+    """
+    return {key: file_hash(path) for key, path in files.items()}
+
+def partition_fingerprints(path):
+    """
+    计算数据表每个分区的内容摘要。
+
+    按报告期分区的 Parquet 目录返回 {'20231231': 摘要, ...}；单个文件的表返回 {'*': 摘要}。
+    """
+    _, target = storage.resolve_table(path)
+    if target is None:
+        raise FileNotFoundError(f"数据表 {storage.table_stem(path)} 不存在")
+    if not os.path.isdir(target):
+        return {WHOLE_TABLE: file_hash(target)}
+    fingerprints = {}
+    for entry in sorted(os.listdir(target)):
+        partition_dir = os.path.join(target, entry)
+        if not os.path.isdir(partition_dir) or '=' not in entry:
+            continue
+        hashes = sorted(file_hash(os.path.join(partition_dir, f)) for f in os.listdir(partition_dir))
+        fingerprints[entry.split('=', 1)[1]] = _digest(*hashes)
+    return fingerprints
+
+def _meta_file(output_path):
+    return f'{storage.table_stem(output_path)}.cache.json'
+
+def load_meta(output_path):
+    meta_file = _meta_file(output_path)
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_meta(output_path, signature, inputs):
+    """
+    记录输出表对应的阶段签名和输入分区摘要。
+    """
+    meta = dict(signature, inputs=inputs)
+    meta_file = _meta_file(output_path)
+    tmp_file = f'{meta_file}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_file, meta_file)
+
+def clear_meta(output_path):
+    """
+    删除输出表的缓存记录，下次运行时整体重算（输出由其他途径改写时使用）。
+    """
+    meta_file = _meta_file(output_path)
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+def plan(output_path, signature, inputs):
+    """
+    比较当前输入与上次构建的记录，决定如何更新输出表。
+
+    返回 (状态, 变化的分区, 删除的分区)，状态为：
+    - 'skip'：输入、配置和代码都没有变化，直接复用已有输出；
+    - 'partial'：只有部分分区变化，只需重算这些分区；
+    - 'full'：没有可用的缓存记录，或签名变化，或输入不是按分区组织的，需要全部重算。
+    """
+    meta = load_meta(output_path)
+    if meta is None or not storage.table_exists(output_path):
+        return 'full', sorted(inputs), []
+    if meta['config'] != signature['config'] or meta['code'] != signature['code']:
+        return 'full', sorted(inputs), []
+    previous = meta['inputs']
+    changed = sorted(key for key, value in inputs.items() if previous.get(key) != value)
+    removed = sorted(key for key in previous if key not in inputs)
+    if not changed and not removed:
+        return 'skip', [], []
+    if WHOLE_TABLE in inputs or WHOLE_TABLE in previous:
+        return 'full', sorted(inputs), []
+    return 'partial', changed, removed
+
+def partition_values(keys):
+    """
+    将分区键转换为 报告期 列的取值。
+    """
+    return [int(key) for key in keys]
+
+def cached_analysis(partitioned, lookback=0, depends_on=()):
+    """
+    为 analyze_* 函数加上基于内容摘要的构建缓存。
+
+    输入是已落盘的清洗结果、且需要写出结果时生效（输入在内存中或 use_cache=False 时照常写出，
+    并删除输出表原有的缓存记录）：输入分区、配置和代码都没有变化时跳过计算；
+    partitioned=True 表示各报告期的结果只依赖本期及之前 lookback 个季度的数据，只有部分报告期变化时
+    只重算受影响的分区（变化的报告期及其后 lookback 个季度）并拼接回输出表。
+    depends_on 为函数内部调用的其他函数或模块，其源码同样计入签名。
+    跳过或增量更新时返回 None，需要完整结果的调用方应从输出表读取。
+    """
+    def decorator(func):
+        statement_type = next(st for st, config in STATEMENT_CONFIG.items()
+                              if config['analysis_function'] == func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(input_file, output_file=None, use_cache=True):
+            if output_file is None:
+                return func(input_file, output_file)
+            if not use_cache or isinstance(input_file, pd.DataFrame):
+                # 内存中的输入没有分区摘要，写出的结果不记录缓存；旧的记录已与输出不符，先删除，下次整体重算
+                clear_meta(output_file)
+                return func(input_file, output_file)
+
+            signature = stage_signature(statement_type, func, *depends_on)
+            inputs = partition_fingerprints(input_file)
+            status, changed, removed = plan(output_file, signature, inputs)
+            if status == 'skip':
+                print(f"{func.__name__} 的输入、配置和代码均未变化，跳过计算")
+                return None
+            # 改写输出表之前先删除缓存记录，改写中途失败时下次运行整体重算，不会沿用与输出不符的记录
+            clear_meta(output_file)
+            if status == 'partial' and partitioned:
+                available = sorted(inputs)
+                targets = changed
+                if lookback:
+                    # 删除的报告期也会影响其后各期的同比、环比等指标
+                    affected = periods.affected_periods(changed + removed, available, lookback)
+                    targets = sorted(set(changed) | set(affected))
+                print(f"{func.__name__} 只重算变化的报告期：{', '.join(targets) or '无'}")
+                result_df = None
+                if targets:
+                    needed = periods.lookback_periods(targets, available, lookback) if lookback else targets
+                    df = storage.read_table(input_file, filters=[('报告期', 'in', partition_values(needed))])
+                    result_df = func(df, None)
+                    result_df = result_df[result_df['报告期'].isin(partition_values(targets))]
+                storage.update_partitions(result_df, output_file, '报告期', partition_values(targets + removed))
+                save_meta(output_file, signature, inputs)
+                return None
+
+            result_df = func(input_file, output_file)
+            save_meta(output_file, signature, inputs)
+            return result_df
+        return wrapper
+    return decorator
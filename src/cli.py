@@ -0,0 +1,148 @@
+# src/cli.py
+
+import sys
+import os
+import argparse
+import importlib
+
+# 统一的命令行入口：finance fetch|clean|analyze|select|plot|run|shard。
+# 启动时只导入标准库和 config，各子命令执行时才导入自己需要的模块：离线的子命令不导入 akshare、matplotlib，
+# polars、duckdb 只在选择对应引擎时导入。
+
+# 添加项目根目录和 src 目录到 sys.path，从任意目录运行时都能找到 config 和各模块。
+# 各模块的 data/ 等路径相对于当前目录，main 在执行子命令前会切换到工作目录：默认为项目根目录，可用 -C 指定
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'src')):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from config import REPORT_DATES, STATEMENT_TYPES, STATEMENT_CONFIG, COMPANY_CODES, CLEAN_STREAMING
+
+# 各子命令使用默认引擎时需要导入的模块
+COMMAND_MODULES = {
+    'fetch': ['data_fetch'],
+    'clean': ['data_clean'],
+    'analyze': ['analysis', 'fact_table', 'metric_cube'],
+    'select': ['stock_selection'],
+    'plot': ['visualization'],
+    'run': ['pipeline'],
+    'shard': ['sharding'],
+}
+
+# 参数原样交给模块自身的命令行解析的子命令
+FORWARDED = {
+    'fetch': '获取财务报表原始数据（参数同 python src/data_fetch.py）',
+    'run': '运行完整流水线（参数同 python src/pipeline.py）',
+    'shard': '按股票代码分片执行清洗、分析和选股（参数同 python src/sharding.py）',
+}
+
+def load_command(command):
+    """
+    导入子命令需要的模块，返回模块列表。
+    """
+    return [importlib.import_module(name) for name in COMMAND_MODULES[command]]
+
+def _clean(args):
+    if args.engine == 'polars':
+        import lazy_engine
+        for statement_type in args.statements:
+            lazy_engine.clean_statement(REPORT_DATES, statement_type)
+        return
+    data_clean, = load_command('clean')
+    for statement_type in args.statements:
+        data_clean.clean_financial_statements(REPORT_DATES, statement_type, streaming=args.streaming)
+
+def _analyze(args):
+    if args.engine == 'polars':
+        import lazy_engine
+        for statement_type in args.statements:
+            lazy_engine.analyze_statement(statement_type)
+    else:
+        analysis, _, _ = load_command('analyze')
+        for statement_type in args.statements:
+            config = STATEMENT_CONFIG[statement_type]
+            getattr(analysis, config['analysis_function'])(os.path.join('data', 'clean', config['clean_file']),
+                                                           os.path.join('data', 'analysis', config['analysis_file']))
+    if not args.skip_facts:
+        # 与流水线的 facts 节点相同：更新宽表和指标立方体，未变化时跳过
+        _, fact_table, metric_cube = load_command('analyze')
+        fact_table.build_fact_table()
+        metric_cube.build_metric_cube()
+
+def _select(args):
+    if args.engine == 'sql':
+        import sql_store
+        sql_store.load_store()
+        print(sql_store.select_stocks(output_file=args.output))
+    elif args.engine == 'polars':
+        import lazy_engine
+        lazy_engine.select_stocks(output_file=args.output)
+    else:
+        stock_selection, = load_command('select')
+        stock_selection.select_stocks(output_file=args.output)
+
+def _plot(args):
+    visualization, = load_command('plot')
+    visualization.visualize_companies(company_codes=args.companies, statement_types=args.statements)
+
+def _statement_type(value):
+    if value not in STATEMENT_TYPES:
+        raise argparse.ArgumentTypeError(f"未知的报表类型：{value}，可选 {', '.join(STATEMENT_TYPES)}")
+    return value
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='finance', description='财报获取、清洗、分析、选股和绘图的统一命令行入口')
+    parser.add_argument('-C', dest='workdir', default=ROOT,
+                        help='在指定目录下运行，data/ 等相对路径以该目录为准，默认为项目根目录而不是当前目录')
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+    for command, help_text in FORWARDED.items():
+        subparsers.add_parser(command, help=help_text, add_help=False)
+
+    # 位置参数为空时 argparse 会用 choices 检查默认值，因此用 type 逐个检查
+    statements = dict(nargs='*', type=_statement_type, default=STATEMENT_TYPES, metavar='STATEMENT',
+                      help=f"报表类型，默认为全部：{', '.join(STATEMENT_TYPES)}")
+    clean_parser = subparsers.add_parser('clean', help='清洗原始数据')
+    clean_parser.add_argument('statements', **statements)
+    clean_parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas', help='执行引擎')
+    clean_parser.add_argument('--streaming', action='store_true', default=CLEAN_STREAMING,
+                              help='逐个报告期清洗并追加写出（pandas 引擎）')
+    clean_parser.set_defaults(handler=_clean)
+
+    analyze_parser = subparsers.add_parser('analyze', help='计算各报表的分析指标，并更新宽表和指标立方体')
+    analyze_parser.add_argument('statements', **statements)
+    analyze_parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas', help='执行引擎')
+    analyze_parser.add_argument('--skip-facts', action='store_true', help='不更新宽表和指标立方体')
+    analyze_parser.set_defaults(handler=_analyze)
+
+    select_parser = subparsers.add_parser('select', help='按 SELECTION_CRITERIA 选股')
+    select_parser.add_argument('--engine', choices=['pandas', 'polars', 'sql'], default='pandas',
+                               help='执行引擎，sql 为先增量导入 DuckDB 分析库再执行参考 SQL')
+    select_parser.add_argument('--output', default='data/analysis/selected_stocks.csv', help='选股结果的保存路径')
+    select_parser.set_defaults(handler=_select)
+
+    plot_parser = subparsers.add_parser('plot', help='绘制指定公司的图表')
+    plot_parser.add_argument('statements', **statements)
+    plot_parser.add_argument('--companies', nargs='+', default=COMPANY_CODES, metavar='CODE',
+                             help='股票代码，默认为 COMPANY_CODES')
+    plot_parser.set_defaults(handler=_plot)
+    return parser
+
+def main(argv=None):
+    """
+    命令行入口，argv 默认为 sys.argv[1:]。
+    执行子命令前切换到工作目录（-C，默认为项目根目录），因此从任意目录启动时读写的都是同一份 data/。
+    """
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if args.command not in FORWARDED and rest:
+        parser.error(f"无法识别的参数：{' '.join(rest)}")
+    os.chdir(args.workdir)
+    if args.command in FORWARDED:
+        module, = load_command(args.command)
+        module.main(rest, prog=f'finance {args.command}')
+    else:
+        args.handler(args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
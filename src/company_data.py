@@ -0,0 +1,105 @@
+# src/company_data.py
+
+import sys
+import os
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+from config import STATEMENT_CONFIG
+import storage
+import normalize
+
+def analysis_table_path(statement_type):
+    """
+    返回指定报表类型的分析结果表路径。
+    """
+    return os.path.join('data', 'analysis', STATEMENT_CONFIG[statement_type]['analysis_file'])
+
+class CompanyDataset:
+    """
+    按公司访问分析结果的数据访问对象，供各可视化函数共享。
+
+    未指定数据源的报表从宽表中取该报表的列，宽表只读取一次；宽表尚未构建时读取该报表的分析表。
+    指定 company_codes 时只读取这些公司的行。每张报表按股票代码建立行号索引，
+    之后取任一公司的数据都是 O(1) 的索引查找，不再逐公司扫描整表。
+    """
+
+    def __init__(self, sources=None, company_codes=None):
+        # sources 为 {报表类型: 表路径或 DataFrame}，未指定的报表类型从宽表或 data/analysis 下的分析表读取
+        self.sources = dict(sources or {})
+        self.company_codes = list(normalize.normalize_stock_codes(company_codes)) if company_codes else None
+        self._tables = {}
+        self._index = {}
+        self._facts = None
+
+    def table(self, statement_type):
+        """
+        返回报表的分析结果（按股票代码、报告期排序），第一次调用时读取并建立索引。
+        """
+        if statement_type not in self._tables:
+            df = self._statement_facts(statement_type) if statement_type not in self.sources else None
+            if df is None:
+                source = self.sources.get(statement_type, analysis_table_path(statement_type))
+                df = storage.as_frame(source, filters=self._filters())
+                df = df.sort_values(['股票代码', '报告期'], kind='stable', ignore_index=True)
+            self._tables[statement_type] = df
+            self._index[statement_type] = df.groupby('股票代码', observed=True, sort=False).indices
+        return self._tables[statement_type]
+
+    def _filters(self):
+        return [('股票代码', 'in', self.company_codes)] if self.company_codes else None
+
+    def _statement_facts(self, statement_type):
+        """
+        从宽表取出一张报表的列和有数据的行（按股票代码、报告期排序），宽表中没有该报表时返回 None。
+        """
+        import fact_table
+
+        columns = fact_table.fact_columns()
+        if not columns or statement_type not in columns:
+            return None
+        if self._facts is None:
+            facts = fact_table.read_facts(filters=self._filters())
+            self._facts = facts.sort_values(['股票键', '报告期'], kind='stable', ignore_index=True)
+        metrics = columns[statement_type]
+        present = self._facts[metrics].notna().any(axis=1)
+        return self._facts.loc[present, ['股票代码', '股票简称'] + metrics + ['报告期']].reset_index(drop=True)
+
+    def codes(self, statement_type):
+        """
+        返回报表中出现的股票代码。
+        """
+        self.table(statement_type)
+        return list(self._index[statement_type])
+
+    def company(self, statement_type, code):
+        """
+        返回一家公司在报表中的全部报告期数据，没有数据时返回 None。
+        """
+        df = self.table(statement_type)
+        positions = self._index[statement_type].get(code)
+        if positions is None:
+            return None
+        return df.take(positions)
+
+    def codes_for_names(self, names, statement_type):
+        """
+        将股票简称转换为股票代码（简称可能变更或重名，优先使用股票代码）。
+        """
+        df = self.table(statement_type)
+        return list(df.loc[df['股票简称'].astype(str).isin(names), '股票代码'].astype(str).unique())
+
+    def display_name(self, code):
+        """
+        返回公司在已读取的各报表中最近一个报告期使用的股票简称，用作图表目录名。
+        """
+        latest = None
+        for statement_type in self._tables:
+            df_company = self.company(statement_type, code)
+            if df_company is None or df_company.empty:
+                continue
+            row = df_company.iloc[-1]
+            if latest is None or row['报告期'] > latest[0]:
+                latest = (row['报告期'], str(row['股票简称']))
+        return latest[1] if latest else code
@@ -2,72 +2,178 @@
 
 import sys
 import os
+import argparse
 
 # 添加项目根目录到 sys.path
 sys.path.append('.')
 
-from config import REPORT_DATES, STATEMENT_TYPES, STATEMENT_CONFIG
+from config import REPORT_DATES, STATEMENT_TYPES, STATEMENT_CONFIG, CLEAN_STREAMING
 import pandas as pd
+import storage
+import build_cache
+import normalize
+import periods
+import schema
 
-def clean_financial_statements(report_dates, statement_type):
+# 去重键：同一股票同一报告期只保留第一条记录（按报告期列表的顺序、报告期内按原始数据的行序）。
+# 流式和非流式清洗、lazy_engine 都按此规则去重。键中包含报告期，不同报告期的行不会重复，可以逐期去重
+DEDUP_KEYS = ['股票代码', '报告期']
+
+def raw_table_path(statement_type, report_date):
+    """
+    返回指定报表类型、报告期的原始数据表路径（不含扩展名）。
+    """
+    file_prefix = STATEMENT_CONFIG[statement_type]['file_prefix']
+    return os.path.join('data', 'raw', file_prefix, report_date, f'{file_prefix}_{report_date}')
+
+def clean_financial_statements(report_dates, statement_type, frames=None, persist=True, use_cache=True,
+                               streaming=CLEAN_STREAMING):
     """
     清洗并整合指定报告期列表的财务报表数据。
+
+    frames 为 {报告期: 原始数据} 时优先使用内存中的数据，其余报告期从 data/raw 读取；
+    persist=False 时只返回结果而不写出。
+
+    streaming=True 时逐个报告期清洗并追加写出，内存峰值只取决于单个报告期的数据量，
+    结果不在内存中合并，返回 None，下游应从输出表读取。streaming 需要 persist=True。
+
+    写出结果时使用构建缓存：原始文件、配置和代码都未变化则跳过，只有部分报告期的原始文件变化时
+    只清洗这些报告期并替换输出表中的对应分区。跳过或增量更新时返回 None，下游应从输出表读取。
+    """
+    output_file = os.path.join('data', 'clean', STATEMENT_CONFIG[statement_type]['clean_file'])
+    report_dates = periods.statement_report_dates(report_dates, statement_type)
+    if streaming and not persist:
+        raise ValueError("流式清洗的结果直接写出，不能与 persist=False 同时使用")
+
+    if persist and use_cache:
+        raw_files = {}
+        for report_date in report_dates:
+            _, raw_file = storage.resolve_table(raw_table_path(statement_type, report_date))
+            if raw_file is not None:
+                raw_files[report_date] = raw_file
+        inputs = build_cache.file_fingerprints(raw_files)
+        # 列类型（schema.STATEMENT_SCHEMAS）、代码和名称列的规范化（normalize）、去重键都影响清洗结果
+        signature = build_cache.stage_signature(statement_type, clean_statement_frames, iter_clean_periods,
+                                                prepare_period, schema, normalize, DEDUP_KEYS)
+        status, changed, removed = build_cache.plan(output_file, signature, inputs)
+        if status == 'skip':
+            print(f"{statement_type} 的原始数据、配置和代码均未变化，跳过清洗")
+            return None
+        # 清洗结果改写到一半时不能留下旧记录，先删除，成功后再重新记录
+        build_cache.clear_meta(output_file)
+        if status == 'partial':
+            print(f"{statement_type} 只重新清洗变化的报告期：{', '.join(changed) or '无'}")
+            replace_values = build_cache.partition_values(changed + removed)
+            if streaming:
+                output_file = storage.update_partitions(None, output_file, '报告期', replace_values)
+                output_file = _append_periods(changed, statement_type, frames, output_file) or output_file
+            else:
+                df = clean_statement_frames(changed, statement_type, frames) if changed else None
+                output_file = storage.update_partitions(df, output_file, '报告期', replace_values)
+            build_cache.save_meta(output_file, signature, inputs)
+            print(f"{statement_type} 数据清洗完成，保存至 {output_file}")
+            return None
+
+    if persist and not use_cache:
+        # 不使用缓存时写出的结果没有缓存记录，旧的记录已与输出不符
+        build_cache.clear_meta(output_file)
+    if streaming:
+        storage.remove_table(output_file)
+        output_file = _append_periods(report_dates, statement_type, frames, output_file)
+        if output_file is None:
+            print(f"没有可用的 {statement_type} 数据进行清洗。")
+            return None
+        if use_cache:
+            build_cache.save_meta(output_file, signature, inputs)
+        print(f"{statement_type} 数据清洗完成，保存至 {output_file}")
+        return None
+
+    combined_df = clean_statement_frames(report_dates, statement_type, frames)
+    if combined_df is None:
+        return None
+    if persist:
+        output_file = storage.write_table(combined_df, output_file, partition_cols=['报告期'])
+        if use_cache:
+            build_cache.save_meta(output_file, signature, inputs)
+        print(f"{statement_type} 数据清洗完成，保存至 {output_file}")
+    return combined_df
+
+def _append_periods(report_dates, statement_type, frames, output_file):
+    """
+    逐个报告期清洗并追加到输出表，返回实际写出的路径，没有任何数据时返回 None。
+    """
+    written = None
+    for df in iter_clean_periods(report_dates, statement_type, frames):
+        written = storage.append_table(df, output_file, partition_cols=['报告期'])
+    return written
+
+def _read_raw_period(statement_type, report_date, frames):
+    """
+    读取单个报告期的原始数据，内存中没有且文件不存在时返回 None。
+    """
+    input_file = raw_table_path(statement_type, report_date)
+    if report_date in frames or storage.table_exists(input_file):
+        return storage.as_frame(frames.get(report_date, input_file))
+    print(f"文件 {input_file} 不存在，跳过该报告期。")
+    return None
+
+def prepare_period(df, report_date, statement_type):
+    """
+    对单个报告期的原始数据做逐期处理：统一代码、名称列，添加报告期列，补齐营业成本列。
+    """
+    # 兼容旧版本保存的原始文件（使用“代码”“名称”列或未补零的代码）
+    df = normalize.normalize_stock_columns(df)
+    df['报告期'] = int(report_date)  # 添加报告期列
+    # 检查是否存在 '营业成本' 列，如果没有，则需要从其他列计算或获取
+    if statement_type == 'income_statement' and '营业成本' not in df.columns:
+        # 假设 '营业总支出-营业支出' 为 '营业成本'
+        df = df.rename(columns={'营业总支出-营业支出': '营业成本'})
+    return df
+
+def iter_clean_periods(report_dates, statement_type, frames=None):
+    """
+    逐个报告期生成清洗后的 DataFrame，任一时刻只有一个报告期的数据驻留内存。
+
+    按 DEDUP_KEYS 去重：已处理集合只需记录报告期本身，报告期内再按股票代码去重。
+    """
+    frames = frames or {}
+    seen_periods = set()
+    for report_date in report_dates:
+        if report_date in seen_periods:
+            continue
+        df = _read_raw_period(statement_type, report_date, frames)
+        if df is None:
+            continue
+        seen_periods.add(report_date)
+        df = prepare_period(df, report_date, statement_type)
+        df = df.drop_duplicates(subset=DEDUP_KEYS, ignore_index=True)
+        yield schema.apply_schema(df, statement_type)
+
+def clean_statement_frames(report_dates, statement_type, frames=None):
+    """
+    读取并清洗指定报告期的原始数据，返回合并后的 DataFrame，没有可用数据时返回 None。
     """
-    config = STATEMENT_CONFIG[statement_type]
-    file_prefix = config['file_prefix']
-    output_file = os.path.join('data', 'clean', config['clean_file'])
+    frames = frames or {}
 
     df_list = []
     for report_date in report_dates:
-        input_file = os.path.join('data', 'raw', file_prefix, report_date, f'{file_prefix}_{report_date}.csv')
-        if os.path.exists(input_file):
-            df = pd.read_csv(input_file, dtype={'股票代码': str})
-            if '代码' in df.columns:
-                df.rename(columns={'代码': '股票代码', '名称': '股票简称'}, inplace=True)
-            df['报告期'] = report_date  # 添加报告期列
-            df_list.append(df)
-        else:
-            print(f"文件 {input_file} 不存在，跳过该报告期。")
+        df = _read_raw_period(statement_type, report_date, frames)
+        if df is not None:
+            df_list.append(prepare_period(df, report_date, statement_type))
     if not df_list:
         print(f"没有可用的 {statement_type} 数据进行清洗。")
-        return
+        return None
     combined_df = pd.concat(df_list, ignore_index=True)
-    # 去除重复值
-    combined_df.drop_duplicates(inplace=True)
-    # 填充缺失值为0
-    combined_df.fillna(0, inplace=True)
-    # 数据类型转换
-    if statement_type == 'income_statement':
-        amount_columns = ['净利润', '净利润同比', '营业总收入', '营业总收入同比',
-                          '营业总支出-营业支出', '营业总支出-销售费用', '营业总支出-管理费用',
-                          '营业总支出-财务费用', '营业总支出-营业总支出', '营业利润', '利润总额',
-                          '营业成本']
-        # 检查是否存在 '营业成本' 列，如果没有，则需要从其他列计算或获取
-        if '营业成本' not in combined_df.columns:
-            # 假设 '营业总支出-营业支出' 为 '营业成本'
-            combined_df.rename(columns={'营业总支出-营业支出': '营业成本'}, inplace=True)
-    elif statement_type == 'cash_flow_statement':
-        amount_columns = ['净现金流-净现金流', '净现金流-同比增长', '经营性现金流-现金流量净额',
-                          '经营性现金流-净现金流占比', '投资性现金流-现金流量净额', '投资性现金流-净现金流占比',
-                          '融资性现金流-现金流量净额', '融资性现金流-净现金流占比']
-    elif statement_type == 'balance_sheet':
-        amount_columns = ['资产-货币资金', '资产-应收账款', '资产-存货', '资产-总资产', '资产-总资产同比',
-                          '负债-应付账款', '负债-总负债', '负债-预收账款', '负债-总负债同比', '资产负债率', '股东权益合计']
-    elif statement_type == 'dividend':
-        amount_columns = ['送转股份-送转总比例', '送转股份-送转比例', '送转股份-转股比例',
-                          '现金分红-现金分红比例', '现金分红-股息率', '每股收益', '每股净资产',
-                          '每股公积金', '每股未分配利润', '净利润同比增长', '总股本']
-    else:
-        amount_columns = []
-
-    for col in amount_columns:
-        if col in combined_df.columns:
-            combined_df[col] = pd.to_numeric(combined_df[col], errors='coerce')
-        else:
-            combined_df[col] = 0.0  # 如果列不存在，填充为0.0
-    combined_df.to_csv(output_file, index=False)
-    print(f"{statement_type} 数据清洗完成，保存至 {output_file}")
+    # 按 DEDUP_KEYS 去除重复值
+    combined_df = combined_df.drop_duplicates(subset=DEDUP_KEYS, ignore_index=True)
+    # 数据类型转换：按 schema 使用分类、int32 和 float32/float64，缺失值保留为 NaN
+    combined_df = schema.apply_schema(combined_df, statement_type)
+    return combined_df
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='清洗财务报表数据')
+    parser.add_argument('--streaming', action='store_true', default=CLEAN_STREAMING,
+                        help='逐个报告期清洗并追加写出，内存峰值只取决于单个报告期')
+    args = parser.parse_args()
     for statement_type in STATEMENT_TYPES:
-        clean_financial_statements(REPORT_DATES, statement_type)
\ No newline at end of file
+        clean_financial_statements(REPORT_DATES, statement_type, streaming=args.streaming)
\ No newline at end of file
@@ -2,46 +2,245 @@
 
 import sys
 import os
+import argparse
+import time
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # 添加项目根目录到 sys.path
 sys.path.append('.')
 
-from config import REPORT_DATES, STATEMENT_TYPES, STATEMENT_CONFIG
-import akshare as ak
-import pandas as pd
+from config import (REPORT_DATES, STATEMENT_TYPES, STATEMENT_CONFIG,
+                    FETCH_MAX_WORKERS, FETCH_RETRIES, FETCH_BACKOFF,
+                    REFRESH_LATEST_PERIODS, REFRESH_PERIOD_AGE_DAYS)
+import manifest
+import normalize
+import periods
+import storage
+import instrumentation
+import response_cache
 
-def fetch_financial_statements(report_dates, statement_type):
+def get_fetch_dates(report_dates, statement_type):
     """
-    获取指定报告期列表的财务报表数据。
+    返回指定报表类型实际需要获取的报告期列表。
+    """
+    return periods.statement_report_dates(report_dates, statement_type)
+
+def call_with_retry(fetch_function, report_date, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF):
+    """
+    调用 AkShare 接口，失败时按指数退避重试。每次调用的耗时和结果都记入运行日志。
+
+    返回 (数据, 最后一次调用耗时秒数, 尝试次数)。
     """
-    config = STATEMENT_CONFIG[statement_type]
-    fetch_function_name = config['fetch_function']
-    file_prefix = config['file_prefix']
-
-    # 动态获取 AkShare 函数
-    fetch_function = getattr(ak, fetch_function_name)
-
-    for report_date in report_dates:
-        # 对于分红数据，需要特殊处理，因为日期格式可能不同
-        if statement_type == 'dividend':
-            # 分红数据的日期格式为 'YYYY1231' 或 'YYYY0630'
-            # 我们只获取每年的年末数据
-            if report_date.endswith('1231'):
-                date = report_date
-            else:
-                continue  # 跳过非年末的数据
-            df = fetch_function(date=date)
-        else:
+    name = getattr(fetch_function, '__name__', 'fetch_function')
+    attempt = 0
+    while True:
+        attempt += 1
+        start = time.perf_counter()
+        try:
             df = fetch_function(date=report_date)
-        # 将股票代码转换为字符串，并填充前导零至6位
-        df['股票代码'] = df['股票代码'].apply(lambda x: str(x).zfill(6)) if '股票代码' in df.columns else df['代码'].apply(lambda x: str(x).zfill(6))
-        # 创建报告期文件夹
-        output_dir = os.path.join('data', 'raw', file_prefix, report_date)
-        os.makedirs(output_dir, exist_ok=True)
-        output_file = os.path.join(output_dir, f'{file_prefix}_{report_date}.csv')
-        df.to_csv(output_file, index=False)
-        print(f"{statement_type} 报告期 {report_date} 的数据获取完成，保存至 {output_file}")
+            elapsed = time.perf_counter() - start
+            instrumentation.log_event('akshare_call', stage=instrumentation.current_stage(), function=name,
+                                      report_date=report_date, attempt=attempt, seconds=round(elapsed, 4),
+                                      status='ok', rows=len(df))
+            instrumentation.count(akshare_calls=1, akshare_seconds=elapsed)
+            return df, elapsed, attempt
+        except response_cache.ReplayMissError:
+            # 回放模式下缓存缺失，重试也不会访问网络
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            instrumentation.log_event('akshare_call', stage=instrumentation.current_stage(), function=name,
+                                      report_date=report_date, attempt=attempt, seconds=round(elapsed, 4),
+                                      status='error', error=repr(e))
+            instrumentation.count(akshare_calls=1, akshare_errors=1, akshare_seconds=elapsed)
+            if attempt > retries:
+                raise
+            wait = backoff * 2 ** (attempt - 1)
+            print(f"{name}(date={report_date}) 第 {attempt} 次调用失败：{e}，{wait:.1f} 秒后重试")
+            time.sleep(wait)
+
+def get_fetch_function(statement_type):
+    """
+    返回报表类型对应的 AkShare 接口，按当前的缓存方式（response_cache.MODE）包装响应缓存。
+
+    akshare 只在需要访问接口时才导入，回放模式下无需安装。
+    """
+    name = STATEMENT_CONFIG[statement_type]['fetch_function']
+
+    def resolve():
+        import akshare as ak
+        # 动态获取 AkShare 函数
+        return getattr(ak, name)
+    return response_cache.cached(name, resolve)
+
+def save_raw_statement(df, statement_type, report_date):
+    """
+    保存单个报告期的原始数据，返回输出文件路径。
+    """
+    file_prefix = STATEMENT_CONFIG[statement_type]['file_prefix']
+    # 创建报告期文件夹
+    output_dir = os.path.join('data', 'raw', file_prefix, report_date)
+    return storage.write_table(df, os.path.join(output_dir, f'{file_prefix}_{report_date}'))
+
+def _fetch_and_save(statement_type, report_date, retries, backoff, fetch_log, keep_frames=False):
+    """
+    获取并保存一个 (报表类型, 报告期) 单元，结果记入 fetch_log，返回本次调用的统计信息。
+    接口的并发限制由提交方控制。
+    """
+    fetch_function = get_fetch_function(statement_type)
+    df, elapsed, attempts = call_with_retry(fetch_function, report_date, retries, backoff)
+    # 统一代码、名称列并将股票代码补齐为6位，下游阶段不再重复处理
+    df = normalize.normalize_stock_columns(df)
+    output_file = save_raw_statement(df, statement_type, report_date)
+    fetch_log.record_fetch(statement_type, report_date, output_file, len(df))
+    print(f"{statement_type} 报告期 {report_date} 的数据获取完成（{elapsed:.2f} 秒，第 {attempts} 次尝试），保存至 {output_file}")
+    result = {
+        'statement_type': statement_type,
+        'report_date': report_date,
+        'rows': len(df),
+        'elapsed': elapsed,
+        'attempts': attempts,
+        'output_file': output_file,
+    }
+    if keep_frames:
+        result['data'] = df
+    return result
+
+def fetch_all_statements(report_dates, statement_types, max_workers=FETCH_MAX_WORKERS,
+                         retries=FETCH_RETRIES, backoff=FETCH_BACKOFF, force=False,
+                         latest_periods=REFRESH_LATEST_PERIODS, period_age_days=REFRESH_PERIOD_AGE_DAYS,
+                         keep_frames=False, resume=False):
+    """
+    并发获取多个报表类型、多个报告期的财务报表数据。
+
+    所有 (报表类型, 报告期) 单元共享一个有界线程池，每个 AkShare 接口的同时调用数
+    不超过其 fetch_concurrency 配置：单元只在其接口有空闲名额时才提交，各接口轮流提交，
+    线程不会占着池中的位置等待某个接口，总并发数可达各接口上限之和（不超过 max_workers）。
+    原始数据清单中已完整的报告期会被跳过，
+    除非 force=True 或落在刷新策略范围内。返回每次调用的统计信息列表，
+    keep_frames=True 时统计信息中的 'data' 为获取到的 DataFrame，供下游阶段直接使用。
+
+    每个单元的状态（待获取、已完成、失败）记录在获取任务的检查点中。resume=True 时只获取上次任务中
+    未完成的单元（中断时仍待获取的和失败的），不重新规划；没有检查点记录时按正常方式规划。
+    """
+    units = manifest.remaining_units(statement_types) if resume else None
+    if units is not None:
+        print(f"从检查点继续上次的获取任务，剩余 {len(units)} 个单元")
+    else:
+        if resume:
+            print("没有可继续的获取任务，按正常方式规划")
+        units = []
+        for statement_type in statement_types:
+            fetch_dates = get_fetch_dates(report_dates, statement_type)
+            planned = manifest.plan_fetch(fetch_dates, statement_type, force, latest_periods, period_age_days)
+            skipped = len(fetch_dates) - len(planned)
+            if skipped:
+                print(f"{statement_type} 有 {skipped} 个报告期已完整获取，跳过")
+            units.extend((statement_type, report_date) for report_date in planned)
+        manifest.start_job(statement_types, units)
+    if not units:
+        print("所有报告期均已完整获取，无需下载")
+        return []
+
+    # 按接口排队，记录每个接口正在执行的单元数
+    pending = {}
+    for statement_type, report_date in units:
+        pending.setdefault(statement_type, deque()).append(report_date)
+    limits = {st: STATEMENT_CONFIG[st].get('fetch_concurrency', 1) for st in pending}
+    active = {st: 0 for st in pending}
+    workers = min(max_workers, len(units))
+
+    start = time.perf_counter()
+    results = []
+    errors = []
+    running = {}
+    # 获取结果和单元状态批量写入清单和检查点，退出时（包括出错时）写入剩余的记录
+    with manifest.FetchLog() as fetch_log, ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit_ready():
+            # 轮流从各接口取单元，直到线程池占满或有待获取单元的接口都达到并发上限
+            submitted = True
+            while submitted and len(running) < workers:
+                submitted = False
+                for statement_type, queue in pending.items():
+                    if queue and active[statement_type] < limits[statement_type] and len(running) < workers:
+                        report_date = queue.popleft()
+                        # 每个任务在复制的上下文中运行，调用耗时和写出的字节数计入提交任务的流水线阶段
+                        future = executor.submit(contextvars.copy_context().run, _fetch_and_save, statement_type,
+                                                 report_date, retries, backoff, fetch_log, keep_frames)
+                        running[future] = (statement_type, report_date)
+                        active[statement_type] += 1
+                        submitted = True
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                statement_type, report_date = running.pop(future)
+                active[statement_type] -= 1
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"{statement_type} 报告期 {report_date} 的数据获取失败：{e}")
+                    fetch_log.mark_unit(statement_type, report_date, manifest.FAILED, error=repr(e))
+                    errors.append((statement_type, report_date, e))
+            submit_ready()
+
+    total = time.perf_counter() - start
+    call_time = sum(result['elapsed'] for result in results)
+    print(f"共完成 {len(results)} 次调用，总耗时 {total:.2f} 秒，单次调用耗时合计 {call_time:.2f} 秒")
+    if errors:
+        statement_type, report_date, error = errors[0]
+        raise RuntimeError(f"{len(errors)} 个报告期获取失败，首个失败：{statement_type} {report_date}，"
+                           f"可使用 --resume 只重试未完成的报告期") from error
+    results.sort(key=lambda result: (statement_types.index(result['statement_type']), result['report_date']))
+    return results
+
+def fetch_financial_statements(report_dates, statement_type, max_workers=None,
+                               retries=FETCH_RETRIES, backoff=FETCH_BACKOFF, force=False,
+                               latest_periods=REFRESH_LATEST_PERIODS, period_age_days=REFRESH_PERIOD_AGE_DAYS,
+                               keep_frames=False, resume=False):
+    """
+    获取指定报告期列表的财务报表数据。
+
+    各报告期并发获取，并发数默认取该报表类型的 fetch_concurrency 配置。
+    """
+    if max_workers is None:
+        max_workers = STATEMENT_CONFIG[statement_type].get('fetch_concurrency', 1)
+    return fetch_all_statements(report_dates, [statement_type], max_workers, retries, backoff,
+                                force, latest_periods, period_age_days, keep_frames, resume)
+
+def _age_days(value):
+    """
+    解析 --max-age-days：none 表示不按时间刷新（对应配置中的 None），否则为非负整数天数。
+    """
+    if value.lower() == 'none':
+        return None
+    days = int(value)
+    if days < 0:
+        raise argparse.ArgumentTypeError(f"天数不能为负数：{value}")
+    return days
+
+def main(argv=None, prog=None):
+    """
+    命令行入口，argv 默认为 sys.argv[1:]，prog 为帮助信息中显示的命令名。
+    """
+    parser = argparse.ArgumentParser(prog=prog, description='获取财务报表原始数据')
+    parser.add_argument('--force', action='store_true', help='忽略原始数据清单，重新获取所有报告期')
+    parser.add_argument('--refresh-latest', type=int, default=REFRESH_LATEST_PERIODS,
+                        help='总是重新获取最近 N 个报告期')
+    parser.add_argument('--max-age-days', type=_age_days, default=REFRESH_PERIOD_AGE_DAYS,
+                        help='总是重新获取截止日距今不足 X 天的报告期，none 表示不按时间刷新')
+    parser.add_argument('--resume', action='store_true', help='从检查点继续上次中断或失败的获取任务，只获取未完成的报告期')
+    parser.add_argument('--cache', choices=response_cache.MODES, default=response_cache.MODE,
+                        help='AkShare 响应缓存：off、cache、record（录制）或 replay（离线回放）')
+    parser.add_argument('--cache-dir', default=response_cache.CACHE_DIR, help='AkShare 响应缓存的目录')
+    args = parser.parse_args(argv)
+    response_cache.MODE = args.cache
+    response_cache.CACHE_DIR = args.cache_dir
+    fetch_all_statements(REPORT_DATES, STATEMENT_TYPES, force=args.force,
+                         latest_periods=args.refresh_latest, period_age_days=args.max_age_days, resume=args.resume)
 
 if __name__ == "__main__":
-    for statement_type in STATEMENT_TYPES:
-        fetch_financial_statements(REPORT_DATES, statement_type)
\ No newline at end of file
+    main()
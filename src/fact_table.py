@@ -0,0 +1,139 @@
+# src/fact_table.py
+
+import sys
+import os
+import json
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import pandas as pd
+from config import STATEMENT_TYPES, FACT_RATIOS
+import storage
+import build_cache
+import company_data
+import ratios
+import screening
+import normalize
+
+# 预先合并好的宽表：每个 股票 × 报告期 一行，包含各报表的全部分析指标
+FACT_TABLE = os.path.join('data', 'analysis', 'fact_table')
+
+# 行标识列。股票键为股票代码的整数值（normalize.stock_key），不随股票简称变化，合并和索引都用它代替字符串
+ID_COLUMNS = ['股票键', '股票代码', '股票简称', '报告期']
+
+# 宽表中跨报表比率所在的分组（与各报表类型并列）
+DERIVED = 'derived'
+
+# 行键 = 报告期 × 10^6 + 股票键，按行键排序即按 (报告期, 股票键) 排序
+_KEY_BASE = 1_000_000
+
+def row_keys(df):
+    """
+    返回每行的 int64 行键。
+    """
+    return df['报告期'].to_numpy(dtype='int64') * _KEY_BASE + df['股票键'].to_numpy(dtype='int64')
+
+def join_facts(frames):
+    """
+    将各报表的分析结果按 (股票键, 报告期) 外连接成一张宽表，按报告期、股票键排序。
+
+    frames 为 {报表类型: DataFrame}。同名指标列只保留第一张表中的；股票代码、股票简称取第一张
+    包含该行的表。输入列齐全的跨报表比率（FACT_RATIOS）在合并后计算，归入 DERIVED 分组。
+    返回 (宽表, {报表类型: 该报表提供的指标列})。
+    """
+    ids, metrics, columns = [], [], {}
+    for statement_type, df in frames.items():
+        df = df.assign(股票键=normalize.stock_key(df['股票代码']).to_numpy())
+        df.index = row_keys(df)
+        df = df[~df.index.duplicated(keep='last')]
+        taken = {c for cols in columns.values() for c in cols}
+        columns[statement_type] = [c for c in df.columns if c not in ID_COLUMNS and c not in taken]
+        ids.append(df[ID_COLUMNS].astype({'股票代码': str, '股票简称': str}))
+        metrics.append(df[columns[statement_type]])
+
+    # 行键是唯一的整数索引，按索引对齐一次完成全部表的外连接
+    id_df = pd.concat(ids)
+    id_df = id_df[~id_df.index.duplicated(keep='first')]
+    wide_df = pd.concat([id_df] + metrics, axis=1).sort_index()
+    wide_df = wide_df.astype({'股票代码': 'category', '股票简称': 'category'}).reset_index(drop=True)
+
+    derived = [d for d in FACT_RATIOS if all(c in wide_df.columns for c in ratios.ratio_columns([d]))]
+    if derived:
+        wide_df = pd.concat([wide_df, ratios.compute_ratios(wide_df, derived)], axis=1)
+        columns[DERIVED] = [d[0] for d in derived]
+    return wide_df, columns
+
+def _signature(sources):
+    tables = json.dumps({st: storage.table_stem(path) for st, path in sources.items()}, ensure_ascii=False)
+    tables += json.dumps(FACT_RATIOS, ensure_ascii=False)
+    # 跨报表比率由 ratios 模块计算（表达式求值在 screening 模块中），其源码同样计入签名
+    return {'config': build_cache._digest(tables),
+            'code': build_cache.code_digest(join_facts, row_keys, normalize.stock_key, ratios, screening)}
+
+def _period_fingerprints(sources):
+    """
+    按报告期合并各分析表的分区摘要，任一报表的某个报告期变化，宽表的该报告期就需要重建。
+    """
+    per_source = {st: build_cache.partition_fingerprints(path) for st, path in sources.items()}
+    if any(build_cache.WHOLE_TABLE in fingerprints for fingerprints in per_source.values()):
+        # 有未分区的输入时无法按报告期增量更新，整体记为一个分区
+        return {build_cache.WHOLE_TABLE: build_cache._digest(json.dumps(per_source, sort_keys=True))}
+    keys = sorted({key for fingerprints in per_source.values() for key in fingerprints})
+    return {key: build_cache._digest(*(per_source[st].get(key, '') for st in sources)) for key in keys}
+
+def build_fact_table(sources=None, output_file=FACT_TABLE, use_cache=True):
+    """
+    构建或增量更新宽表。
+
+    sources 为 {报表类型: 表路径或 DataFrame}，默认使用 data/analysis 下各报表的分析表。
+    输入都是已落盘的分析表时，只重建分区摘要有变化的报告期，其余报告期的分区保持不变
+    （重新清洗单个报告期后只改写该报告期）；有输入在内存中时只在内存中合并，不写出。
+    跳过或增量更新时返回 None，需要完整结果的调用方应从输出表读取。
+    """
+    sources = sources or {st: company_data.analysis_table_path(st) for st in STATEMENT_TYPES}
+    if output_file is None or any(isinstance(source, pd.DataFrame) for source in sources.values()):
+        return join_facts({st: storage.as_frame(source) for st, source in sources.items()})[0]
+
+    signature = _signature(sources)
+    inputs = _period_fingerprints(sources)
+    status, changed, removed = build_cache.plan(output_file, signature, inputs) if use_cache \
+        else ('full', sorted(inputs), [])
+    if status == 'skip':
+        print("宽表的输入均未变化，跳过构建")
+        return None
+    # 先删除缓存记录再改写宽表，写出完成后重新记录
+    build_cache.clear_meta(output_file)
+
+    if status == 'partial':
+        print(f"宽表只重建变化的报告期：{', '.join(changed) or '无'}")
+        filters = [('报告期', 'in', build_cache.partition_values(changed))]
+        wide_df, columns = join_facts({st: storage.read_table(path, filters=filters) for st, path in sources.items()})
+        target = storage.update_partitions(wide_df, output_file, '报告期', build_cache.partition_values(changed + removed))
+        result_df = None
+    else:
+        wide_df, columns = join_facts({st: storage.read_table(path) for st, path in sources.items()})
+        target = storage.write_table(wide_df, output_file, partition_cols=['报告期'])
+        result_df = wide_df
+    # 各报表提供的列一并记录，按报表取数据时据此选列
+    build_cache.save_meta(output_file, dict(signature, columns=columns), inputs)
+    print(f"宽表已保存至 {target}（更新 {len(wide_df)} 行 × {wide_df.shape[1]} 列）")
+    return result_df
+
+def fact_columns(path=FACT_TABLE):
+    """
+    返回 {报表类型: 该报表提供的指标列}，宽表尚未构建时返回 None。
+    """
+    meta = build_cache.load_meta(path)
+    return meta.get('columns') if meta else None
+
+def read_facts(columns=None, filters=None, source=FACT_TABLE):
+    """
+    读取宽表的列切片（总是包含行标识列），按 (报告期, 股票键) 排序。source 可以是表路径或 DataFrame。
+    """
+    if columns is not None:
+        columns = ID_COLUMNS + [c for c in columns if c not in ID_COLUMNS]
+    return storage.as_frame(source, columns=columns, filters=filters)
+
+if __name__ == "__main__":
+    build_fact_table()
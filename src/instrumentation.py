@@ -0,0 +1,221 @@
+# src/instrumentation.py
+
+import sys
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import contextlib
+import contextvars
+from datetime import datetime
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+from config import RUN_LOG_FILE, PROFILE_MODE, PROFILE_DIR
+
+# 当前使用的运行日志和剖析方式，可在运行时修改（例如命令行参数覆盖配置）
+RUN_LOG = RUN_LOG_FILE
+PROFILE = PROFILE_MODE
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+
+# 本进程的运行编号，同一次运行写出的所有记录共享，用于在日志中区分各次运行
+RUN_ID = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+# 当前阶段的记录。流水线各节点在不同线程中执行，contextvars 保证各线程的计数互不干扰；
+# 节点内部再提交到线程池的任务需通过 contextvars.copy_context().run 继承所在阶段
+_current = contextvars.ContextVar('instrumentation_stage', default=None)
+_lock = threading.Lock()
+_tracing = 0
+# 同一时刻只允许一个阶段启用 cProfile：Python 3.12 起整个进程只能有一个活动的剖析器，
+# 并行执行的其他阶段跳过剖析
+_profiler_lock = threading.Lock()
+
+def peak_rss_mb():
+    """
+    返回进程至今的峰值常驻内存（MB），Windows 下不可用时返回 None。
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def log_event(event, **fields):
+    """
+    向运行日志追加一条 JSON 记录。
+    """
+    if not RUN_LOG:
+        return
+    record = {'run_id': RUN_ID, 'event': event, 'time': datetime.now().isoformat(timespec='milliseconds')}
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock:
+        parent = os.path.dirname(RUN_LOG)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with open(RUN_LOG, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+def count(**amounts):
+    """
+    累加当前阶段的计数（如 rows_read、bytes_written），不在任何阶段内时忽略。
+    """
+    record = _current.get()
+    if record is None:
+        return
+    with _lock:
+        counters = record['counters']
+        for key, value in amounts.items():
+            counters[key] = counters.get(key, 0) + value
+
+def current_stage():
+    """
+    返回当前阶段的名称，不在任何阶段内时返回 None。
+    """
+    record = _current.get()
+    return record['stage'] if record else None
+
+def _start_tracemalloc():
+    global _tracing
+    import tracemalloc
+
+    with _lock:
+        if _tracing == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing += 1
+    # tracemalloc 是进程级的，多个阶段并行时峰值包含其他阶段的分配
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+def _stop_tracemalloc(record, top=10):
+    global _tracing
+    import tracemalloc
+
+    _, peak = tracemalloc.get_traced_memory()
+    # 排除模块导入和 tracemalloc 自身的分配
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ])
+    record['traced_peak_mb'] = round(peak / 1e6, 1)
+    record['top_allocations'] = [str(stat) for stat in snapshot.statistics('lineno')[:top]]
+    with _lock:
+        _tracing -= 1
+        if _tracing == 0:
+            tracemalloc.stop()
+
+def _start_cprofile(name, record):
+    """
+    为阶段启用 cProfile，返回剖析器；已有其他阶段在剖析（并行的流水线节点）时不剖析，
+    在阶段记录中注明原因并返回 None。
+    """
+    import cProfile
+
+    if not _profiler_lock.acquire(blocking=False):
+        record['profile_skipped'] = '其他阶段正在剖析'
+        print(f"阶段 {name} 与其他正在剖析的阶段并行执行，跳过 cProfile 剖析")
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # 进程中已有其他剖析器（例如在外部用 cProfile 运行）
+        _profiler_lock.release()
+        record['profile_skipped'] = str(e)
+        print(f"阶段 {name} 无法启用 cProfile：{e}，跳过剖析")
+        return None
+    return profiler
+
+@contextlib.contextmanager
+def stage(name, profile=None, **fields):
+    """
+    记录一个阶段的墙钟时间、CPU 时间、峰值内存和读写计数，结束时写入运行日志。
+
+    cpu_seconds 为执行阶段的线程的 CPU 时间，process_cpu_seconds 为整个进程的 CPU 时间（并行阶段会相互重叠）；
+    peak_rss_mb 为进程至今的峰值常驻内存，对比各阶段结束时的取值可以看出是哪个阶段抬高了峰值。
+    profile 为 'cprofile' 或 'tracemalloc' 时对该阶段做性能剖析，默认使用 PROFILE。cProfile 同一时刻只剖析一个阶段，
+    与之并行的阶段跳过剖析，记录中的 profile_skipped 注明原因。
+    """
+    profile = profile or PROFILE
+    if profile and profile not in PROFILE_MODES:
+        raise ValueError(f"未知的剖析方式：{profile}，可选 {', '.join(PROFILE_MODES)}")
+    record = {'stage': name}
+    record.update(fields)
+    record['counters'] = {}
+    token = _current.set(record)
+
+    profiler = None
+    if profile == 'cprofile':
+        profiler = _start_cprofile(name, record)
+    elif profile == 'tracemalloc':
+        _start_tracemalloc()
+
+    wall_start, cpu_start, process_start = time.perf_counter(), time.thread_time(), time.process_time()
+    record['status'] = 'ok'
+    try:
+        yield record
+    except BaseException as e:
+        record['status'] = 'error'
+        record['error'] = repr(e)
+        raise
+    finally:
+        record['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_seconds'] = round(time.thread_time() - cpu_start, 4)
+        record['process_cpu_seconds'] = round(time.process_time() - process_start, 4)
+        record['peak_rss_mb'] = peak_rss_mb()
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            safe_name = re.sub(r'[^\w.-]', '_', name)
+            profile_file = os.path.join(PROFILE_DIR, f'{RUN_ID}_{safe_name}.prof')
+            profiler.dump_stats(profile_file)
+            record['profile_file'] = profile_file
+        elif profile == 'tracemalloc':
+            _stop_tracemalloc(record)
+        _current.reset(token)
+        counters = record.pop('counters')
+        record.update(counters)
+        log_event('stage', **record)
+
+def load_run_log(path=None, event='stage'):
+    """
+    读取运行日志中指定类型的记录，返回 DataFrame。
+    """
+    import pandas as pd
+
+    path = path or RUN_LOG
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return pd.DataFrame([record for record in records if record['event'] == event])
+
+def compare_runs(path=None, run_id=None, baseline_id=None):
+    """
+    对比两次运行各阶段的墙钟时间和峰值内存，默认对比最近两次运行。
+    """
+    df = load_run_log(path)
+    runs = list(dict.fromkeys(df['run_id']))
+    run_id = run_id or runs[-1]
+    baseline_id = baseline_id or (runs[-2] if len(runs) > 1 else None)
+    columns = ['wall_seconds', 'cpu_seconds', 'peak_rss_mb']
+    current = df[df['run_id'] == run_id].groupby('stage')[columns].sum()
+    if baseline_id is None:
+        return current
+    baseline = df[df['run_id'] == baseline_id].groupby('stage')[columns].sum()
+    result_df = current.join(baseline, rsuffix='_基线', how='left')
+    result_df['耗时变化'] = (result_df['wall_seconds'] / result_df['wall_seconds_基线']).round(2)
+    return result_df
+
+if __name__ == "__main__":
+    # 打印最近一次运行与上一次运行各阶段的对比
+    import pandas as pd
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(compare_runs())
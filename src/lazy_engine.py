@@ -0,0 +1,382 @@
+# src/lazy_engine.py
+
+import sys
+import os
+import operator
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+from config import STATEMENT_CONFIG, SELECTION_CRITERIA, SELECTION_WINDOW, SELECTION_MIN_PASSES
+import storage
+import build_cache
+import instrumentation
+import normalize
+import periods
+import schema
+import screening
+import ratios
+import data_clean
+import company_data
+import fact_table
+
+# 基于 Polars 惰性查询的执行引擎，与 data_clean、analysis、stock_selection 的 pandas 实现结果一致。
+# 各阶段先构建查询计划，列裁剪和过滤条件下推到文件扫描，再由流式引擎多线程分批执行并直接写出，
+# 不把整张表读入内存。需要安装 polars（可选依赖）。
+
+# 过滤条件的比较运算，与 storage 的过滤条件格式一致
+_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda column, value: column.is_in(list(value)),
+    'not in': lambda column, value: ~column.is_in(list(value)),
+}
+
+# 原始 CSV 中需要按文本读取的代码列（保留前导零）
+_CODE_COLUMNS = ['股票代码', '代码']
+
+def _polars():
+    try:
+        import polars as pl
+    except ImportError:
+        raise ImportError("polars 执行引擎需要安装 polars：pip install polars") from None
+    return pl
+
+def scan_table(path, columns=None, filters=None):
+    """
+    惰性扫描数据表，返回 LazyFrame。columns 和 filters 的含义与 storage.read_table 相同，
+    执行时下推到扫描：按分区存储的 Parquet 表跳过不满足条件的分区目录，只解码需要的列。
+    """
+    pl = _polars()
+    backend, target = storage.resolve_table(path)
+    if target is None:
+        raise FileNotFoundError(f"数据表 {storage.table_stem(path)} 不存在")
+    if backend == 'csv':
+        names = pl.scan_csv(target, n_rows=0).collect_schema().names()
+        lf = pl.scan_csv(target, infer_schema_length=None,
+                         schema_overrides={c: pl.String for c in _CODE_COLUMNS if c in names})
+    elif os.path.isdir(target):
+        # 报告期分区键与 pyarrow 读出的类型一致
+        lf = pl.scan_parquet(target, hive_partitioning=True, hive_schema={'报告期': pl.Int32})
+    else:
+        lf = pl.scan_parquet(target)
+    for column, op, value in filters or []:
+        lf = lf.filter(_OPS[op](pl.col(column), value))
+    if columns is not None:
+        names = lf.collect_schema().names()
+        lf = lf.select([c for c in columns if c in names])
+    return lf
+
+def _to_categorical(lf):
+    """
+    将文本列转换为分类类型，与 schema.apply_schema 写出的列类型一致。
+    """
+    pl = _polars()
+    return lf.with_columns(pl.col(pl.String, pl.Null).cast(pl.Categorical))
+
+def sink_table(lf, path, partition_col='报告期'):
+    """
+    执行查询计划并按当前存储后端写出（Parquet 按 partition_col 分区），返回实际写出的路径。
+
+    由流式引擎分批执行，结果不在内存中合并。写出后删除该表的构建缓存记录，
+    之后用 pandas 实现运行时会整体重算，不会误用旧的缓存判断。
+    """
+    pl = _polars()
+    stem = storage.table_stem(path)
+    storage.remove_table(stem)
+    parent = os.path.dirname(stem)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+    if storage.BACKEND == 'csv':
+        target = f'{stem}.csv'
+        lf.sink_csv(target)
+        files = [target]
+        rows = pl.scan_csv(target).select(pl.len()).collect().item()
+    else:
+        import pyarrow.dataset as ds
+
+        target = stem
+        lf.sink_parquet(pl.PartitionBy(target, key=partition_col, include_key=False), mkdir=True)
+        files = [os.path.join(root, f) for root, _, names in os.walk(target) for f in names]
+        rows = ds.dataset(target, format='parquet', partitioning='hive').count_rows()
+    instrumentation.count(rows_written=rows, bytes_written=sum(os.path.getsize(f) for f in files))
+    build_cache.clear_meta(stem)
+    return target
+
+def _prepare_period(lf, report_date, statement_type):
+    """
+    与 data_clean.prepare_period 相同的逐期处理：统一代码、名称列，添加报告期列，补齐营业成本列。
+    """
+    pl = _polars()
+    names = lf.collect_schema().names()
+    aliases = {old: new for old, new in normalize.COLUMN_ALIASES.items() if old in names}
+    if aliases:
+        lf = lf.drop([new for new in aliases.values() if new in names]).rename(aliases)
+    lf = lf.with_columns(pl.col('股票代码').cast(pl.String).str.zfill(normalize.CODE_WIDTH),
+                         pl.lit(int(report_date), dtype=pl.Int64).alias('报告期'))
+    if statement_type == 'income_statement' and '营业成本' not in names and '营业总支出-营业支出' in names:
+        lf = lf.rename({'营业总支出-营业支出': '营业成本'})
+    return lf
+
+def _apply_schema(lf, statement_type):
+    """
+    与 schema.apply_schema 相同的列类型转换，缺少的金额列、比率列整列记为缺失并追加在末尾。
+    """
+    pl = _polars()
+    spec = schema.STATEMENT_SCHEMAS.get(statement_type, {})
+    names = lf.collect_schema().names()
+    dtypes = {schema.AMOUNT_DTYPE: pl.Float64, schema.RATIO_DTYPE: pl.Float32}
+    columns = []
+    for kind, dtype in (('amount', schema.AMOUNT_DTYPE), ('ratio', schema.RATIO_DTYPE)):
+        for col in spec.get(kind, []):
+            value = pl.col(col).cast(dtypes[dtype], strict=False) if col in names else pl.lit(None, dtype=dtypes[dtype])
+            columns.append(value.alias(col))
+    lf = lf.with_columns(columns).with_columns(pl.col('报告期').cast(pl.Int32))
+    return _to_categorical(lf)
+
+def clean_statement(report_dates, statement_type):
+    """
+    清洗并整合指定报告期的原始数据，写出到 data/clean，返回实际写出的路径，没有可用数据时返回 None。
+
+    结果与 data_clean.clean_financial_statements 一致：按 data_clean.DEDUP_KEYS 去重，可以在各报告期内进行，
+    因此各报告期的扫描、去重和类型转换相互独立，由流式引擎并行处理。
+    """
+    pl = _polars()
+    output_file = os.path.join('data', 'clean', STATEMENT_CONFIG[statement_type]['clean_file'])
+    frames = []
+    for report_date in periods.statement_report_dates(report_dates, statement_type):
+        input_file = data_clean.raw_table_path(statement_type, report_date)
+        if not storage.table_exists(input_file):
+            print(f"文件 {input_file} 不存在，跳过该报告期。")
+            continue
+        lf = _prepare_period(scan_table(input_file), report_date, statement_type)
+        frames.append(lf.unique(subset=data_clean.DEDUP_KEYS, keep='first', maintain_order=True))
+    if not frames:
+        print(f"没有可用的 {statement_type} 数据进行清洗。")
+        return None
+    lf = _apply_schema(pl.concat(frames, how='diagonal_relaxed'), statement_type)
+    output_file = sink_table(lf, output_file)
+    print(f"{statement_type} 数据清洗完成，保存至 {output_file}")
+    return output_file
+
+def _fill_numeric_na(lf):
+    """
+    与 analysis.fill_numeric_na 相同：只对数值列填充缺失值。
+    """
+    pl = _polars()
+    import polars.selectors as cs
+
+    return lf.with_columns(cs.float().fill_nan(0)).with_columns(cs.numeric().fill_null(0))
+
+def ratio_exprs(definitions, inputs=None):
+    """
+    将比率定义转换为 Polars 表达式，分母为零的处理与 ratios.compute_ratios 相同。
+    inputs 为 {名称: 表达式}，提供表中没有的输入。
+    """
+    pl = _polars()
+    values = {name: pl.col(name) for name in ratios.ratio_columns(definitions)}
+    values.update(inputs or {})
+    exprs = []
+    for definition in definitions:
+        name, numerator, denominator, on_zero = ratios.parse_ratio(definition)
+        num = screening.evaluate_expression(numerator, values)
+        den = screening.evaluate_expression(denominator, values)
+        fill = ratios.ZERO_POLICIES[on_zero]
+        valid = (den != 0) & num.is_finite() & den.is_finite()
+        exprs.append(pl.when(valid).then(num / den).otherwise(None if np.isnan(fill) else fill).alias(name))
+    return exprs
+
+def _divide(expr, constant):
+    """
+    逐元素除以常数，结果与 pandas 逐位相同且保持列类型（float32 列仍为 float32）。
+
+    Polars 把除以标量实现为乘以倒数，末位可能与 pandas 不同；除数展开成与 expr 同类型的列后逐元素相除。
+    """
+    return expr / ((expr * 0).fill_nan(0) + constant)
+
+def _growth(current, previous):
+    # 与 periods._growth 相同：基期为负时用绝对值作分母，结果不是有限值时记为缺失
+    pl = _polars()
+    growth = (current - previous) / previous.abs()
+    return pl.when(growth.is_finite()).then(growth)
+
+def _join_lags(lf, columns, lags):
+    """
+    为每行连接同一股票往前 lag 个季度的值（列名为 {列}_{lag}），该报告期不存在时为缺失值。
+    """
+    pl = _polars()
+    keys = ['股票代码', '_期序']
+    for lag in lags:
+        previous = lf.select([pl.col('股票代码'), (pl.col('_期序') + lag).alias('_期序')]
+                             + [pl.col(col).alias(f'{col}_{lag}') for col in columns])
+        previous = previous.unique(subset=keys, keep='first', maintain_order=True)
+        lf = lf.join(previous, on=keys, how='left', maintain_order='left')
+    return lf
+
+def add_period_metrics(lf, columns):
+    """
+    与 periods.add_period_metrics 相同的单季值、TTM、同比和单季环比，回看通过按 (股票代码, 季度序号)
+    的自连接完成。返回按 (股票代码, 报告期) 排序的 LazyFrame。
+    """
+    pl = _polars()
+    date = pl.col('报告期').cast(pl.Int64)
+    lf = lf.with_columns((date // 10000 * periods.QUARTERS_PER_YEAR + date % 10000 // 300 - 1).alias('_期序'))
+    lf = lf.with_columns([pl.col(col).cast(pl.Float64) for col in columns])
+    lf = _join_lags(lf, columns, range(1, periods.MAX_LAG + 1))
+
+    quarter = pl.col('_期序') % periods.QUARTERS_PER_YEAR + 1
+    metrics = []
+    for col in columns:
+        current = pl.col(col)
+        previous = {lag: pl.col(f'{col}_{lag}') for lag in range(1, periods.MAX_LAG + 1)}
+        last_annual = pl.when(quarter == 1).then(previous[1]).when(quarter == 2).then(previous[2]) \
+            .when(quarter == 3).then(previous[3])
+        metrics += [
+            pl.when(quarter == 1).then(current).otherwise(current - previous[1]).alias(f'单季{col}'),
+            pl.when(quarter == periods.QUARTERS_PER_YEAR).then(current)
+            .otherwise(current + last_annual - previous[periods.MAX_LAG]).alias(f'{col}TTM'),
+            _growth(current, previous[periods.MAX_LAG]).alias(f'{col}同比'),
+        ]
+    lf = lf.with_columns(metrics)
+
+    singles = [f'单季{col}' for col in columns]
+    lf = _join_lags(lf, singles, [1])
+    lf = lf.with_columns([_growth(pl.col(single), pl.col(f'{single}_1')).alias(f'{single}环比') for single in singles])
+    return lf.sort(['股票代码', '报告期'], maintain_order=True)
+
+def _analyze_income_statement(lf):
+    pl = _polars()
+    lf = lf.with_columns(pl.col('营业总收入').alias('营业收入'))
+    expenses = (pl.col('营业总支出-销售费用') + pl.col('营业总支出-管理费用')
+                + pl.col('营业总支出-财务费用').clip(lower_bound=0))
+    lf = lf.with_columns(ratio_exprs(STATEMENT_CONFIG['income_statement']['ratios'], inputs={'费用总额': expenses}))
+    growth_columns = ['营业收入', '净利润']
+    lf = add_period_metrics(lf, growth_columns)
+    return lf.select(['股票代码', '股票简称', '报告期', '营业收入', '营业成本', '毛利率', '费用率', '营业利润率', '毛利润费用占比']
+                     + periods.period_metric_columns(growth_columns))
+
+def _analyze_cash_flow_statement(lf):
+    pl = _polars()
+    operating = pl.col('经营性现金流-现金流量净额')
+    investing = pl.col('投资性现金流-现金流量净额')
+    financing = pl.col('融资性现金流-现金流量净额')
+    lf = lf.with_columns(
+        _divide(operating, 1e4).alias('经营活动现金流净额'),
+        _divide(investing, 1e4).alias('投资活动现金流净额'),
+        _divide(financing, 1e4).alias('融资活动现金流净额'),
+        _divide(operating + investing + financing, 1e4).alias('自有经营现金净额'),
+    )
+    growth_columns = ['经营活动现金流净额', '自有经营现金净额']
+    lf = add_period_metrics(lf, growth_columns)
+    return lf.select(['股票代码', '股票简称', '报告期', '经营活动现金流净额', '投资活动现金流净额', '融资活动现金流净额', '自有经营现金净额']
+                     + periods.period_metric_columns(growth_columns))
+
+def _analyze_balance_sheet(lf):
+    pl = _polars()
+    lf = lf.with_columns(
+        _divide(pl.col('资产-总资产'), 1e4).alias('资产总额'),
+        _divide(pl.col('负债-总负债'), 1e4).alias('负债总额'),
+        _divide(pl.col('股东权益合计'), 1e4).alias('股东权益'),
+        _divide(pl.col('资产-存货'), 1e4).alias('存货'),
+        _divide(pl.col('资产负债率'), 100).alias('资产负债率'),
+        *ratio_exprs(STATEMENT_CONFIG['balance_sheet']['ratios']),
+    )
+    return lf.select(['股票代码', '股票简称', '报告期', '资产总额', '负债总额', '股东权益', '存货',
+                      '资产负债率', '产权比率', '流动比率', '速动比率', '现金比率'])
+
+def _analyze_dividend(lf):
+    pl = _polars()
+    lf = lf.with_columns(_divide(pl.col('现金分红-现金分红比例'), 10).alias('每股股利'),
+                         pl.col('现金分红-股息率').alias('股息率'))
+    lf = lf.sort(['股票代码', '报告期'], maintain_order=True)
+    previous = pl.col('每股股利').shift(1).over('股票代码')
+    lf = lf.with_columns(ratio_exprs(STATEMENT_CONFIG['dividend']['ratios'], inputs={'上期每股股利': previous}))
+    return lf.select(['股票代码', '股票简称', '报告期', '每股股利', '每股收益', '股利支付率', '股息率', '股息覆盖率', '分红增长率'])
+
+_ANALYSES = {
+    'income_statement': _analyze_income_statement,
+    'cash_flow_statement': _analyze_cash_flow_statement,
+    'balance_sheet': _analyze_balance_sheet,
+    'dividend': _analyze_dividend,
+}
+
+def analyze_statement(statement_type, input_file=None, output_file=None):
+    """
+    计算报表的分析指标并写出，返回实际写出的路径。结果与 analysis 中对应的 analyze_* 函数一致。
+
+    默认读取 data/clean 下的清洗结果，写出到 data/analysis 下的分析表。
+    """
+    pl = _polars()
+    config = STATEMENT_CONFIG[statement_type]
+    input_file = input_file or os.path.join('data', 'clean', config['clean_file'])
+    output_file = output_file or company_data.analysis_table_path(statement_type)
+    # 股票代码按文本处理，排序与 pandas 分类列（类别按代码排序）的顺序一致
+    lf = scan_table(input_file).with_columns(pl.col('股票代码').cast(pl.String))
+    lf = _to_categorical(_ANALYSES[statement_type](_fill_numeric_na(lf)))
+    output_file = sink_table(lf, output_file)
+    print(f"{statement_type} 数据分析完成，保存至 {output_file}")
+    return output_file
+
+def select_stocks(facts_source=fact_table.FACT_TABLE, output_file='data/analysis/selected_stocks.csv',
+                  criteria=SELECTION_CRITERIA, window=SELECTION_WINDOW, min_passes=SELECTION_MIN_PASSES):
+    """
+    与 stock_selection.select_stocks 相同的选股，返回选中股票的 DataFrame。
+
+    只扫描宽表中条件涉及的列和最近 window 个报告期的分区；分位数阈值按报告期窗口函数计算，
+    缺失值视为不满足条件。与 screening.complete_rows 相同，只保留条件列都有取值的行。
+    """
+    pl = _polars()
+    columns = screening.criteria_columns(criteria)
+    lf = scan_table(facts_source, columns=fact_table.ID_COLUMNS + columns)
+    if columns:
+        lf = lf.filter(pl.all_horizontal([pl.col(c).is_not_null() & pl.col(c).cast(pl.Float64).is_not_nan()
+                                          for c in columns]))
+    recent = lf.select(pl.col('报告期').unique().sort()).collect()['报告期'].to_list()[-window:]
+    if not recent:
+        # 与 stock_selection.screen_facts 相同：没有条件列都有取值的行时不选出任何股票
+        print("没有条件涉及的列都有取值的行，没有选出股票")
+        selected_df = lf.select(['股票代码', '股票简称'] + columns).head(0).collect().to_pandas() \
+            .assign(满足条件次数=pd.Series(dtype='int64'))
+        return _save_selection(selected_df, output_file)
+    lf = lf.filter(pl.col('报告期').is_in(recent))
+
+    values = {col: pl.col(col).cast(pl.Float64) for col in columns}
+    conditions = []
+    for expression, op, value in criteria:
+        column = screening.evaluate_expression(expression, values)
+        column = pl.when(column.is_finite()).then(column)
+        if screening._is_quantile(value):
+            threshold = column.quantile(value[1], interpolation='linear').over('报告期')
+        else:
+            threshold = pl.lit(value)
+        conditions.append(_OPS[op](column, threshold).fill_null(False))
+    passed = pl.all_horizontal(conditions) if conditions else pl.lit(True)
+    # 分位数阈值的窗口函数须在分组聚合之前计算，放进 agg 中会变成按股票分组计算
+    lf = lf.with_columns(passed.alias('_满足条件'))
+    counts = lf.group_by('股票代码').agg(pl.col('_满足条件').cast(pl.Int32).sum().alias('满足条件次数'))
+
+    # 获取选中公司最新报告期的指标
+    latest = lf.filter(pl.col('报告期') == recent[-1]).join(counts, on='股票代码', how='left')
+    latest = latest.with_columns(pl.col('满足条件次数').fill_null(0))
+    selected = latest.filter(pl.col('满足条件次数') >= min_passes).sort('股票键')
+    selected_df = selected.select(['股票代码', '股票简称'] + columns + ['满足条件次数']).unique(maintain_order=True) \
+        .collect().to_pandas()
+    return _save_selection(selected_df, output_file)
+
+def _save_selection(selected_df, output_file):
+    """
+    输出并保存选股结果，返回 selected_df。
+    """
+    print("选中的股票列表及其指标：")
+    print(selected_df)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    selected_df.to_csv(output_file, index=False)
+    print(f"筛选结果已保存至 {output_file}")
+    return selected_df
@@ -0,0 +1,219 @@
+# src/manifest.py
+
+import sys
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+from config import REFRESH_LATEST_PERIODS, REFRESH_PERIOD_AGE_DAYS, FETCH_CHECKPOINT_SECONDS
+
+# 原始数据清单文件，与 data/raw 目录同级
+MANIFEST_FILE = os.path.join('data', 'raw_manifest.json')
+
+# 获取任务的检查点文件，记录每个 (报表类型, 报告期) 单元的状态，中断后可用 --resume 继续
+FETCH_JOB_FILE = os.path.join('data', 'fetch_job.json')
+
+# 单元状态：待获取、已完成、失败
+PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+
+_lock = threading.Lock()
+
+def file_hash(path):
+    """
+    计算文件内容的 SHA-256 摘要。
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _entry_key(statement_type, report_date):
+    return f'{statement_type}/{report_date}'
+
+def load_manifest(path=MANIFEST_FILE):
+    """
+    读取原始数据清单，文件不存在时返回空清单。
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    """
+    原子地写入原始数据清单，避免中断时留下半个文件。
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def get_entry(manifest, statement_type, report_date):
+    return manifest.get(_entry_key(statement_type, report_date))
+
+def fetch_entry(statement_type, report_date, output_file, rows):
+    """
+    生成一个 (报表类型, 报告期) 的清单记录：获取时间、行数、内容摘要以及文件大小和修改时间。
+    """
+    stat = os.stat(output_file)
+    return {
+        'statement_type': statement_type,
+        'report_date': report_date,
+        'file': output_file,
+        'rows': rows,
+        'sha256': file_hash(output_file),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'fetched_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+def is_complete(entry):
+    """
+    判断清单记录对应的原始文件是否仍然完整。
+
+    文件大小和修改时间与记录一致时直接视为完整，不读取文件内容；不一致（或旧记录中没有）时再比较内容摘要。
+    """
+    if entry is None:
+        return False
+    try:
+        stat = os.stat(entry['file'])
+    except OSError:
+        return False
+    if stat.st_size == entry.get('size') and stat.st_mtime_ns == entry.get('mtime_ns'):
+        return True
+    return file_hash(entry['file']) == entry['sha256']
+
+def periods_to_refresh(report_dates, latest_periods=REFRESH_LATEST_PERIODS,
+                       period_age_days=REFRESH_PERIOD_AGE_DAYS, today=None):
+    """
+    根据刷新策略返回即使已完整也需要重新获取的报告期集合。
+
+    - 最近 latest_periods 个报告期总是重新获取；
+    - 报告期截止日距今不足 period_age_days 天的也重新获取（财报可能仍在披露或修订）。
+    """
+    ordered = sorted(report_dates)
+    refresh = set(ordered[-latest_periods:]) if latest_periods else set()
+    if period_age_days is not None:
+        today = today or datetime.now()
+        cutoff = today - timedelta(days=period_age_days)
+        refresh.update(d for d in ordered if datetime.strptime(d, '%Y%m%d') >= cutoff)
+    return refresh
+
+def plan_fetch(report_dates, statement_type, force=False, latest_periods=REFRESH_LATEST_PERIODS,
+               period_age_days=REFRESH_PERIOD_AGE_DAYS, path=MANIFEST_FILE):
+    """
+    返回指定报表类型需要（重新）获取的报告期列表，已完整且不在刷新范围内的报告期被跳过。
+    """
+    if force:
+        return list(report_dates)
+    manifest = load_manifest(path)
+    refresh = periods_to_refresh(report_dates, latest_periods, period_age_days)
+    return [report_date for report_date in report_dates
+            if report_date in refresh or not is_complete(get_entry(manifest, statement_type, report_date))]
+
+def start_job(statement_types, units, path=FETCH_JOB_FILE):
+    """
+    为 statement_types 开始新的获取任务：清除这些报表类型之前的单元记录，将 units 记为待获取。
+
+    各报表类型的单元相互独立，流水线中并发运行的各获取节点可以共用一个检查点文件。
+    """
+    now = datetime.now().isoformat(timespec='seconds')
+    with _lock:
+        job = load_manifest(path)
+        job = {key: unit for key, unit in job.items() if unit['statement_type'] not in statement_types}
+        for statement_type, report_date in units:
+            job[_entry_key(statement_type, report_date)] = {
+                'statement_type': statement_type,
+                'report_date': report_date,
+                'status': PENDING,
+                'updated_at': now,
+            }
+        save_manifest(job, path)
+
+class FetchLog:
+    """
+    批量记录获取结果（原始数据清单）和单元状态（检查点）。
+
+    更新先保存在内存中，距上次写入超过 flush_seconds 秒时以及 flush() / 退出 with 块时，合并写入两个文件
+    （读-改-写在模块锁内进行，流水线中并发的各获取节点可以共用文件）。每个单元不再各自重写整个文件；
+    中断时最多丢失最近 flush_seconds 秒的记录，这些单元在 --resume 时重新获取。
+    """
+
+    def __init__(self, manifest_path=MANIFEST_FILE, job_path=FETCH_JOB_FILE, flush_seconds=FETCH_CHECKPOINT_SECONDS):
+        self.manifest_path = manifest_path
+        self.job_path = job_path
+        self.flush_seconds = flush_seconds
+        self._entries = {}
+        self._units = {}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def record_fetch(self, statement_type, report_date, output_file, rows):
+        """
+        记录一个单元的获取结果并将其标记为已完成，返回清单记录。
+        """
+        # 内容摘要在锁外计算，各获取线程可以并行
+        entry = fetch_entry(statement_type, report_date, output_file, rows)
+        with self._lock:
+            self._entries[_entry_key(statement_type, report_date)] = entry
+        self.mark_unit(statement_type, report_date, DONE)
+        return entry
+
+    def mark_unit(self, statement_type, report_date, status, error=None):
+        """
+        更新一个单元的状态，失败时记录错误信息。
+        """
+        unit = {
+            'statement_type': statement_type,
+            'report_date': report_date,
+            'status': status,
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        if error is not None:
+            unit['error'] = error
+        with self._lock:
+            self._units[_entry_key(statement_type, report_date)] = unit
+            if time.monotonic() - self._flushed_at >= self.flush_seconds:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        entries, units = self._entries, self._units
+        self._entries, self._units = {}, {}
+        self._flushed_at = time.monotonic()
+        with _lock:
+            if entries:
+                manifest = load_manifest(self.manifest_path)
+                manifest.update(entries)
+                save_manifest(manifest, self.manifest_path)
+            if units:
+                job = load_manifest(self.job_path)
+                job.update(units)
+                save_manifest(job, self.job_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+def remaining_units(statement_types, path=FETCH_JOB_FILE):
+    """
+    返回检查点中 statement_types 尚未完成（待获取或失败）的单元，没有检查点记录时返回 None。
+    """
+    job = load_manifest(path)
+    units = [unit for unit in job.values() if unit['statement_type'] in statement_types]
+    if not units:
+        return None
+    return sorted((unit['statement_type'], unit['report_date']) for unit in units if unit['status'] != DONE)
@@ -0,0 +1,133 @@
+# src/metric_cube.py
+
+import sys
+import os
+import json
+import shutil
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+import build_cache
+import fact_table
+
+# 指标立方体目录：values.npy 为 股票 × 报告期 × 指标 的 float64 数组，index.json 为代码、报告期、指标到下标的映射
+CUBE_DIR = os.path.join('data', 'analysis', 'metric_cube')
+
+class MetricCube:
+    """
+    以内存映射方式打开的分析结果立方体（股票 × 报告期 × 指标），供交互式查询使用。
+
+    打开时只读取索引文件并映射数组，不读取数据本身，实际访问的部分才由操作系统按页载入。
+    单只股票的全部历史在内存中连续存放；截面（某报告期某指标的全部股票）是跨步视图，
+    两者都不复制数据。缺失值为 NaN。
+    """
+
+    def __init__(self, values, codes, names, periods, metrics):
+        self.values = values
+        self.codes = list(codes)
+        self.names = list(names)
+        self.periods = np.asarray(periods, dtype='int64')
+        self.metrics = list(metrics)
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        self.metric_index = {metric: i for i, metric in enumerate(self.metrics)}
+
+    @classmethod
+    def open(cls, path=CUBE_DIR):
+        with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+            index = json.load(f)
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+        return cls(values, index['codes'], index['names'], index['periods'], index['metrics'])
+
+    def _period_slice(self, start=None, end=None):
+        low = 0 if start is None else np.searchsorted(self.periods, int(start), side='left')
+        high = len(self.periods) if end is None else np.searchsorted(self.periods, int(end), side='right')
+        return slice(low, high)
+
+    def _period_position(self, period):
+        position = np.searchsorted(self.periods, int(period))
+        if position == len(self.periods) or self.periods[position] != int(period):
+            raise KeyError(f"指标立方体中没有报告期 {period}")
+        return position
+
+    def stock(self, code, start=None, end=None):
+        """
+        返回一只股票的历史数据（报告期 × 指标），不复制数据。
+        """
+        periods = self._period_slice(start, end)
+        return pd.DataFrame(self.values[self.code_index[code], periods], index=self.periods[periods],
+                            columns=self.metrics, copy=False)
+
+    def cross_section(self, metric, period):
+        """
+        返回某报告期全部股票的一个指标（以股票代码为索引），不复制数据。
+        """
+        values = self.values[:, self._period_position(period), self.metric_index[metric]]
+        return pd.Series(values, index=self.codes, name=metric, copy=False)
+
+    def history(self, metric, codes=None, start=None, end=None):
+        """
+        返回一个指标在若干报告期的取值（报告期 × 股票）。codes 为 None 时取全部股票，不复制数据。
+        """
+        periods = self._period_slice(start, end)
+        rows = slice(None) if codes is None else [self.code_index[code] for code in codes]
+        values = self.values[rows, periods, self.metric_index[metric]]
+        return pd.DataFrame(values.T, index=self.periods[periods],
+                            columns=self.codes if codes is None else list(codes), copy=False)
+
+    def rank(self, metric, period, ascending=False):
+        """
+        按某报告期的指标对全部股票排名，返回包含股票简称、指标值和排名的表（按排名排序，缺失值排在最后）。
+        """
+        values = self.cross_section(metric, period)
+        result_df = pd.DataFrame({'股票代码': self.codes, '股票简称': self.names, metric: values.to_numpy()})
+        result_df['排名'] = values.rank(ascending=ascending, method='min').to_numpy()
+        return result_df.sort_values('排名', na_position='last', ignore_index=True)
+
+def build_metric_cube(source=fact_table.FACT_TABLE, path=CUBE_DIR, use_cache=True):
+    """
+    由宽表构建指标立方体，宽表的分区摘要与上次构建时一致时跳过。返回打开的 MetricCube。
+    """
+    inputs = build_cache.partition_fingerprints(source)
+    index_file = os.path.join(path, 'index.json')
+    if use_cache and os.path.exists(index_file):
+        with open(index_file, encoding='utf-8') as f:
+            if json.load(f).get('inputs') == inputs:
+                print(f"宽表未变化，指标立方体 {path} 无需重建")
+                return MetricCube.open(path)
+
+    df = fact_table.read_facts(source=source)
+    metrics = [c for c in df.columns if c not in fact_table.ID_COLUMNS and pd.api.types.is_numeric_dtype(df[c])]
+    codes, code_index = np.unique(df['股票代码'].astype(str).to_numpy(), return_inverse=True)
+    periods, period_index = np.unique(df['报告期'].to_numpy(dtype='int64'), return_inverse=True)
+    # 宽表按报告期排序，每只股票取最后一次出现的简称
+    names = df.groupby(code_index)['股票简称'].last().astype(str).to_numpy()
+
+    # 先写到临时目录，完成后替换旧目录，读取方不会看到写了一半的数组
+    tmp_dir = f'{path}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    values = np.lib.format.open_memmap(os.path.join(tmp_dir, 'values.npy'), mode='w+', dtype='float64',
+                                       shape=(len(codes), len(periods), len(metrics)))
+    values[:] = np.nan
+    values[code_index, period_index] = df[metrics].to_numpy(dtype='float64')
+    values.flush()
+    del values
+    index = {'codes': codes.tolist(), 'names': names.tolist(), 'periods': periods.tolist(),
+             'metrics': metrics, 'inputs': inputs}
+    with open(os.path.join(tmp_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    # 旧目录先整体改名移开，新目录换入后再删除：不会出现删了一半的旧目录，path 缺失的间隔只有两次改名之间
+    old_dir = f'{path}.old'
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_dir)
+    os.replace(tmp_dir, path)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"指标立方体已保存至 {path}（{len(codes)} 只股票 × {len(periods)} 个报告期 × {len(metrics)} 个指标）")
+    return MetricCube.open(path)
+
+if __name__ == "__main__":
+    build_metric_cube()
@@ -0,0 +1,51 @@
+# src/normalize.py
+
+import sys
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+
+# 股票代码固定为6位
+CODE_WIDTH = 6
+
+# 不同 AkShare 接口对代码、名称列的命名不同，统一为利润表等接口使用的列名
+COLUMN_ALIASES = {'代码': '股票代码', '名称': '股票简称'}
+
+def normalize_stock_codes(codes):
+    """
+    将股票代码统一为6位字符串，不足6位的填充前导零（向量化实现）。
+    """
+    codes = pd.Series(codes, copy=False)
+    if pd.api.types.is_numeric_dtype(codes):
+        padded = np.char.zfill(codes.to_numpy(dtype='int64').astype(str), CODE_WIDTH)
+        return pd.Series(padded, index=codes.index, name=codes.name, dtype=object)
+    return codes.astype(str).str.zfill(CODE_WIDTH)
+
+def stock_code_category(codes):
+    """
+    将6位股票代码转换为分类类型，类别按代码排序，便于排序和分组。
+    """
+    codes = normalize_stock_codes(codes)
+    return pd.Series(pd.Categorical(codes, categories=np.sort(codes.unique())), index=codes.index)
+
+def stock_key(codes):
+    """
+    将股票代码转换为 int32 整数键，用于排序、索引和连接。
+    """
+    return pd.to_numeric(pd.Series(codes, copy=False).astype(str), errors='raise').astype('int32')
+
+def normalize_stock_columns(df):
+    """
+    在数据进入系统时统一代码、名称列：重命名为 股票代码/股票简称，并将股票代码补齐为6位。
+
+    下游阶段不再需要重复补零。
+    """
+    aliases = {old: new for old, new in COLUMN_ALIASES.items() if old in df.columns}
+    if aliases:
+        df = df.drop(columns=[new for new in aliases.values() if new in df.columns])
+        df = df.rename(columns=aliases)
+    df['股票代码'] = normalize_stock_codes(df['股票代码'])
+    return df
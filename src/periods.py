@@ -0,0 +1,145 @@
+# src/periods.py
+
+import sys
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+from config import STATEMENT_CONFIG
+
+# 报告期的月日与季度的对应关系：一季报、中报、三季报、年报
+QUARTER_ENDS = {'0331': 1, '0630': 2, '0930': 3, '1231': 4}
+QUARTERS_PER_YEAR = 4
+
+# 同比、环比、单季和 TTM 指标最多回看的季度数，增量重算时需要额外读取这么多个报告期
+MAX_LAG = 4
+
+# 期序键中季度序号所占的位数，高位为股票编号
+_ORDINAL_BITS = 16
+
+def report_dates_between(start_year, end_year, quarter_ends=QUARTER_ENDS):
+    """
+    生成 start_year 到 end_year（含）之间的报告期列表，默认包含全部四个季度。
+    """
+    return [f'{year}{end}' for year in range(int(start_year), int(end_year) + 1) for end in quarter_ends]
+
+def statement_report_dates(report_dates, statement_type):
+    """
+    返回 report_dates 中该报表类型提供数据的报告期。
+
+    部分接口只提供特定报告期的数据（如分红数据只有中报和年报），由 STATEMENT_CONFIG 中的
+    report_periods 指定月日，未指定时为全部报告期。
+    """
+    report_periods = STATEMENT_CONFIG[statement_type].get('report_periods')
+    if report_periods:
+        return [report_date for report_date in report_dates if report_date[4:] in report_periods]
+    return list(report_dates)
+
+def period_ordinal(report_dates):
+    """
+    将报告期（如 20230930）转换为连续的季度序号 年*4+季度-1，相邻季度相差1（向量化实现）。
+    """
+    dates = np.asarray(pd.Series(report_dates, copy=False).astype('int64'))
+    month_day = dates % 10000
+    valid = np.isin(month_day, [int(end) for end in QUARTER_ENDS])
+    if not valid.all():
+        raise ValueError(f"无法识别的报告期：{sorted(set(dates[~valid].tolist()))[:5]}")
+    # 0331、0630、0930、1231 整除 300 恰好得到季度 1-4
+    quarter = month_day // 300
+    return (dates // 10000 * QUARTERS_PER_YEAR + quarter - 1).astype('int32')
+
+def period_quarter(ordinal):
+    """
+    由季度序号得到季度（1-4）。
+    """
+    return np.asarray(ordinal) % QUARTERS_PER_YEAR + 1
+
+def build_period_index(df):
+    """
+    按 (股票代码, 报告期) 排序一次，并返回每行的期序键。
+
+    期序键 = 股票编号 << 16 | 季度序号，排序后单调递增，同一股票往前第 k 个季度的键就是 键-k，
+    后续的回看都通过二分查找完成，不需要按公司逐个循环，也能正确处理缺失的报告期。
+    返回 (排序后的 DataFrame, 期序键数组)。
+    """
+    df = df.sort_values(['股票代码', '报告期'], kind='stable', ignore_index=True)
+    stock_index, _ = pd.factorize(df['股票代码'], sort=False)
+    ordinal = period_ordinal(df['报告期'])
+    keys = (stock_index.astype('int64') << _ORDINAL_BITS) | ordinal.astype('int64')
+    return df, keys
+
+def lag_lookup(keys, values, lag):
+    """
+    返回每行同一股票往前 lag 个季度的值，该报告期不存在时为 NaN。keys 须已排序。
+    """
+    values = np.asarray(values, dtype='float64')
+    if len(keys) == 0:
+        return values.copy()
+    target = keys - lag
+    position = np.searchsorted(keys, target)
+    position = np.minimum(position, len(keys) - 1)
+    found = keys[position] == target
+    return np.where(found, values[position], np.nan)
+
+def _growth(current, previous):
+    # 基期为负时用绝对值作分母，使增长方向与数值变化方向一致；基期为0时记为 NaN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (current - previous) / np.abs(previous)
+    return np.where(np.isfinite(growth), growth, np.nan)
+
+def add_period_metrics(df, columns):
+    """
+    为利润表、现金流量表的累计值列计算单季值、TTM、同比和单季环比。
+
+    财报中的利润和现金流数据为年初至报告期末的累计值：
+    - 单季{列}：一季度为累计值本身，其他季度为本期累计值减上一季度累计值；
+    - {列}TTM：最近四个季度之和，等于 本期累计值 + 上年年报值 - 上年同期累计值，年报期即为累计值本身；
+    - {列}同比：与上年同期累计值相比的增长率；
+    - 单季{列}环比：与上一季度单季值相比的增长率。
+    缺少所需报告期时对应指标为 NaN。返回按 (股票代码, 报告期) 排序后的 DataFrame。
+    """
+    df, keys = build_period_index(df)
+    quarter = period_quarter(keys & ((1 << _ORDINAL_BITS) - 1))
+    for col in columns:
+        current = df[col].to_numpy(dtype='float64')
+        previous = {lag: lag_lookup(keys, current, lag) for lag in range(1, MAX_LAG + 1)}
+        single = np.where(quarter == 1, current, current - previous[1])
+        # 上年年报相对于本期的回看季度数等于本期的季度
+        last_annual = np.select([quarter == lag for lag in range(1, QUARTERS_PER_YEAR)],
+                                [previous[lag] for lag in range(1, QUARTERS_PER_YEAR)], np.nan)
+        df[f'单季{col}'] = single
+        df[f'{col}TTM'] = np.where(quarter == QUARTERS_PER_YEAR, current,
+                                   current + last_annual - previous[QUARTERS_PER_YEAR])
+        df[f'{col}同比'] = _growth(current, previous[QUARTERS_PER_YEAR])
+        df[f'单季{col}环比'] = _growth(single, lag_lookup(keys, single, 1))
+    return df
+
+def period_metric_columns(columns):
+    """
+    返回 add_period_metrics 为 columns 添加的列名。
+    """
+    return [name for col in columns for name in (f'单季{col}', f'{col}TTM', f'{col}同比', f'单季{col}环比')]
+
+def _periods_within(available, anchors, low, high):
+    """
+    返回 available 中与某个 anchors 报告期的季度差（available - anchor）落在 [low, high] 内的报告期。
+    """
+    if not available or not anchors:
+        return []
+    offset = period_ordinal(list(available))[:, None] - period_ordinal(list(anchors))[None, :]
+    within = ((offset >= low) & (offset <= high)).any(axis=1)
+    return [report_date for report_date, keep in zip(available, within) if keep]
+
+def affected_periods(changed, available, lag=MAX_LAG):
+    """
+    返回 available 中受 changed 报告期影响的报告期：本身及其后 lag 个季度内的报告期。
+    """
+    return _periods_within(available, changed, 0, lag)
+
+def lookback_periods(targets, available, lag=MAX_LAG):
+    """
+    返回计算 targets 各报告期指标需要读取的报告期：本身及其前 lag 个季度内 available 中的报告期。
+    """
+    return _periods_within(available, targets, -lag, 0)
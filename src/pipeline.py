@@ -0,0 +1,298 @@
+# src/pipeline.py
+
+import sys
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+from config import REPORT_DATES, STATEMENT_TYPES, STATEMENT_CONFIG, COMPANY_CODES, CLEAN_STREAMING, EXECUTION_ENGINE
+import instrumentation
+import response_cache
+
+# 流水线阶段，按执行顺序排列
+STAGES = ['fetch', 'clean', 'analyze', 'facts', 'select', 'visualize']
+
+# 可选择落盘的中间结果；原始数据总是落盘，因为增量获取依赖 data/raw 和清单
+PERSIST_CHOICES = ['clean', 'analysis']
+# 构建缓存依据已落盘的输入判断是否需要重算，因此默认两者都落盘
+DEFAULT_PERSIST = ['clean', 'analysis']
+
+# 清洗、分析、选股阶段可选的执行引擎
+ENGINES = ['pandas', 'polars']
+
+# 每个可视化节点内部已用进程池并行绘制各公司的图表，节点之间串行执行，避免进程数成倍增加
+_plot_lock = threading.Lock()
+
+def build_dag(statement_types=STATEMENT_TYPES):
+    """
+    根据 STATEMENT_CONFIG 构建流水线依赖图。
+
+    返回 {节点名: {'stage': 阶段, 'statement_type': 报表类型, 'deps': [上游节点]}}，
+    节点名形如 'analyze:income_statement'，合并宽表的节点名为 'facts'，选股节点名为 'select'。
+    """
+    dag = {}
+    for statement_type in statement_types:
+        previous = None
+        for stage in ['fetch', 'clean', 'analyze', 'visualize']:
+            name = f'{stage}:{statement_type}'
+            dag[name] = {'stage': stage, 'statement_type': statement_type, 'deps': [previous] if previous else []}
+            previous = name
+    dag['facts'] = {
+        'stage': 'facts',
+        'statement_type': None,
+        'deps': [f'analyze:{statement_type}' for statement_type in statement_types],
+    }
+    dag['select'] = {'stage': 'select', 'statement_type': None, 'deps': ['facts']}
+    return dag
+
+def _matches(name, node, target):
+    return target in (name, node['stage'], node['statement_type'])
+
+def select_nodes(dag, only=None, start=None):
+    """
+    按 --only（节点名、阶段名或报表类型）和 --from（起始阶段）筛选要运行的节点。
+    """
+    nodes = set(dag)
+    if only:
+        unknown = [t for t in only if not any(_matches(n, dag[n], t) for n in dag)]
+        if unknown:
+            raise ValueError(f"未知的运行目标：{', '.join(unknown)}")
+        nodes = {n for n in nodes if any(_matches(n, dag[n], t) for t in only)}
+    if start:
+        nodes = {n for n in nodes if STAGES.index(dag[n]['stage']) >= STAGES.index(start)}
+    return nodes
+
+def topological_order(dag, nodes):
+    """
+    返回 nodes 的一个拓扑顺序，同一阶段的节点按报表类型顺序排列。
+    """
+    return sorted(nodes, key=lambda n: (STAGES.index(dag[n]['stage']),
+                                        STATEMENT_TYPES.index(dag[n]['statement_type']) if dag[n]['statement_type'] else 0))
+
+def _table_path(stage_dir, statement_type, key):
+    return os.path.join('data', stage_dir, STATEMENT_CONFIG[statement_type][key])
+
+def _rows(value):
+    """
+    统计节点输入或输出中 DataFrame 的总行数（报告期字典等嵌套结构逐个累加）。
+    """
+    if value is None:
+        return 0
+    if isinstance(value, dict):
+        return sum(_rows(v) for v in value.values())
+    return len(value) if hasattr(value, 'columns') else 0
+
+def _run_node(name, node, inputs, report_dates, persist, force, company_codes, streaming=False, engine='pandas',
+              resume=False):
+    """
+    执行单个节点并记录其耗时、内存和读写计数。
+    """
+    with instrumentation.stage(name, stage_type=node['stage'], statement_type=node['statement_type']):
+        result = _execute_node(name, node, inputs, report_dates, persist, force, company_codes, streaming, engine,
+                               resume)
+        instrumentation.count(rows_in=_rows(inputs), rows_out=_rows(result))
+        return result
+
+def _execute_node(name, node, inputs, report_dates, persist, force, company_codes, streaming=False, engine='pandas',
+                  resume=False):
+    """
+    执行单个节点，上游结果在内存中时直接使用，否则从已落盘的数据读取。
+
+    engine 为 'polars' 时清洗、分析、选股节点从磁盘惰性扫描输入并直接写出结果，不在节点之间传递数据。
+    """
+    stage = node['stage']
+    statement_type = node['statement_type']
+    upstream = inputs.get(node['deps'][0]) if node['deps'] else None
+
+    if stage == 'fetch':
+        import data_fetch
+        # 流式清洗或 polars 引擎逐个报告期从 data/raw 读取，不在内存中保留所有报告期的原始数据
+        in_memory = not streaming and engine == 'pandas'
+        results = data_fetch.fetch_financial_statements(report_dates, statement_type, force=force,
+                                                        keep_frames=in_memory, resume=resume)
+        return {result['report_date']: result['data'] for result in results} if in_memory else None
+
+    if engine == 'polars' and stage in ('clean', 'analyze', 'select'):
+        import lazy_engine
+        if stage == 'clean':
+            lazy_engine.clean_statement(report_dates, statement_type)
+        elif stage == 'analyze':
+            lazy_engine.analyze_statement(statement_type)
+        else:
+            return lazy_engine.select_stocks()
+        return None
+
+    if stage == 'clean':
+        import data_clean
+        return data_clean.clean_financial_statements(report_dates, statement_type, frames=upstream,
+                                                     persist='clean' in persist, streaming=streaming)
+
+    if stage == 'analyze':
+        import analysis
+        output_file = _table_path('analysis', statement_type, 'analysis_file') if 'analysis' in persist else None
+        # 清洗和分析结果都落盘时从磁盘读取清洗结果，按其分区摘要使用构建缓存，未变化的报告期不再重算；
+        # 内存中的输入没有分区摘要，每次都要整体重算
+        frame = None if 'clean' in persist and output_file is not None else upstream
+        source = frame if frame is not None else _table_path('clean', statement_type, 'clean_file')
+        return getattr(analysis, STATEMENT_CONFIG[statement_type]['analysis_function'])(source, output_file)
+
+    if stage == 'facts':
+        import fact_table
+        # 分析结果已落盘时从磁盘增量更新宽表，只改写变化的报告期；否则在内存中合并上游结果
+        sources = {}
+        for dep in node['deps']:
+            statement_type = dep.split(':', 1)[1]
+            frame = None if 'analysis' in persist else inputs.get(dep)
+            sources[statement_type] = frame if frame is not None else _table_path('analysis', statement_type, 'analysis_file')
+        output_file = fact_table.FACT_TABLE if 'analysis' in persist else None
+        result = fact_table.build_fact_table(sources, output_file)
+        if output_file is not None:
+            import metric_cube
+            # 同步更新交互查询用的指标立方体，宽表未变化时跳过
+            metric_cube.build_metric_cube()
+        return result
+
+    if stage == 'select':
+        import stock_selection
+        import fact_table
+        return stock_selection.select_stocks(upstream if upstream is not None else fact_table.FACT_TABLE)
+
+    if stage == 'visualize':
+        import visualization
+        source = upstream if upstream is not None else _table_path('analysis', statement_type, 'analysis_file')
+        with _plot_lock:
+            getattr(visualization, STATEMENT_CONFIG[statement_type]['visualization_function'])(
+                source, company_codes=company_codes)
+        return None
+
+    raise ValueError(f"未知的阶段：{stage}")
+
+def run_pipeline(report_dates=REPORT_DATES, only=None, start=None, persist=DEFAULT_PERSIST,
+                 max_workers=4, force=False, company_codes=COMPANY_CODES, dry_run=False,
+                 streaming=CLEAN_STREAMING, engine=EXECUTION_ENGINE, resume=False):
+    """
+    在单个进程内运行 fetch -> clean -> analyze -> facts -> select -> visualize 流水线。
+
+    阶段之间通过内存传递 DataFrame，相互独立的报表分支并行执行；只有 persist 中列出的
+    中间结果会写到 data/ 下。未被选中运行的上游节点视为已完成，其结果从磁盘读取。
+    streaming=True 时清洗阶段逐个报告期处理并直接写出，要求 persist 包含 'clean'。
+    engine='polars' 时清洗、分析、选股阶段使用 Polars 惰性执行，要求 persist 包含 'clean' 和 'analysis'。
+    resume=True 时获取阶段只获取上次获取任务中未完成的报告期。
+    返回 {节点名: 耗时秒数}。
+    """
+    dag = build_dag()
+    targets = select_nodes(dag, only, start)
+    order = topological_order(dag, targets)
+    if streaming and 'clean' not in persist:
+        raise ValueError("流式清洗需要将清洗结果落盘（--persist 包含 clean）")
+    if engine not in ENGINES:
+        raise ValueError(f"未知的执行引擎：{engine}，可选 {', '.join(ENGINES)}")
+    if engine == 'polars' and not {'clean', 'analysis'} <= set(persist):
+        raise ValueError("polars 引擎从磁盘扫描各阶段的输入，需要将清洗和分析结果落盘（--persist clean,analysis）")
+    print(f"流水线计划运行 {len(order)} 个节点：{', '.join(order)}")
+    if dry_run:
+        return {}
+    instrumentation.log_event('run_start', nodes=order, report_dates=list(report_dates), persist=list(persist),
+                              streaming=streaming, engine=engine, profile=instrumentation.PROFILE,
+                              akshare_cache=response_cache.MODE)
+
+    # 每个节点的结果在所有下游节点完成后释放，避免整条流水线的数据同时驻留内存
+    consumers = {n: sum(1 for m in targets if n in dag[m]['deps']) for n in targets}
+    results = {}
+    timings = {}
+    failed = set()
+    pending = list(order)
+    running = {}
+
+    def _ready(name):
+        return all(dep in results or dep not in targets for dep in dag[name]['deps'])
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name in list(pending):
+                if any(dep in failed for dep in dag[name]['deps']):
+                    print(f"节点 {name} 的上游失败，跳过")
+                    failed.add(name)
+                    pending.remove(name)
+                elif _ready(name):
+                    inputs = {dep: results.get(dep) for dep in dag[name]['deps']}
+                    future = executor.submit(_run_node, name, dag[name], inputs, report_dates,
+                                             persist, force, company_codes, streaming, engine, resume)
+                    running[future] = (name, time.perf_counter())
+                    pending.remove(name)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                timings[name] = time.perf_counter() - started
+                try:
+                    results[name] = future.result()
+                    print(f"节点 {name} 完成，耗时 {timings[name]:.2f} 秒")
+                except Exception as e:
+                    print(f"节点 {name} 失败：{e}")
+                    failed.add(name)
+                for dep in dag[name]['deps']:
+                    if dep in consumers:
+                        consumers[dep] -= 1
+                        if consumers[dep] == 0:
+                            results[dep] = None
+
+    total = time.perf_counter() - start_time
+    print(f"流水线运行结束，总耗时 {total:.2f} 秒")
+    instrumentation.log_event('run_end', wall_seconds=round(total, 4), failed=sorted(failed),
+                              peak_rss_mb=instrumentation.peak_rss_mb())
+    if instrumentation.RUN_LOG:
+        print(f"各阶段的耗时和内存已记录至 {instrumentation.RUN_LOG}（运行编号 {instrumentation.RUN_ID}）")
+    if failed:
+        raise RuntimeError(f"以下节点失败或被跳过：{', '.join(sorted(failed))}")
+    return timings
+
+def main(argv=None, prog=None):
+    """
+    命令行入口，argv 默认为 sys.argv[1:]，prog 为帮助信息中显示的命令名。
+    """
+    parser = argparse.ArgumentParser(prog=prog, description='运行财报分析流水线')
+    parser.add_argument('--only', nargs='+', metavar='TARGET',
+                        help='只运行指定的节点、阶段或报表类型，如 analyze:income_statement、clean、dividend')
+    parser.add_argument('--from', dest='start', choices=STAGES, help='从指定阶段开始运行，之前的阶段从磁盘读取')
+    parser.add_argument('--persist', default=','.join(DEFAULT_PERSIST),
+                        help=f"要落盘的中间结果，逗号分隔，可选 {','.join(PERSIST_CHOICES)}；留空表示都不落盘")
+    parser.add_argument('--workers', type=int, default=4, help='并行执行的节点数')
+    parser.add_argument('--force', action='store_true', help='忽略原始数据清单，重新获取所有报告期')
+    parser.add_argument('--resume', action='store_true', help='获取阶段从检查点继续上次中断或失败的任务')
+    parser.add_argument('--dry-run', action='store_true', help='只打印将要运行的节点')
+    parser.add_argument('--streaming', action='store_true', default=CLEAN_STREAMING,
+                        help='清洗阶段逐个报告期处理并追加写出，内存峰值只取决于单个报告期')
+    parser.add_argument('--engine', choices=ENGINES, default=EXECUTION_ENGINE,
+                        help='清洗、分析、选股阶段的执行引擎，polars 为惰性、多线程的流式执行')
+    parser.add_argument('--profile', choices=instrumentation.PROFILE_MODES, default=instrumentation.PROFILE,
+                        help='对每个节点做性能剖析：cprofile 保存 .prof 文件，tracemalloc 记录内存分配热点')
+    parser.add_argument('--run-log', default=instrumentation.RUN_LOG,
+                        help='运行日志（JSON Lines）的路径，留空表示不记录')
+    parser.add_argument('--akshare-cache', choices=response_cache.MODES, default=response_cache.MODE,
+                        help='AkShare 响应缓存：off、cache、record（录制）或 replay（离线回放，从不访问网络）')
+    parser.add_argument('--akshare-cache-dir', default=response_cache.CACHE_DIR,
+                        help='AkShare 响应缓存的目录，回放时可指向录制好的离线数据')
+    args = parser.parse_args(argv)
+    instrumentation.PROFILE = args.profile
+    instrumentation.RUN_LOG = args.run_log or None
+    response_cache.MODE = args.akshare_cache
+    response_cache.CACHE_DIR = args.akshare_cache_dir
+
+    persist = [p for p in args.persist.split(',') if p]
+    unknown = set(persist) - set(PERSIST_CHOICES)
+    if unknown:
+        parser.error(f"未知的落盘选项：{', '.join(sorted(unknown))}")
+    run_pipeline(only=args.only, start=args.start, persist=persist, max_workers=args.workers,
+                 force=args.force, dry_run=args.dry_run, streaming=args.streaming, engine=args.engine,
+                 resume=args.resume)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# src/ratios.py
+
+import sys
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+import screening
+
+# 分母为零或结果不是有限值（分子、分母缺失或为 inf）时的取值：
+# - 'zero'：记为0，沿用分析表缺失按0处理的口径（默认）；
+# - 'nan'：记为缺失值。
+ZERO_POLICIES = {'zero': 0.0, 'nan': np.nan}
+
+def parse_ratio(definition):
+    """
+    将比率定义展开为 (名称, 分子, 分母, 分母为零时的处理)。
+    """
+    name, numerator, denominator = definition[:3]
+    on_zero = definition[3] if len(definition) > 3 else 'zero'
+    if on_zero not in ZERO_POLICIES:
+        raise ValueError(f"比率 {name} 的分母为零处理方式 {on_zero} 无效，可选 {', '.join(ZERO_POLICIES)}")
+    return name, numerator, denominator, on_zero
+
+def ratio_columns(definitions):
+    """
+    返回一组比率定义引用的全部列名。
+    """
+    columns = []
+    for definition in definitions:
+        _, numerator, denominator, _ = parse_ratio(definition)
+        for expression in (numerator, denominator):
+            columns += [c for c in screening.expression_columns(expression) if c not in columns]
+    return columns
+
+def compute_ratios(df, definitions, inputs=None):
+    """
+    一次计算一组比率指标，返回与 df 同索引的 DataFrame，列顺序与定义一致。
+
+    definitions 为 (名称, 分子, 分母[, 分母为零时的处理]) 的列表，分子、分母与选股条件的表达式相同，
+    可以是列名或列之间的算术表达式（含特殊字符的列名用反引号括起）。inputs 为 {名称: 数组}，
+    提供 df 中没有的输入（如上期值、调整后的费用）。
+
+    每列只取一次底层数组，相同的表达式只计算一次（如毛利率的分子和毛利润费用占比的分母），
+    结果直接除到预先分配的数组中，不在 df 上生成中间列，也不会修改 df。
+    各比率的类型随输入：输入都是 float32 时结果为 float32，否则为 float64。
+    """
+    values = dict(inputs or {})
+    for name in ratio_columns(definitions):
+        if name not in values:
+            values[name] = df[name].to_numpy()
+    evaluated = {}
+
+    def _evaluate(expression):
+        if expression not in evaluated:
+            evaluated[expression] = np.asarray(screening.evaluate_expression(expression, values))
+        return evaluated[expression]
+
+    results = {}
+    for definition in definitions:
+        name, numerator, denominator, on_zero = parse_ratio(definition)
+        num, den = _evaluate(numerator), _evaluate(denominator)
+        out = np.full(len(df), ZERO_POLICIES[on_zero], dtype=np.result_type(num, den, np.float32))
+        valid = (den != 0) & np.isfinite(num) & np.isfinite(den)
+        np.divide(num, den, out=out, where=valid)
+        results[name] = out
+    return pd.DataFrame(results, index=df.index, copy=False)
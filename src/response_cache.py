@@ -0,0 +1,249 @@
+# src/response_cache.py
+
+import sys
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import pandas as pd
+from config import AKSHARE_CACHE_MODE, AKSHARE_CACHE_DIR, AKSHARE_CACHE_TTL_HOURS, AKSHARE_CACHE_MAX_MB
+import instrumentation
+
+# 当前使用的缓存方式、目录和限制，可在运行时修改（例如命令行参数覆盖配置）
+MODE = AKSHARE_CACHE_MODE
+CACHE_DIR = AKSHARE_CACHE_DIR
+TTL_HOURS = AKSHARE_CACHE_TTL_HOURS
+MAX_MB = AKSHARE_CACHE_MAX_MB
+
+MODES = ('off', 'cache', 'record', 'replay')
+
+# 各响应最近一次被访问的时间，用于按最近访问时间淘汰；不在记录中的响应以文件修改时间代替
+ACCESS_FILE = 'access.json'
+# 响应以 Arrow IPC 文件（zstd 压缩）保存，JSON 头（接口名、缓存键、调用参数、写入时间）存放在 schema 元数据中。
+# 读取时只解析数据，不执行任何代码，录制的目录可以放心地在不同机器、CI 之间共享
+SUFFIX = '.arrow'
+HEADER_KEY = b'response_cache'
+
+_lock = threading.Lock()
+_MISSING = object()
+
+class ReplayMissError(LookupError):
+    """
+    回放模式下缓存中没有对应的响应。重试不会改变结果，调用方不应重试。
+    """
+
+def cache_key(function_name, args, kwargs):
+    """
+    由接口名和调用参数计算缓存键。
+    """
+    payload = json.dumps({'function': function_name, 'args': list(args), 'kwargs': kwargs},
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _entry_path(function_name, key, cache_dir):
+    return os.path.join(cache_dir, function_name, f'{key}{SUFFIX}')
+
+def _load_access(cache_dir):
+    path = os.path.join(cache_dir, ACCESS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_access(access, cache_dir):
+    path = os.path.join(cache_dir, ACCESS_FILE)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(access, f, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _touch(path, cache_dir):
+    """
+    记录响应的访问时间。回放目录可能是只读的离线数据，无法写入时忽略。
+    """
+    with _lock:
+        try:
+            access = _load_access(cache_dir)
+            access[os.path.relpath(path, cache_dir)] = time.time()
+            _save_access(access, cache_dir)
+        except OSError:
+            pass
+
+def _read(path, ttl_hours):
+    """
+    读取缓存的响应，不存在或已过期（按 JSON 头中的写入时间）时返回 _MISSING。
+    """
+    import pyarrow as pa
+
+    if not os.path.exists(path):
+        return _MISSING
+    with pa.OSFile(path, 'rb') as source:
+        reader = pa.ipc.open_file(source)
+        header = json.loads(reader.schema.metadata[HEADER_KEY])
+        if ttl_hours is not None and time.time() - header['created'] > ttl_hours * 3600:
+            return _MISSING
+        table = reader.read_all()
+    return table.to_pandas()
+
+def _write(path, result, header):
+    """
+    原子地写入响应：先写临时文件再重命名，中断时不会留下半个缓存文件。
+
+    只缓存 DataFrame；无法转换为 Arrow 表的响应不写入缓存，返回 False。
+    """
+    import pyarrow as pa
+
+    if not isinstance(result, pd.DataFrame):
+        print(f"{header['function']} 的响应不是 DataFrame，不写入缓存")
+        return False
+    try:
+        table = pa.Table.from_pandas(result, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        print(f"{header['function']} 的响应无法保存为 Arrow 表（{e}），不写入缓存")
+        return False
+    metadata = dict(table.schema.metadata or {})
+    metadata[HEADER_KEY] = json.dumps(header, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+    table = table.replace_schema_metadata(metadata)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    options = pa.ipc.IpcWriteOptions(compression='zstd')
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    return True
+
+def _entries(cache_dir):
+    """
+    列出缓存中的全部响应文件：[(相对路径, 字节数, 修改时间)]。
+    """
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+    for function_name in sorted(os.listdir(cache_dir)):
+        function_dir = os.path.join(cache_dir, function_name)
+        if not os.path.isdir(function_dir):
+            continue
+        for entry in os.scandir(function_dir):
+            if entry.name.endswith(SUFFIX):
+                stat = entry.stat()
+                entries.append((os.path.join(function_name, entry.name), stat.st_size, stat.st_mtime))
+    return entries
+
+def evict(cache_dir=None, max_mb=None):
+    """
+    缓存总大小超过 max_mb 时，按最近访问时间从旧到新删除响应，直到不超过上限。返回删除的文件数。
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_mb = MAX_MB if max_mb is None else max_mb
+    if max_mb is None:
+        return 0
+    with _lock:
+        entries = _entries(cache_dir)
+        total = sum(size for _, size, _ in entries)
+        limit = max_mb * 1024 * 1024
+        if total <= limit:
+            return 0
+        access = _load_access(cache_dir)
+        entries.sort(key=lambda entry: access.get(entry[0], entry[2]))
+        removed = 0
+        for relative, size, _ in entries:
+            if total <= limit:
+                break
+            os.remove(os.path.join(cache_dir, relative))
+            access.pop(relative, None)
+            total -= size
+            removed += 1
+        _save_access(access, cache_dir)
+    return removed
+
+def cached(function_name, resolve, mode=None, cache_dir=None, ttl_hours=_MISSING):
+    """
+    返回带响应缓存的接口函数，调用方式与原接口相同。
+
+    resolve 为返回真实接口函数的无参函数，只在需要访问接口时才调用，回放模式下不会导入 akshare。
+    mode、cache_dir、ttl_hours 默认取模块当前的 MODE、CACHE_DIR、TTL_HOURS。
+    回放模式下缓存缺失时抛出 ReplayMissError。
+    """
+    mode = mode or MODE
+    cache_dir = cache_dir or CACHE_DIR
+    ttl_hours = TTL_HOURS if ttl_hours is _MISSING else ttl_hours
+    if mode not in MODES:
+        raise ValueError(f"未知的缓存方式：{mode}，可选 {', '.join(MODES)}")
+
+    def wrapper(*args, **kwargs):
+        if mode == 'off':
+            return resolve()(*args, **kwargs)
+        key = cache_key(function_name, args, kwargs)
+        path = _entry_path(function_name, key, cache_dir)
+        if mode in ('cache', 'replay'):
+            result = _read(path, None if mode == 'replay' else ttl_hours)
+            if result is not _MISSING:
+                _touch(path, cache_dir)
+                instrumentation.log_event('akshare_cache', stage=instrumentation.current_stage(),
+                                          function=function_name, key=key, status='hit')
+                instrumentation.count(akshare_cache_hits=1)
+                return result
+            instrumentation.log_event('akshare_cache', stage=instrumentation.current_stage(),
+                                      function=function_name, key=key, status='miss')
+            instrumentation.count(akshare_cache_misses=1)
+            if mode == 'replay':
+                raise ReplayMissError(f"回放模式下缓存 {cache_dir} 中没有 {function_name}"
+                                      f"({json.dumps(kwargs, ensure_ascii=False, default=str)}) 的响应")
+        result = resolve()(*args, **kwargs)
+        header = {'function': function_name, 'key': key, 'args': list(args), 'kwargs': kwargs,
+                  'created': time.time()}
+        if _write(path, result, header):
+            _touch(path, cache_dir)
+            evict(cache_dir)
+        return result
+
+    wrapper.__name__ = function_name
+    return wrapper
+
+def cache_stats(cache_dir=None):
+    """
+    返回 {接口名: (响应数, 字节数)}。
+    """
+    stats = {}
+    for relative, size, _ in _entries(cache_dir or CACHE_DIR):
+        function_name = os.path.dirname(relative)
+        count, total = stats.get(function_name, (0, 0))
+        stats[function_name] = (count + 1, total + size)
+    return stats
+
+def clear_cache(cache_dir=None):
+    """
+    删除缓存中的全部响应，返回删除的文件数。
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    entries = _entries(cache_dir)
+    with _lock:
+        for relative, _, _ in entries:
+            os.remove(os.path.join(cache_dir, relative))
+        if os.path.exists(os.path.join(cache_dir, ACCESS_FILE)):
+            os.remove(os.path.join(cache_dir, ACCESS_FILE))
+    return len(entries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='查看或清理 AkShare 响应缓存')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='缓存目录')
+    parser.add_argument('--clear', action='store_true', help='删除全部缓存的响应')
+    parser.add_argument('--max-mb', type=float, help='按最近访问时间淘汰响应，直到总大小不超过该值')
+    args = parser.parse_args()
+
+    if args.clear:
+        print(f"已删除 {clear_cache(args.cache_dir)} 个缓存的响应")
+    elif args.max_mb is not None:
+        print(f"已淘汰 {evict(args.cache_dir, args.max_mb)} 个缓存的响应")
+    stats = cache_stats(args.cache_dir)
+    for function_name, (count, total) in stats.items():
+        print(f"{function_name}：{count} 个响应，{total / 1024 / 1024:.2f} MB")
+    if not stats:
+        print(f"缓存 {args.cache_dir} 为空")
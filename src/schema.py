@@ -0,0 +1,75 @@
+# src/schema.py
+
+import sys
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+import normalize
+
+# 清洗后各报表的列类型：
+# - amount：金额类，数量级可达千亿，float32 只有约7位有效数字，不够用，保留 float64；
+# - ratio：同比、占比、每股指标等，float32 的精度足够。
+# 缺失值保留为 NaN，不再填充为0，以区分“缺失”和“为零”。
+STATEMENT_SCHEMAS = {
+    'income_statement': {
+        'amount': ['净利润', '营业总收入', '营业总支出-营业支出', '营业总支出-销售费用', '营业总支出-管理费用',
+                   '营业总支出-财务费用', '营业总支出-营业总支出', '营业利润', '利润总额', '营业成本'],
+        'ratio': ['净利润同比', '营业总收入同比'],
+    },
+    'cash_flow_statement': {
+        'amount': ['净现金流-净现金流', '经营性现金流-现金流量净额', '投资性现金流-现金流量净额',
+                   '融资性现金流-现金流量净额'],
+        'ratio': ['净现金流-同比增长', '经营性现金流-净现金流占比', '投资性现金流-净现金流占比',
+                  '融资性现金流-净现金流占比'],
+    },
+    'balance_sheet': {
+        'amount': ['资产-货币资金', '资产-应收账款', '资产-存货', '资产-总资产', '负债-应付账款', '负债-总负债',
+                   '负债-预收账款', '股东权益合计'],
+        'ratio': ['资产-总资产同比', '负债-总负债同比', '资产负债率'],
+    },
+    'dividend': {
+        'amount': ['总股本'],
+        'ratio': ['送转股份-送转总比例', '送转股份-送转比例', '送转股份-转股比例', '现金分红-现金分红比例',
+                  '现金分红-股息率', '每股收益', '每股净资产', '每股公积金', '每股未分配利润', '净利润同比增长'],
+    },
+}
+
+AMOUNT_DTYPE = 'float64'
+RATIO_DTYPE = 'float32'
+PERIOD_DTYPE = 'int32'
+
+def _to_numeric(df, col, dtype):
+    if col in df.columns:
+        return pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    # 如果列不存在，整列记为缺失
+    return pd.Series(np.nan, index=df.index, dtype=dtype)
+
+def apply_schema(df, statement_type):
+    """
+    按报表的列类型定义转换清洗后的数据：
+
+    - 股票代码、股票简称以及其他文本列（公告日期、方案进度等）转换为分类类型；
+    - 报告期转换为 int32；
+    - 金额列为 float64，比率列为 float32，无法解析的值记为 NaN。
+    """
+    spec = STATEMENT_SCHEMAS.get(statement_type, {})
+    for col in spec.get('amount', []):
+        df[col] = _to_numeric(df, col, AMOUNT_DTYPE)
+    for col in spec.get('ratio', []):
+        df[col] = _to_numeric(df, col, RATIO_DTYPE)
+
+    df['股票代码'] = normalize.stock_code_category(df['股票代码'])
+    df['报告期'] = df['报告期'].astype(PERIOD_DTYPE)
+    for col in df.columns:
+        if col != '股票代码' and (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])):
+            df[col] = df[col].astype('category')
+    return df
+
+def memory_usage_mb(df):
+    """
+    返回 DataFrame 的实际内存占用（MB，包含字符串对象）。
+    """
+    return df.memory_usage(deep=True).sum() / 1e6
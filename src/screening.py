@@ -0,0 +1,188 @@
+# src/screening.py
+
+import sys
+import re
+import operator
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+
+# 条件的比较运算
+_OPS = {
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# 表达式中的列名：反引号括起的任意列名，或由文字、数字、下划线组成的名称
+_NAME_PATTERN = re.compile(r'`([^`]+)`|([^\W\d]\w*)')
+
+def quantile(q):
+    """
+    表示按报告期截面分位数取阈值，如 ('营业收入', '>=', quantile(0.7)) 表示营业收入排名前30%。
+    """
+    return ('quantile', float(q))
+
+def _is_quantile(value):
+    return isinstance(value, (tuple, list)) and len(value) == 2 and value[0] == 'quantile'
+
+def expression_columns(expression):
+    """
+    返回表达式引用的列名。列名本身也是合法的表达式。
+    """
+    names = []
+    for quoted, name in _NAME_PATTERN.findall(expression):
+        name = quoted or name
+        if name not in names and name != 'np':
+            names.append(name)
+    return names
+
+def evaluate_expression(expression, values):
+    """
+    在数组上计算表达式，values 为 {列名: 数组}。除零产生的 inf、NaN 原样返回，由调用方处理。
+    """
+    if expression in values:
+        return values[expression]
+    names = {}
+    def _placeholder(match):
+        name = match.group(1) or match.group(2)
+        if name == 'np':
+            return name
+        if name not in values:
+            raise KeyError(f"表达式 {expression} 引用了不存在的列：{name}")
+        return names.setdefault(name, f'_c{len(names)}')
+    code = _NAME_PATTERN.sub(_placeholder, expression)
+    variables = {placeholder: values[name] for name, placeholder in names.items()}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return eval(code, {'__builtins__': {}, 'np': np}, variables)
+
+def criteria_columns(criteria):
+    """
+    返回一组条件引用的全部列名。
+    """
+    columns = []
+    for expression, _, _ in criteria:
+        columns += [c for c in expression_columns(expression) if c not in columns]
+    return columns
+
+def complete_rows(df, columns):
+    """
+    只保留 columns 都有取值的行。
+
+    宽表是各报表的外连接，缺少某张报表的股票和报告期在对应列上为缺失值。选股前去掉这些行，
+    与按报表内连接后再筛选的口径一致：它们不进入分位数截面，只由这些行构成的报告期也不计入统计期数
+    （如分红只有年报时，季度报告期不参与选股）。
+    """
+    return df.dropna(subset=list(columns)).reset_index(drop=True)
+
+class ScreeningPanel:
+    """
+    向量化的选股引擎：把分析结果透视成 报告期 × 股票 的二维数组，所有条件都在数组上整体计算。
+    数组按报告期为行存放，取最近若干个报告期时是连续内存，比较运算不需要跨步访问。
+
+    条件格式为 (表达式, 运算符, 阈值)，与 storage 的过滤条件一致。表达式可以是任意分析列，
+    也可以是列之间的算术表达式（如 '营业收入 / 资产总额'，含特殊字符的列名用反引号括起）；
+    阈值为数值，或 quantile(q) 表示每个报告期截面上的分位数（等价于按报告期分组 transform('quantile')）。
+
+    各列按报告期排序后的结果会缓存，任一分位数阈值都只需 O(报告期数) 的插值，
+    因此扫描大量阈值组合时，每个候选条件组合只剩几次数组比较。
+
+    periods 指定报告期序列（须包含 df 中的全部报告期），缺少数据的报告期取值为缺失值；
+    thresholds 为预先算好的分位数阈值 {(表达式, q): 各报告期的阈值}，分片执行时 df 只有部分股票，
+    截面阈值使用归并阶段按全市场计算的结果。
+    """
+
+    def __init__(self, df, columns, key='股票代码', period='报告期', periods=None, thresholds=None):
+        self.periods = np.sort(df[period].unique()) if periods is None else np.asarray(periods)
+        codes, code_index = np.unique(df[key].astype(str).to_numpy(), return_inverse=True)
+        self.codes = codes
+        period_index = np.searchsorted(self.periods, df[period].to_numpy())
+        self.values = {}
+        for col in columns:
+            values = np.full((len(self.periods), len(codes)), np.nan)
+            values[period_index, code_index] = df[col].to_numpy(dtype='float64')
+            self.values[col] = values
+        self._expressions = {}
+        self._sorted = {}
+        self._thresholds = {cache_key: np.asarray(values, dtype='float64')
+                            for cache_key, values in (thresholds or {}).items()}
+
+    def column(self, expression):
+        """
+        返回表达式在 报告期 × 股票 上的取值。
+        """
+        if expression in self.values:
+            return self.values[expression]
+        if expression not in self._expressions:
+            result = np.asarray(evaluate_expression(expression, self.values), dtype='float64')
+            self._expressions[expression] = np.where(np.isfinite(result), result, np.nan)
+        return self._expressions[expression]
+
+    def threshold(self, expression, q):
+        """
+        返回表达式每个报告期截面的 q 分位数（线性插值，忽略缺失值，与 pandas 的 quantile 一致）。
+        """
+        cache_key = (expression, q)
+        if cache_key not in self._thresholds:
+            if expression not in self._sorted:
+                values = self.column(expression)
+                # NaN 排在最后，每个报告期的有效值个数即为非 NaN 的个数
+                self._sorted[expression] = (np.sort(values, axis=1), (~np.isnan(values)).sum(axis=1))
+            ordered, counts = self._sorted[expression]
+            position = q * np.maximum(counts - 1, 0)
+            lower = np.floor(position).astype(int)
+            upper = np.ceil(position).astype(int)
+            rows = np.arange(ordered.shape[0])
+            low, high = ordered[rows, lower], ordered[rows, upper]
+            result = low + (high - low) * (position - lower)
+            self._thresholds[cache_key] = np.where(counts > 0, result, np.nan)
+        return self._thresholds[cache_key]
+
+    def passes(self, criteria, periods=slice(None)):
+        """
+        返回各报告期每只股票是否满足全部条件（报告期 × 股票 的布尔数组），缺失值视为不满足。
+
+        periods 可以只取部分报告期（切片），只对这些报告期做比较。
+        """
+        passed = None
+        for expression, op, value in criteria:
+            threshold = self.threshold(expression, value[1])[periods, None] if _is_quantile(value) else value
+            result = _OPS[op](self.column(expression)[periods], threshold)
+            passed = result if passed is None else np.logical_and(passed, result, out=passed)
+        if passed is None:
+            passed = np.ones((len(self.periods[periods]), len(self.codes)), dtype=bool)
+        return passed
+
+    def rolling_counts(self, passed, window):
+        """
+        统计每个报告期往前 window 个报告期（含本期）内满足条件的次数（报告期 × 股票）。
+        """
+        cumulative = np.cumsum(passed, axis=0, dtype='int32')
+        counts = cumulative.copy()
+        counts[window:] -= cumulative[:-window]
+        return counts
+
+    def screen(self, criteria, window, min_passes):
+        """
+        返回在最近 window 个报告期内至少 min_passes 次满足全部条件的股票（布尔数组，与 codes 对应）。
+        """
+        passed = self.passes(criteria, slice(-window, None))
+        return np.add.reduce(passed, axis=0, dtype='int32') >= min_passes
+
+    def sweep(self, screens, window, min_passes):
+        """
+        依次评估多组条件，返回每组条件选中的股票数量和代码。
+
+        screens 为 {名称: 条件列表}。
+        """
+        results = []
+        for name, criteria in screens.items():
+            selected = self.screen(criteria, window, min_passes)
+            results.append({'名称': name, '选中数量': int(selected.sum()), '股票代码': list(self.codes[selected])})
+        return pd.DataFrame(results)
@@ -0,0 +1,291 @@
+# src/sharding.py
+
+import sys
+import os
+import json
+import zlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+from config import (REPORT_DATES, STATEMENT_TYPES, STATEMENT_CONFIG, SELECTION_CRITERIA, SELECTION_WINDOW,
+                    SELECTION_MIN_PASSES, SHARD_COUNT, SHARD_WORKERS, SHARD_DIR)
+import storage
+import periods
+import data_clean
+import analysis
+import fact_table
+import screening
+import stock_selection
+
+# 分片执行：按股票代码的哈希把全市场分成 N 个分片。清洗、分析（含同比、环比和分红增长率的回看）、宽表
+# 和选股的满足次数都只涉及同一只股票的行，在各分片内独立运行，分片之间不需要交换数据。
+# 分位数阈值是截面计算，在很小的归并阶段完成：各分片写出每个报告期排好序的表达式取值（有序分段），
+# 归并阶段在各有序分段上二分查找全市场的第 k 小值，不合并排序，阈值与单进程的计算逐位相同。
+#
+# 各阶段可以分别运行，多台机器共享 SHARD_DIR 所在的目录时各自运行不同的 --shard：
+#   python src/sharding.py map --shard 0 --shards 8      # 清洗、分析、宽表，写出有序分段
+#   python src/sharding.py partials --shard 0 --shards 8 # 选股条件变化后只重新写出有序分段（map 已包含）
+#   python src/sharding.py reduce --shards 8             # 归并有序分段，计算全市场的分位数阈值
+#   python src/sharding.py select --shard 0 --shards 8   # 按全市场阈值统计本分片股票的满足次数
+#   python src/sharding.py gather --shards 8             # 合并各分片的选股结果
+#   python src/sharding.py run --shards 8                # 在本机的进程池中依次完成以上各阶段
+
+def shard_of(codes, shards):
+    """
+    返回每个股票代码所属的分片编号。
+
+    使用股票代码的 CRC32 取模，而不是内置的 hash（字符串的 hash 在每个进程中加了随机盐），
+    保证不同进程、不同机器上的划分一致。
+    """
+    uniques, inverse = np.unique(pd.Series(codes).astype(str).to_numpy(), return_inverse=True)
+    buckets = np.array([zlib.crc32(code.encode('utf-8')) % shards for code in uniques], dtype='int32')
+    return buckets[inverse.reshape(-1)]
+
+def shard_path(shard, shards, *parts):
+    """
+    返回分片目录下的路径，如 data/shards/8/0/analysis/fact_table。
+    """
+    return os.path.join(SHARD_DIR, str(shards), str(shard), *parts)
+
+def _thresholds_file(shards):
+    return os.path.join(SHARD_DIR, str(shards), 'thresholds.json')
+
+def quantile_expressions(criteria):
+    """
+    返回条件中使用分位数阈值的表达式（去重，保持顺序）。
+    """
+    return list(dict.fromkeys(expression for expression, _, value in criteria if screening._is_quantile(value)))
+
+def clean_shard(report_dates, statement_type, shard, shards):
+    """
+    逐个报告期清洗原始数据，只保留本分片的股票并追加写出，返回写出的路径（没有数据时为 None）。
+
+    任一时刻只有一个报告期的原始数据驻留内存，去重口径与流式清洗相同。
+    """
+    output_file = shard_path(shard, shards, 'clean', STATEMENT_CONFIG[statement_type]['clean_file'])
+    storage.remove_table(output_file)
+    written = None
+    report_dates = periods.statement_report_dates(report_dates, statement_type)
+    for df in data_clean.iter_clean_periods(report_dates, statement_type):
+        df = df[shard_of(df['股票代码'], shards) == shard]
+        if len(df):
+            written = storage.append_table(df, output_file, partition_cols=['报告期'])
+    return written
+
+def write_partials(shard, shards, criteria=SELECTION_CRITERIA):
+    """
+    写出本分片每个分位数表达式在各报告期的有序取值（忽略缺失值），供归并阶段计算全市场的分位数。
+
+    各表达式的取值按报告期先后、报告期内从小到大排列，另记每个报告期的取值个数。
+    截面只包含全部条件列都有取值的行（与选股的口径相同），因此有序分段与整组条件对应，
+    条件变化后需要重新写出。
+    """
+    expressions = quantile_expressions(criteria)
+    columns = screening.criteria_columns(criteria)
+    df = fact_table.read_facts(columns, source=shard_path(shard, shards, 'analysis', 'fact_table'))
+    panel = screening.ScreeningPanel(screening.complete_rows(df, columns), columns)
+    arrays = {'periods': panel.periods, 'expressions': np.array(expressions, dtype=str),
+              'columns': np.array(columns, dtype=str)}
+    for index, expression in enumerate(expressions):
+        values = panel.column(expression)
+        ordered = np.sort(values, axis=1)
+        arrays[f'values_{index}'] = ordered[~np.isnan(ordered)]
+        arrays[f'counts_{index}'] = (~np.isnan(values)).sum(axis=1)
+    output_file = shard_path(shard, shards, 'partials.npz')
+    np.savez(output_file, **arrays)
+    return output_file
+
+def map_shard(shard, shards, report_dates=REPORT_DATES, statement_types=STATEMENT_TYPES, criteria=SELECTION_CRITERIA):
+    """
+    分片的映射阶段：清洗、分析本分片的股票并构建分片宽表，写出分位数条件的有序分段。
+    """
+    sources = {}
+    for statement_type in statement_types:
+        config = STATEMENT_CONFIG[statement_type]
+        clean_file = clean_shard(report_dates, statement_type, shard, shards)
+        if clean_file is None:
+            print(f"分片 {shard}/{shards} 没有 {statement_type} 数据")
+            continue
+        output_file = shard_path(shard, shards, 'analysis', config['analysis_file'])
+        getattr(analysis, config['analysis_function'])(clean_file, output_file)
+        sources[statement_type] = output_file
+    if not sources:
+        raise ValueError(f"分片 {shard}/{shards} 没有任何可用的数据")
+    fact_table.build_fact_table(sources, output_file=shard_path(shard, shards, 'analysis', 'fact_table'))
+    return write_partials(shard, shards, criteria)
+
+def _kth(parts, k):
+    """
+    返回多个有序数组合并后第 k 小（从 0 开始）的值。
+
+    第 k 小的值一定在某个数组中：在每个数组内二分查找满足
+    “全部数组中小于它的个数 ≤ k < 不大于它的个数” 的元素，每一步只需在各数组上做一次二分查找。
+    """
+    for part in parts:
+        low, high = 0, len(part)
+        while low < high:
+            middle = (low + high) // 2
+            value = part[middle]
+            if sum(int(np.searchsorted(p, value, 'left')) for p in parts) > k:
+                high = middle
+            elif sum(int(np.searchsorted(p, value, 'right')) for p in parts) > k:
+                return value
+            else:
+                low = middle + 1
+    raise IndexError(f"第 {k} 小的值超出了取值个数")
+
+def merged_quantile(parts, q):
+    """
+    返回多个有序数组合并后的 q 分位数，线性插值方式与 ScreeningPanel.threshold 相同；没有取值时为 NaN。
+    """
+    count = sum(len(part) for part in parts)
+    if count == 0:
+        return np.nan
+    position = q * max(count - 1, 0)
+    lower, upper = int(np.floor(position)), int(np.ceil(position))
+    low, high = _kth(parts, lower), _kth(parts, upper)
+    return float(low + (high - low) * (position - lower))
+
+def _load_segments(partial, expression, shard):
+    """
+    把一个分片的有序取值按报告期切分，返回 {报告期: 有序数组}。
+    """
+    expressions = list(partial['expressions'])
+    if expression not in expressions:
+        raise KeyError(f"分片 {shard} 没有 {expression} 的有序分段，请用相同的选股条件运行 partials 阶段")
+    index = expressions.index(expression)
+    values, counts = partial[f'values_{index}'], partial[f'counts_{index}']
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return {period: values[start:end]
+            for period, start, end in zip(partial['periods'].tolist(), offsets[:-1], offsets[1:])}
+
+def reduce_thresholds(shards, criteria=SELECTION_CRITERIA):
+    """
+    归并阶段：读取各分片的有序分段，计算每个分位数条件在全市场各报告期的阈值，写出并返回。
+    """
+    partials = [np.load(shard_path(shard, shards, 'partials.npz')) for shard in range(shards)]
+    columns = screening.criteria_columns(criteria)
+    for shard, partial in enumerate(partials):
+        if list(partial['columns']) != columns:
+            raise ValueError(f"分片 {shard} 的有序分段按其他选股条件写出，请先用相同的条件运行 partials 阶段")
+    all_periods = sorted(set().union(*(partial['periods'].tolist() for partial in partials)))
+    thresholds = []
+    for expression in quantile_expressions(criteria):
+        segments = [_load_segments(partial, expression, shard) for shard, partial in enumerate(partials)]
+        levels = [value[1] for e, _, value in criteria if e == expression and screening._is_quantile(value)]
+        for q in dict.fromkeys(levels):
+            values = [merged_quantile([s[period] for s in segments if period in s], q) for period in all_periods]
+            thresholds.append({'expression': expression, 'q': float(q), 'values': values})
+
+    result = {'periods': all_periods, 'thresholds': thresholds}
+    output_file = _thresholds_file(shards)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"{len(thresholds)} 个分位数条件的全市场阈值已保存至 {output_file}")
+    return result
+
+def select_shard(shard, shards, criteria=SELECTION_CRITERIA, window=SELECTION_WINDOW, min_passes=SELECTION_MIN_PASSES):
+    """
+    按全市场的报告期和分位数阈值，统计本分片股票的满足次数并写出选中的股票，返回写出的路径。
+    """
+    with open(_thresholds_file(shards), encoding='utf-8') as f:
+        reduced = json.load(f)
+    thresholds = {(t['expression'], t['q']): t['values'] for t in reduced['thresholds']}
+    missing = [f'{e} {op} {value}' for e, op, value in criteria
+               if screening._is_quantile(value) and (e, float(value[1])) not in thresholds]
+    if missing:
+        raise KeyError(f"缺少条件 {', '.join(missing)} 的全市场阈值，请先用相同的选股条件运行 reduce 阶段")
+
+    columns = screening.criteria_columns(criteria)
+    merged_df = fact_table.read_facts(columns, source=shard_path(shard, shards, 'analysis', 'fact_table'))
+    merged_df = screening.complete_rows(merged_df, columns)
+    selected_df = stock_selection.screen_facts(merged_df, columns, criteria, window, min_passes,
+                                               periods=reduced['periods'], thresholds=thresholds)
+    output_file = shard_path(shard, shards, 'selected.csv')
+    selected_df.to_csv(output_file, index=False)
+    return output_file
+
+def gather_selection(shards, output_file='data/analysis/selected_stocks.csv'):
+    """
+    合并各分片的选股结果，按股票代码排序（与单进程选股的行顺序相同）并保存。
+    """
+    # round_trip 保证浮点数读回后逐位相同，再次写出的文本与单进程的结果一致
+    frames = [pd.read_csv(shard_path(shard, shards, 'selected.csv'), dtype={'股票代码': str},
+                          float_precision='round_trip') for shard in range(shards)]
+    selected_df = pd.concat(frames, ignore_index=True).sort_values('股票代码', kind='stable', ignore_index=True)
+    print("选中的股票列表及其指标：")
+    print(selected_df)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    selected_df.to_csv(output_file, index=False)
+    print(f"{shards} 个分片的筛选结果已保存至 {output_file}")
+    return selected_df
+
+def for_each_shard(function, shards, workers, *args):
+    """
+    对每个分片执行 function(shard, shards, *args)，workers 大于 1 时在进程池中并行，按分片顺序返回结果。
+    """
+    workers = min(workers or os.cpu_count() or 1, shards)
+    if workers <= 1:
+        return [function(shard, shards, *args) for shard in range(shards)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(function, shard, shards, *args) for shard in range(shards)]
+        return [future.result() for future in futures]
+
+def run_sharded(shards=SHARD_COUNT, workers=SHARD_WORKERS, report_dates=REPORT_DATES,
+                statement_types=STATEMENT_TYPES, criteria=SELECTION_CRITERIA, window=SELECTION_WINDOW,
+                min_passes=SELECTION_MIN_PASSES, output_file='data/analysis/selected_stocks.csv'):
+    """
+    在本机依次运行映射、归并、分片选股和合并阶段，返回选中的股票。
+    """
+    for_each_shard(map_shard, shards, workers, report_dates, statement_types, criteria)
+    reduce_thresholds(shards, criteria)
+    for_each_shard(select_shard, shards, workers, criteria, window, min_passes)
+    return gather_selection(shards, output_file)
+
+def main(argv=None, prog=None):
+    """
+    命令行入口，argv 默认为 sys.argv[1:]，prog 为帮助信息中显示的命令名。
+    """
+    parser = argparse.ArgumentParser(prog=prog, description='按股票代码分片执行清洗、分析和选股')
+    subparsers = parser.add_subparsers(dest='phase', required=True, metavar='PHASE')
+    phases = {
+        'map': '清洗、分析一个分片的股票并构建分片宽表，写出有序分段',
+        'partials': '按当前选股条件重新写出一个分片的有序分段',
+        'reduce': '归并各分片的有序分段，计算全市场的分位数阈值',
+        'select': '按全市场阈值统计一个分片的选股满足次数',
+        'gather': '合并各分片的选股结果',
+        'run': '在本机的进程池中依次完成全部阶段',
+    }
+    for phase, help_text in phases.items():
+        phase_parser = subparsers.add_parser(phase, help=help_text)
+        phase_parser.add_argument('--shards', type=int, default=SHARD_COUNT, help='分片总数')
+        if phase in ('map', 'partials', 'select'):
+            phase_parser.add_argument('--shard', type=int, required=True, help='分片编号，从 0 开始')
+        if phase == 'run':
+            phase_parser.add_argument('--workers', type=int, default=SHARD_WORKERS, help='并行的进程数')
+        if phase in ('gather', 'run'):
+            phase_parser.add_argument('--output', default='data/analysis/selected_stocks.csv', help='选股结果的保存路径')
+    args = parser.parse_args(argv)
+    if getattr(args, 'shard', 0) not in range(args.shards):
+        parser.error(f"分片编号须在 0 到 {args.shards - 1} 之间")
+
+    if args.phase == 'map':
+        map_shard(args.shard, args.shards)
+    elif args.phase == 'partials':
+        write_partials(args.shard, args.shards)
+    elif args.phase == 'reduce':
+        reduce_thresholds(args.shards)
+    elif args.phase == 'select':
+        print(f"分片 {args.shard} 的选股结果已保存至 {select_shard(args.shard, args.shards)}")
+    elif args.phase == 'gather':
+        gather_selection(args.shards, args.output)
+    else:
+        run_sharded(args.shards, args.workers, output_file=args.output)
+
+if __name__ == "__main__":
+    main()
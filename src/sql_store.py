@@ -0,0 +1,327 @@
+# src/sql_store.py
+
+import sys
+import os
+import re
+import argparse
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import pandas as pd
+from config import (STATEMENT_CONFIG, STATEMENT_TYPES, REPORT_DATES, SELECTION_CRITERIA, SELECTION_WINDOW,
+                    SELECTION_MIN_PASSES, SQL_STORE_FILE, SQL_STORE_THREADS)
+import storage
+import build_cache
+import screening
+import company_data
+import fact_table
+
+# 嵌入式分析库：DuckDB 单文件数据库，无需服务进程。清洗结果、分析结果和宽表按报告期分区增量导入，
+# 选股和排名写成 SQL，用窗口函数按报告期计算截面阈值和排名，由 DuckDB 多线程向量化执行，
+# 不需要把各表读入 pandas 合并。需要安装 duckdb（可选依赖）。
+
+# 各表已导入分区的内容摘要，增量导入时与数据表当前的分区摘要比较
+STATE_TABLE = '_load_state'
+
+# 表达式中的 numpy 函数与 SQL 函数的对应关系
+_SQL_FUNCTIONS = {'abs': 'abs', 'log': 'ln', 'log10': 'log10', 'sqrt': 'sqrt', 'exp': 'exp', 'sign': 'sign'}
+
+# 表达式中的 numpy 函数调用或列名
+_TOKEN_PATTERN = re.compile(r'np\.(\w+)|' + screening._NAME_PATTERN.pattern)
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("分析库需要安装 duckdb：pip install duckdb") from None
+    return duckdb
+
+def quote(name):
+    """
+    将列名、表名转换为 SQL 标识符。
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+def _literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+def connect(path=SQL_STORE_FILE, read_only=False):
+    """
+    打开分析库，返回 DuckDB 连接。
+    """
+    duckdb = _duckdb()
+    if not read_only and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    con = duckdb.connect(path, read_only=read_only)
+    if SQL_STORE_THREADS:
+        con.execute(f'SET threads = {int(SQL_STORE_THREADS)}')
+    return con
+
+def store_tables():
+    """
+    返回分析库中的表及其数据来源 {表名: 表路径}：各报表的清洗结果、分析结果和宽表。
+    """
+    paths = [os.path.join('data', 'clean', STATEMENT_CONFIG[st]['clean_file']) for st in STATEMENT_TYPES]
+    paths += [company_data.analysis_table_path(st) for st in STATEMENT_TYPES]
+    paths.append(fact_table.FACT_TABLE)
+    return {os.path.basename(storage.table_stem(path)): path for path in paths}
+
+def _scan_sql(path, partition=None):
+    """
+    返回读取数据表（或其中一个报告期分区）的 SQL 表达式，由 DuckDB 直接扫描文件。
+    """
+    backend, target = storage.resolve_table(path)
+    if backend == 'csv':
+        return f"read_csv({_literal(target)}, header = true, types = {{'股票代码': 'VARCHAR'}})"
+    if not os.path.isdir(target):
+        return f"read_parquet({_literal(target)})"
+    # 报告期取自分区目录名，类型与 pyarrow 读出的一致
+    files = os.path.join(target, f'报告期={partition}' if partition is not None else '*', '*.parquet')
+    return f"read_parquet({_literal(files)}, hive_partitioning = true, hive_types = {{'报告期': INTEGER}})"
+
+def _columns(con, relation):
+    return [row[0] for row in con.execute(f'DESCRIBE SELECT * FROM {relation}').fetchall()]
+
+def load_table(con, name, path):
+    """
+    将数据表导入分析库的同名表，返回 (状态, 重新导入的分区数)。
+
+    状态为 'skip'（各分区摘要都未变化）、'partial'（只删除并重新导入变化的报告期分区）或
+    'full'（首次导入、数据表不是按分区存储或列发生变化时整表重建）。
+    """
+    inputs = build_cache.partition_fingerprints(path)
+    exists = con.execute('SELECT count(*) FROM information_schema.tables WHERE table_name = ?', [name]).fetchone()[0]
+    previous = dict(con.execute(f'SELECT partition, fingerprint FROM {STATE_TABLE} WHERE table_name = ?',
+                                [name]).fetchall()) if exists else {}
+    changed = sorted(key for key, value in inputs.items() if previous.get(key) != value)
+    removed = sorted(key for key in previous if key not in inputs)
+    if exists and not changed and not removed:
+        return 'skip', 0
+
+    status = 'partial' if exists and previous else 'full'
+    if build_cache.WHOLE_TABLE in inputs or build_cache.WHOLE_TABLE in previous:
+        status = 'full'
+    elif status == 'partial' and changed:
+        # 列发生变化（如新增指标）时无法按分区替换
+        if set(_columns(con, _scan_sql(path, changed[0]))) != set(_columns(con, quote(name))):
+            status = 'full'
+
+    con.begin()
+    try:
+        if status == 'full':
+            con.execute(f'CREATE OR REPLACE TABLE {quote(name)} AS SELECT * FROM {_scan_sql(path)}')
+            changed = sorted(inputs)
+        else:
+            values = ', '.join(str(int(key)) for key in changed + removed)
+            con.execute(f'DELETE FROM {quote(name)} WHERE 报告期 IN ({values})')
+            for key in changed:
+                con.execute(f'INSERT INTO {quote(name)} BY NAME SELECT * FROM {_scan_sql(path, key)}')
+        con.execute(f'DELETE FROM {STATE_TABLE} WHERE table_name = ?', [name])
+        con.executemany(f'INSERT INTO {STATE_TABLE} VALUES (?, ?, ?)',
+                        [[name, key, value] for key, value in inputs.items()])
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return status, len(changed)
+
+def load_store(path=SQL_STORE_FILE, tables=None):
+    """
+    从已落盘的清洗结果、分析结果和宽表增量更新分析库，返回 {表名: 状态}。
+
+    tables 为要导入的表名列表，默认为 store_tables() 中的全部表；数据表尚未生成时跳过。
+    """
+    sources = store_tables()
+    tables = tables or list(sources)
+    con = connect(path)
+    con.execute(f'CREATE TABLE IF NOT EXISTS {STATE_TABLE} '
+                '(table_name VARCHAR, partition VARCHAR, fingerprint VARCHAR)')
+    results = {}
+    try:
+        for name in tables:
+            if not storage.table_exists(sources[name]):
+                print(f"数据表 {sources[name]} 不存在，跳过导入")
+                continue
+            status, count = load_table(con, name, sources[name])
+            results[name] = status
+            if status == 'skip':
+                print(f"{name} 未变化，跳过导入")
+            else:
+                print(f"{name} 导入完成（{'全部' if status == 'full' else '增量'}导入 {count} 个分区）")
+    finally:
+        con.close()
+    return results
+
+def expression_sql(expression):
+    """
+    将选股条件的表达式转换为 SQL：列名转换为标识符，numpy 函数转换为对应的 SQL 函数。
+    """
+    def _token(match):
+        function, quoted, name = match.groups()
+        if function is not None:
+            if function not in _SQL_FUNCTIONS:
+                raise ValueError(f"表达式 {expression} 中的 np.{function} 没有对应的 SQL 函数")
+            return _SQL_FUNCTIONS[function]
+        return f'{quote(quoted or name)}::DOUBLE'
+    return _TOKEN_PATTERN.sub(_token, expression)
+
+def selection_query(criteria=SELECTION_CRITERIA, window=SELECTION_WINDOW, min_passes=SELECTION_MIN_PASSES,
+                    table='fact_table'):
+    """
+    返回与 stock_selection.select_stocks 相同选股的参考 SQL。
+
+    只保留条件列都有取值的行（与 screening.complete_rows 相同），再取其中最近 window 个报告期；
+    分位数阈值用 quantile_cont 窗口函数按报告期计算（线性插值，忽略缺失值），
+    表达式的结果不是有限值时视为缺失，缺失值不满足条件。输出最新报告期中满足条件次数 ≥ min_passes 的股票。
+    """
+    columns = screening.criteria_columns(criteria)
+    complete = ' AND '.join(f'NOT isnan({quote(c)}::DOUBLE)' for c in columns) or 'true'
+    values, conditions = [], []
+    for i, (expression, op, value) in enumerate(criteria):
+        value_sql = expression_sql(expression)
+        values.append(f'CASE WHEN isfinite({value_sql}) THEN {value_sql} END AS c{i}')
+        if screening._is_quantile(value):
+            threshold = f'quantile_cont(c{i}, {float(value[1])!r}) OVER (PARTITION BY 报告期)'
+        else:
+            threshold = repr(float(value))
+        conditions.append(f'coalesce(c{i} {op} {threshold}, false)')
+    selected = ', '.join(quote(c) for c in ['股票代码', '股票简称'] + columns)
+    return f"""
+WITH complete AS (
+    SELECT * FROM {quote(table)} WHERE {complete}
+), recent AS (
+    SELECT DISTINCT 报告期 FROM complete ORDER BY 报告期 DESC LIMIT {int(window)}
+), scored AS (
+    SELECT *, {' AND '.join(conditions) or 'true'} AS passed
+    FROM (
+        SELECT *, {', '.join(values) or 'NULL AS c0'}
+        FROM complete
+        WHERE 报告期 IN (SELECT 报告期 FROM recent)
+    )
+), counts AS (
+    SELECT 股票代码, sum(passed::INTEGER)::INTEGER AS 满足条件次数 FROM scored GROUP BY 股票代码
+)
+SELECT {selected}, counts.满足条件次数
+FROM scored JOIN counts USING (股票代码)
+WHERE 报告期 = (SELECT max(报告期) FROM recent) AND counts.满足条件次数 >= {int(min_passes)}
+ORDER BY 股票键
+"""
+
+def company_scale_query(report_dates, quantile=0.7, table='fact_table'):
+    """
+    返回与 analysis.load_company_scale_data + rank_company_scale 相同结果的参考 SQL。
+
+    各规模指标按报告期用 RANK() 从大到小排名（并列取最小名次），综合排名为三项排名的平均值四舍六入五成双；
+    达标表示三项指标都不低于本报告期的 quantile 分位数。
+    """
+    dates = ', '.join(str(int(d)) for d in report_dates)
+    metrics = {'资产总额': '总资产排名', '净资产': '净资产排名', '营业收入': '营业收入排名'}
+    ranks = ', '.join(f'rank() OVER (PARTITION BY 报告期 ORDER BY {quote(col)} DESC)::DOUBLE AS {quote(rank)}'
+                      for col, rank in metrics.items())
+    passed = ' AND '.join(f'{quote(col)} >= quantile_cont({quote(col)}::DOUBLE, {float(quantile)!r}) '
+                          'OVER (PARTITION BY 报告期)' for col in metrics)
+    return f"""
+WITH base AS (
+    SELECT 股票键, 股票代码, 股票简称, 报告期, 资产总额, 股东权益 AS 净资产, 营业收入,
+           coalesce(股息率, 0) AS 股息率, coalesce(股利支付率, 0) AS 股利支付率
+    FROM {quote(table)}
+    WHERE 报告期 IN ({dates})
+      AND NOT isnan(营业收入) AND NOT isnan(资产总额) AND NOT isnan(股东权益)
+), ranked AS (
+    SELECT *, {ranks}, {passed} AS 达标 FROM base
+)
+SELECT 股票代码, 股票简称, 报告期, 资产总额, 净资产, 营业收入, 股息率, 股利支付率,
+       总资产排名, 净资产排名, 营业收入排名,
+       round_even((总资产排名 + 净资产排名 + 营业收入排名) / 3, 0)::BIGINT AS 综合排名, 达标
+FROM ranked
+ORDER BY 报告期, 股票键
+"""
+
+def ranking_query(metrics, period=None, top=None, table='fact_table'):
+    """
+    返回按报告期截面百分位排名的 SQL：每个指标的 PERCENT_RANK()（0 为最小，1 为最大）及其平均值 综合百分位。
+
+    period 为 None 时取最新报告期；按综合百分位从高到低排列，top 为返回的行数。
+    """
+    percent = [f'percent_rank() OVER (PARTITION BY 报告期 ORDER BY {expression_sql(m)}) AS {quote(m + "百分位")}'
+               for m in metrics]
+    average = ' + '.join(quote(m + '百分位') for m in metrics)
+    where = f'报告期 = {int(period)}' if period else f'报告期 = (SELECT max(报告期) FROM {quote(table)})'
+    limit = f'LIMIT {int(top)}' if top else ''
+    return f"""
+SELECT 股票代码, 股票简称, 报告期, {', '.join(quote(m + '百分位') for m in metrics)},
+       ({average}) / {len(metrics)} AS 综合百分位
+FROM (
+    SELECT 股票代码, 股票简称, 报告期, {', '.join(percent)}
+    FROM {quote(table)}
+    WHERE {where} AND {' AND '.join(f'isfinite({expression_sql(m)})' for m in metrics)}
+)
+ORDER BY 综合百分位 DESC, 股票代码
+{limit}
+"""
+
+def query(sql, path=SQL_STORE_FILE):
+    """
+    在分析库上执行只读查询，返回 DataFrame。
+    """
+    con = connect(path, read_only=True)
+    try:
+        return con.execute(sql).df()
+    finally:
+        con.close()
+
+def select_stocks(path=SQL_STORE_FILE, output_file=None, criteria=SELECTION_CRITERIA,
+                  window=SELECTION_WINDOW, min_passes=SELECTION_MIN_PASSES):
+    """
+    用参考 SQL 在分析库上选股，返回与 stock_selection.select_stocks 相同的 DataFrame。
+    """
+    selected_df = query(selection_query(criteria, window, min_passes), path)
+    if output_file:
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        selected_df.to_csv(output_file, index=False)
+        print(f"筛选结果已保存至 {output_file}")
+    return selected_df
+
+def company_scales(report_dates, path=SQL_STORE_FILE, quantile=0.7):
+    """
+    用参考 SQL 计算公司规模排名，返回 (带排名的数据, 是否全部达标)，与 analysis.rank_company_scale 对应。
+    """
+    data_df = query(company_scale_query(report_dates, quantile), path)
+    passed = data_df.pop('达标').to_numpy(dtype=bool)
+    return data_df, passed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='DuckDB 分析库：增量导入和 SQL 选股、排名')
+    parser.add_argument('--db', default=SQL_STORE_FILE, help='分析库文件路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('load', help='从清洗结果、分析结果和宽表增量导入')
+    select_parser = subparsers.add_parser('select', help='按 SELECTION_CRITERIA 选股')
+    select_parser.add_argument('--show-sql', action='store_true', help='只打印参考 SQL')
+    select_parser.add_argument('--output', help='保存选股结果的 CSV 路径')
+    rank_parser = subparsers.add_parser('rank', help='按报告期截面百分位排名')
+    rank_parser.add_argument('metrics', nargs='+', help='排名的指标或表达式')
+    rank_parser.add_argument('--period', help='报告期，默认为最新报告期')
+    rank_parser.add_argument('--top', type=int, default=20, help='显示的行数')
+    scale_parser = subparsers.add_parser('scale', help='各年份的公司规模排名')
+    scale_parser.add_argument('--years', nargs='+', help='年份，默认为 REPORT_DATES 中的全部年报年份')
+    query_parser = subparsers.add_parser('query', help='执行任意只读 SQL')
+    query_parser.add_argument('sql')
+    args = parser.parse_args()
+
+    pd.set_option('display.width', 200)
+    if args.command == 'load':
+        load_store(args.db)
+    elif args.command == 'select':
+        if args.show_sql:
+            print(selection_query())
+        else:
+            print(select_stocks(args.db, args.output))
+    elif args.command == 'rank':
+        print(query(ranking_query(args.metrics, args.period, args.top), args.db))
+    elif args.command == 'scale':
+        years = args.years or sorted({d[:4] for d in REPORT_DATES if d.endswith('1231')})
+        data_df, passed = company_scales([f'{year}1231' for year in years], args.db)
+        print(data_df[passed])
+    else:
+        print(query(args.sql, args.db))
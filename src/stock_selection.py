@@ -7,93 +7,58 @@ import os
 sys.path.append('.')
 
 import pandas as pd
-import numpy as np
-from config import REPORT_DATES
-
-def select_stocks():
-    # 读取分析后的数据文件
-    income_df = pd.read_csv('data/analysis/income_statement_analysis.csv', dtype={'股票代码': str})
-    balance_df = pd.read_csv('data/analysis/balance_sheet_analysis.csv', dtype={'股票代码': str})
-    dividend_df = pd.read_csv('data/analysis/dividend_analysis.csv', dtype={'股票代码': str})
-
-    # 确保股票代码长度为6位，填充前导零
-    income_df['股票代码'] = income_df['股票代码'].apply(lambda x: x.zfill(6))
-    balance_df['股票代码'] = balance_df['股票代码'].apply(lambda x: x.zfill(6))
-    dividend_df['股票代码'] = dividend_df['股票代码'].apply(lambda x: x.zfill(6))
-
-    # 合并数据
-    merged_df = pd.merge(income_df, balance_df, on=['股票代码', '股票简称', '报告期'], how='inner')
-    merged_df = pd.merge(merged_df, dividend_df, on=['股票代码', '股票简称', '报告期'], how='inner')
-
-    # 按照报告期排序
-    merged_df.sort_values(by=['股票代码', '报告期'], inplace=True)
-
-    # 将报告期转换为日期类型
-    merged_df['报告期日期'] = pd.to_datetime(merged_df['报告期'], format='%Y%m%d')
-
-    # 选择最近5个报告期的数据
-    latest_report_dates = sorted(merged_df['报告期日期'].unique())[-5:]
-    df_recent = merged_df[merged_df['报告期日期'].isin(latest_report_dates)]
-
-    # 定义筛选标准
-    def apply_criteria(df):
-        criteria = pd.DataFrame()
-
-        # 营业收入排名前30%
-        revenue_threshold = df['营业收入'].quantile(0.7)
-        criteria['营业收入'] = df['营业收入'] >= revenue_threshold
-
-        # 总资产排名前30%
-        asset_threshold = df['资产总额'].quantile(0.7)
-        criteria['总资产'] = df['资产总额'] >= asset_threshold
-
-        # 股息率 ≥ 3%
-        criteria['股息率'] = df['股息率'] >= 0.03 
-
-        # 股利支付率 ≥ 30%
-        criteria['股利支付率'] = df['股利支付率'] >= 0.3
-
-        # 总体标准
-        criteria['总计满足条件数'] = criteria.sum(axis=1)
-        criteria['是否满足所有条件'] = criteria.drop(columns=['总计满足条件数']).all(axis=1)
-
-        return criteria
-
-    # 对每个报告期的数据应用筛选标准
-    df_recent = df_recent.reset_index(drop=True)
-    criteria_df = apply_criteria(df_recent)
-
-    # 将筛选结果与原始数据合并
-    df_recent = pd.concat([df_recent, criteria_df], axis=1)
-
-    # 统计每个公司满足条件的次数
-    group = df_recent.groupby('股票代码')
-
-    def count_satisfy(group):
-        count = group['是否满足所有条件'].sum()
-        return pd.Series({'满足条件次数': count})
-
-    satisfy_count = df_recent.groupby('股票代码').apply(count_satisfy).reset_index()
-
-    # 选择满足条件次数 ≥ 4 的公司
-    selected_stocks = satisfy_count[satisfy_count['满足条件次数'] >= 4]['股票代码']
-
-    # 获取选中公司的信息，包括总资产、营业收入、股息率
-    # 从 df_recent 中获取最新报告期的数据
-    latest_date = df_recent['报告期日期'].max()
-    latest_data = df_recent[df_recent['报告期日期'] == latest_date]
-
-    selected_df = latest_data[latest_data['股票代码'].isin(selected_stocks)]
-    selected_df = selected_df[['股票代码', '股票简称', '资产总额', '营业收入', '股息率']].drop_duplicates()
+from config import REPORT_DATES, SELECTION_CRITERIA, SELECTION_WINDOW, SELECTION_MIN_PASSES
+import screening
+import fact_table
+
+def screen_facts(merged_df, columns, criteria, window, min_passes, periods=None, thresholds=None):
+    """
+    在宽表的列切片上选股，返回选中股票最新报告期的指标及满足条件次数。
+
+    periods、thresholds 传给 ScreeningPanel：分片执行时 merged_df 只有本分片的股票，
+    使用全市场的报告期序列和归并阶段计算的分位数阈值。
+    """
+    if merged_df.empty:
+        # 没有条件列都有取值的行（如所选报告期缺少某张报表），不选出任何股票
+        print("没有条件涉及的列都有取值的行，没有选出股票")
+        return merged_df[['股票代码', '股票简称'] + columns].assign(满足条件次数=pd.Series(dtype='int64'))
+
+    # 透视为 报告期 × 股票 的数组，按报告期计算截面阈值，统计最近 window 个报告期满足全部条件的次数
+    panel = screening.ScreeningPanel(merged_df, columns, periods=periods, thresholds=thresholds)
+    passed = panel.passes(criteria)
+    satisfy_count = pd.Series(panel.rolling_counts(passed, window)[-1], index=panel.codes, name='满足条件次数')
+
+    # 选择满足条件次数 ≥ min_passes 的公司
+    selected_stocks = satisfy_count[satisfy_count >= min_passes]
+
+    # 获取选中公司最新报告期的指标
+    latest_data = merged_df[merged_df['报告期'] == panel.periods[-1]]
+    selected_df = latest_data[latest_data['股票代码'].astype(str).isin(selected_stocks.index)]
+    selected_df = selected_df[['股票代码', '股票简称'] + columns].drop_duplicates()
+    return selected_df.assign(满足条件次数=selected_df['股票代码'].astype(str).map(selected_stocks).values)
+
+def select_stocks(facts_source=fact_table.FACT_TABLE, output_file='data/analysis/selected_stocks.csv',
+                  criteria=SELECTION_CRITERIA, window=SELECTION_WINDOW, min_passes=SELECTION_MIN_PASSES):
+    """
+    根据利润表、资产负债表和分红分析结果筛选股票。
+
+    facts_source 为宽表的表路径或内存中的 DataFrame。criteria 为 (表达式, 运算符, 阈值) 条件列表，
+    分位数阈值按每个报告期的截面分别计算；选出最近 window 个报告期中至少 min_passes 个报告期满足全部条件的股票。
+    """
+    # 从宽表读取筛选需要的列，只保留这些列都有取值的行（与逐表内连接的口径一致）
+    columns = screening.criteria_columns(criteria)
+    merged_df = screening.complete_rows(fact_table.read_facts(columns, source=facts_source), columns)
+    selected_df = screen_facts(merged_df, columns, criteria, window, min_passes)
 
     # 输出选中的股票及其指标
     print("选中的股票列表及其指标：")
     print(selected_df)
 
     # 保存结果
-    output_file = 'data/analysis/selected_stocks.csv'
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
     selected_df.to_csv(output_file, index=False)
     print(f"筛选结果已保存至 {output_file}")
+    return selected_df
 
 if __name__ == "__main__":
-    select_stocks()
\ No newline at end of file
+    select_stocks()
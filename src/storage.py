@@ -0,0 +1,308 @@
+# src/storage.py
+
+import sys
+import os
+import shutil
+import operator
+import threading
+
+# 添加项目根目录到 sys.path
+sys.path.append('.')
+
+import pandas as pd
+from config import STORAGE_BACKEND
+import instrumentation
+
+# 当前使用的存储后端，可在运行时修改（例如基准测试中切换）
+BACKEND = STORAGE_BACKEND
+
+BACKENDS = ('parquet', 'csv')
+
+# 过滤条件的比较运算，过滤条件格式为 [(列名, 运算符, 值), ...]，各条件之间为“与”关系
+_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda column, value: column.isin(value),
+    'not in': lambda column, value: ~column.isin(value),
+}
+
+def table_stem(path):
+    """
+    去掉路径中的文件扩展名，得到与存储格式无关的表路径。
+    """
+    stem, ext = os.path.splitext(path)
+    return stem if ext in ('.csv', '.parquet') else path
+
+def _locate(stem, backend):
+    """
+    返回指定后端下表的实际路径，不存在时返回 None。
+    """
+    if backend == 'csv':
+        target = f'{stem}.csv'
+        return target if os.path.isfile(target) else None
+    if os.path.isdir(stem):
+        return stem
+    target = f'{stem}.parquet'
+    return target if os.path.isfile(target) else None
+
+def resolve_table(path, backend=None):
+    """
+    查找表的实际存储位置，优先使用当前后端，找不到时回退到其他格式。
+
+    返回 (后端, 路径)，表不存在时返回 (None, None)。
+    """
+    stem = table_stem(path)
+    backend = backend or BACKEND
+    for candidate in (backend,) + tuple(b for b in BACKENDS if b != backend):
+        target = _locate(stem, candidate)
+        if target is not None:
+            return candidate, target
+    return None, None
+
+def table_exists(path, backend=None):
+    return resolve_table(path, backend)[1] is not None
+
+def _to_arrow(df):
+    """
+    将 DataFrame 转换为 Arrow 表，分类列统一使用 int32 字典索引。
+
+    pandas 会按类别数量选择 int8/int16 编码，不同分区的编码宽度不一致时数据集无法合并读取。
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = [pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type), f.nullable)
+              if pa.types.is_dictionary(f.type) else f
+              for f in table.schema]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+def _write_dataset(table, target, partition_cols):
+    """
+    按分区写出 Arrow 表，并把写出的行数和字节数计入当前阶段。
+    """
+    import pyarrow.parquet as pq
+
+    written = []
+    pq.write_to_dataset(table, target, partition_cols=list(partition_cols),
+                        file_visitor=lambda written_file: written.append(written_file.path))
+    instrumentation.count(rows_written=table.num_rows, bytes_written=sum(os.path.getsize(f) for f in written))
+
+def _remove(target):
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+
+def _tmp_path(target):
+    # 临时文件名不以 .csv/.parquet 结尾，写出中断时留下的临时文件不会被当作数据表
+    return f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+def write_table(df, path, partition_cols=None, backend=None):
+    """
+    按当前存储后端写出数据表，返回实际写出的路径。
+
+    Parquet 后端在指定 partition_cols 时写成按分区列划分的目录（如 报告期=20231231/），
+    否则写成单个 .parquet 文件；CSV 后端总是写成单个 .csv 文件。
+    先写到临时文件（目录）再重命名，写出中断时不会留下看似完整的半个文件。
+    """
+    stem = table_stem(path)
+    backend = backend or BACKEND
+    parent = os.path.dirname(stem)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+    if backend == 'csv':
+        target = f'{stem}.csv'
+        tmp_target = _tmp_path(target)
+        df.to_csv(tmp_target, index=False)
+        os.replace(tmp_target, target)
+        instrumentation.count(rows_written=len(df), bytes_written=os.path.getsize(target))
+        return target
+
+    import pyarrow.parquet as pq
+
+    table = _to_arrow(df)
+    if partition_cols:
+        target = stem
+        tmp_target = _tmp_path(target)
+        _write_dataset(table, tmp_target, partition_cols)
+        # 目录无法原子替换，删除旧目录和重命名之间的间隔很短
+        _remove(target)
+        os.replace(tmp_target, target)
+    else:
+        target = f'{stem}.parquet'
+        tmp_target = _tmp_path(target)
+        pq.write_table(table, tmp_target)
+        _remove(stem)
+        os.replace(tmp_target, target)
+        instrumentation.count(rows_written=len(df), bytes_written=os.path.getsize(target))
+    return target
+
+def remove_table(path):
+    """
+    删除数据表在所有存储格式下的文件。
+    """
+    stem = table_stem(path)
+    for target in (stem, f'{stem}.csv', f'{stem}.parquet'):
+        _remove(target)
+
+def append_table(df, path, partition_cols=None, backend=None):
+    """
+    将 df 追加到数据表末尾，表不存在时新建，返回实际写出的路径。
+
+    Parquet 后端需指定 partition_cols，每次追加在对应分区目录下写入新文件；CSV 后端按已有表头
+    对齐列后追加行，不会读出已有数据。用于逐块写出，避免整表驻留内存。
+    """
+    stem = table_stem(path)
+    backend = backend or BACKEND
+    parent = os.path.dirname(stem)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+    if backend == 'csv':
+        target = f'{stem}.csv'
+        size = os.path.getsize(target) if os.path.isfile(target) else 0
+        if size:
+            header = pd.read_csv(target, nrows=0).columns
+            df.reindex(columns=header).to_csv(target, mode='a', header=False, index=False)
+        else:
+            df.to_csv(target, index=False)
+        instrumentation.count(rows_written=len(df), bytes_written=os.path.getsize(target) - size)
+        return target
+
+    if not partition_cols:
+        raise ValueError("Parquet 后端追加写出需要指定 partition_cols")
+
+    target = stem
+    if os.path.isfile(f'{stem}.parquet'):
+        raise ValueError(f"数据表 {stem} 为单个 Parquet 文件，无法按分区追加")
+    _write_dataset(_to_arrow(df), target, partition_cols)
+    return target
+
+def update_partitions(df, path, partition_col, replace_values, backend=None):
+    """
+    用 df 替换数据表中 partition_col 取值在 replace_values 内的分区，其余分区保持不变。
+
+    df 可以为 None（只删除分区）。按分区存储的 Parquet 表只改写涉及的分区目录，新分区写完后才替换旧分区；
+    其他情况读出未变化的部分后整表重写（同样先写临时文件）。返回实际写出的路径。
+    """
+    stem = table_stem(path)
+    backend = backend or BACKEND
+    existing_backend, target = resolve_table(path, backend)
+
+    if backend == 'parquet' and existing_backend == 'parquet' and os.path.isdir(target):
+        # 新分区先写到表目录之外的临时目录，再逐个分区换入：旧分区目录移到临时目录中，新分区目录重命名到位，
+        # 最后随临时目录一起删除。写出新分区时失败不会改动表目录
+        tmp_target = _tmp_path(target)
+        new_partitions = []
+        if df is not None and len(df):
+            _write_dataset(_to_arrow(df), tmp_target, [partition_col])
+            new_partitions = os.listdir(tmp_target)
+        replaced = os.path.join(tmp_target, 'replaced')
+        os.makedirs(replaced)
+        for name in sorted(set(new_partitions) | {f'{partition_col}={value}' for value in replace_values}):
+            if os.path.exists(os.path.join(target, name)):
+                os.replace(os.path.join(target, name), os.path.join(replaced, name))
+            if name in new_partitions:
+                os.replace(os.path.join(tmp_target, name), os.path.join(target, name))
+        _remove(tmp_target)
+        return target
+
+    parts = []
+    if target is not None:
+        parts.append(read_table(path, filters=[(partition_col, 'not in', list(replace_values))]))
+    if df is not None:
+        parts.append(df)
+    if not parts:
+        return None
+    combined = pd.concat(parts, ignore_index=True)
+    combined = combined.sort_values(partition_col, kind='stable', ignore_index=True)
+    return write_table(combined, stem, partition_cols=[partition_col], backend=backend)
+
+def _arrow_filter(filters):
+    import pyarrow.dataset as ds
+
+    expression = None
+    for column, op, value in filters:
+        field = ds.field(column)
+        if op == 'in':
+            condition = field.isin(list(value))
+        elif op == 'not in':
+            condition = ~field.isin(list(value))
+        else:
+            condition = _OPS[op](field, value)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def read_table(path, columns=None, filters=None, backend=None):
+    """
+    读取数据表，支持列裁剪（columns）和过滤条件下推（filters）。
+
+    filters 示例：[('报告期', '>=', 20190101)]。Parquet 后端在扫描时跳过不满足条件的分区和行组，
+    CSV 后端只解析需要的列，读取后再过滤。
+    """
+    backend, target = resolve_table(path, backend)
+    if target is None:
+        raise FileNotFoundError(f"数据表 {table_stem(path)} 不存在")
+    filters = filters or []
+
+    if backend == 'csv':
+        needed = None
+        if columns is not None:
+            needed = set(columns) | {column for column, _, _ in filters}
+        # round_trip 保证 to_csv 写出的浮点数读回后逐位相同（默认的解析器末位可能有误差）
+        df = pd.read_csv(target, dtype={'股票代码': str}, float_precision='round_trip',
+                         usecols=(lambda c: c in needed) if needed is not None else None)
+        instrumentation.count(rows_read=len(df), bytes_read=os.path.getsize(target))
+        for column, op, value in filters:
+            df = df[_OPS[op](df[column], value)]
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df.reset_index(drop=True)
+
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(target, format='parquet', partitioning='hive' if os.path.isdir(target) else None)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    expression = _arrow_filter(filters) if filters else None
+    table = dataset.to_table(columns=columns, filter=expression)
+    if instrumentation.current_stage() is not None:
+        # 读取的字节数按分区裁剪后实际扫描的文件大小计算
+        instrumentation.count(rows_read=table.num_rows,
+                              bytes_read=sum(os.path.getsize(fragment.path)
+                                             for fragment in dataset.get_fragments(filter=expression)))
+    return table.to_pandas()
+
+def as_frame(source, columns=None, filters=None):
+    """
+    将数据源统一为 DataFrame：source 可以是表路径，也可以是上游阶段在内存中传来的 DataFrame。
+
+    DataFrame 会被复制一份，调用方可以放心地原地修改。
+    """
+    if not isinstance(source, pd.DataFrame):
+        return read_table(source, columns=columns, filters=filters)
+    df = source
+    for column, op, value in filters or []:
+        df = df[_OPS[op](df[column], value)]
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df.reset_index(drop=True) if filters else df.copy()
+
+def export_csv(path, output_file=None, columns=None, filters=None):
+    """
+    将数据表导出为 CSV 文件，默认与表同名。
+    """
+    output_file = output_file or f'{table_stem(path)}.csv'
+    df = read_table(path, columns=columns, filters=filters)
+    df.to_csv(output_file, index=False)
+    print(f"数据表 {table_stem(path)} 已导出至 {output_file}")
+    return output_file
+
+if __name__ == "__main__":
+    # 用法：python src/storage.py <表路径> [输出CSV文件]
+    export_csv(*sys.argv[1:3])
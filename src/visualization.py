@@ -2,326 +2,210 @@
 
 import sys
 import os
+import json
+import hashlib
+import inspect
+from concurrent.futures import ProcessPoolExecutor
 
 # 添加项目根目录到 sys.path
 sys.path.append('.')
 
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.figure import Figure
 from matplotlib.font_manager import FontProperties
-from config import COMPANY_CODES, STATEMENT_CONFIG
+from config import COMPANY_CODES, STATEMENT_TYPES, FONT_PATH, VISUALIZATION_WORKERS
+import normalize
+import company_data
+
+# 解决负号显示问题
+matplotlib.rcParams['axes.unicode_minus'] = False
+
+# 各报表的图表定义：每张图的文件名、标题、纵轴标签和指标列，output 为文件名中公司名称之后的部分
+CHART_SPECS = {
+    'income_statement': [
+        {'output': '营业收入变化趋势', 'title': '营业收入变化趋势', 'ylabel': '营业收入（单位：万元）',
+         'indicators': ['营业收入']},
+        {'output': '财务比率指标变化趋势', 'title': '财务比率指标变化趋势', 'ylabel': '比率（单位：小数）',
+         'indicators': ['毛利率', '费用率', '营业利润率', '毛利润费用占比']},
+    ],
+    'cash_flow_statement': [
+        # 标记 y=0 的水平线
+        {'output': '现金流量指标变化趋势', 'title': '现金流量指标变化趋势', 'ylabel': '现金流量净额（单位：万元）',
+         'indicators': ['经营活动现金流净额', '投资活动现金流净额', '融资活动现金流净额', '自有经营现金净额'],
+         'zero_line': True},
+    ],
+    'balance_sheet': [
+        {'output': '资产负债权益变化趋势', 'title': '资产、负债、股东权益变化趋势', 'ylabel': '金额（单位：万元）',
+         'indicators': ['资产总额', '负债总额', '股东权益']},
+        {'output': '资产负债表比率指标变化趋势', 'title': '财务比率指标变化趋势', 'ylabel': '比率（单位：小数）',
+         'indicators': ['资产负债率', '产权比率', '流动比率', '速动比率', '现金比率']},
+    ],
+    'dividend': [
+        {'output': '每股股利变化趋势', 'title': '每股股利变化趋势', 'ylabel': '每股股利（单位：元）',
+         'indicators': ['每股股利']},
+        # 股息率单独绘制
+        {'output': '分红比例指标变化趋势', 'title': '分红比例指标变化趋势', 'ylabel': '比率（单位：小数）',
+         'indicators': ['股利支付率', '股息覆盖率', '分红增长率']},
+        {'output': '股息率变化趋势', 'title': '股息率变化趋势', 'ylabel': '股息率（单位：小数）',
+         'indicators': ['股息率'], 'color': 'green'},
+    ],
+}
+
+def _font():
+    # 字体文件不存在时（如非 macOS 系统）使用 matplotlib 默认字体
+    return FontProperties(fname=FONT_PATH) if os.path.exists(FONT_PATH) else FontProperties()
+
+def draw_chart(company, df_company, chart, output_image, font_prop):
+    """
+    绘制一张公司指标的时间序列图并保存。
 
-def visualize_income_statement(input_file, company_codes=None, company_names=None):
+    使用独立的 Figure 对象和 Agg 画布，不经过 pyplot 的全局状态，图表保存后即可被回收，
+    不会随公司数量累积内存，也不会弹出窗口阻塞。
     """
-    对指定公司，绘制利润表财务指标的时间序列图。
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    for indicator in chart['indicators']:
+        ax.plot(df_company['报告期'], df_company[indicator], marker='o', label=indicator,
+                color=chart.get('color'))
+    if chart.get('zero_line'):
+        ax.axhline(y=0, color='black', linestyle='--', linewidth=1)
+    ax.set_title(f"{company} {chart['title']}", fontproperties=font_prop)
+    ax.set_xlabel('报告期', fontproperties=font_prop)
+    ax.set_ylabel(chart['ylabel'], fontproperties=font_prop)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend(prop=font_prop)
+    fig.tight_layout()
+    fig.savefig(output_image)
+
+def _render_cache_file(company_dir, statement_type):
+    return os.path.join(company_dir, f'.render_cache_{statement_type}.json')
+
+def _chart_digest(df_company, chart, code_digest):
     """
-    df = pd.read_csv(input_file, dtype={'股票代码': str})
-
-    # 确保股票代码长度为6位，填充前导零
-    df['股票代码'] = df['股票代码'].apply(lambda x: x.zfill(6))
-
-    # 设置字体和处理负号显示
-    plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-
-    # 指定字体路径（请根据你的系统调整路径）
-    font_path = '/System/Library/Fonts/PingFang.ttc'  # macOS 苹方字体路径
-    font_prop = FontProperties(fname=font_path)
+    计算图表的摘要：绘图数据、图表定义和绘图代码任一变化都需要重新绘制。
+    """
+    data = df_company[['报告期'] + chart['indicators']]
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    digest.update(json.dumps(chart, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    digest.update(code_digest.encode('utf-8'))
+    return digest.hexdigest()
+
+def render_company(company, slices, use_cache=True):
+    """
+    绘制一家公司多张报表的全部图表，数据未变化且图片已存在的图表跳过。
 
-    # 确保日期列为字符串类型，便于排序
-    df['报告期'] = df['报告期'].astype(str)
+    slices 为 {报表类型: 该公司按报告期排序的数据}。返回 (已绘制数, 已跳过数)。在进程池的工作进程中执行。
+    """
+    # 创建以公司名称命名的文件夹
+    company_dir = os.path.join('data', 'analysis', company)
+    os.makedirs(company_dir, exist_ok=True)
+
+    code_digest = hashlib.sha256(inspect.getsource(draw_chart).encode('utf-8')).hexdigest()
+    font_prop = None
+    rendered = skipped = 0
+    for statement_type, df_company in slices.items():
+        cache_file = _render_cache_file(company_dir, statement_type)
+        cache = {}
+        if use_cache and os.path.exists(cache_file):
+            with open(cache_file, encoding='utf-8') as f:
+                cache = json.load(f)
+
+        updated = False
+        for chart in CHART_SPECS[statement_type]:
+            output_image = os.path.join(company_dir, f"{company}_{chart['output']}.png")
+            digest = _chart_digest(df_company, chart, code_digest)
+            if cache.get(chart['output']) == digest and os.path.exists(output_image):
+                skipped += 1
+                continue
+            font_prop = font_prop or _font()
+            draw_chart(company, df_company, chart, output_image, font_prop)
+            cache[chart['output']] = digest
+            rendered += 1
+            updated = True
+            print(f"可视化完成，图表保存至 {output_image}")
+
+        if updated:
+            tmp_file = f'{cache_file}.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_file, cache_file)
+    return rendered, skipped
+
+def visualize_companies(company_codes=None, company_names=None, statement_types=STATEMENT_TYPES, dataset=None,
+                        workers=VISUALIZATION_WORKERS, use_cache=True):
+    """
+    批量绘制指定公司多张报表的图表，各公司在进程池中并行绘制。
 
-    # 指标列表
-    revenue_indicator = ['营业收入']
-    ratio_indicators = ['毛利率', '费用率', '营业利润率', '毛利润费用占比']
+    dataset 为共享的 CompanyDataset，每张分析表只读取一次，各公司的数据通过股票代码索引直接取出。
+    图表保存至 data/analysis/<公司简称>/<公司简称>_<图表名>.png。返回 (已绘制数, 已跳过数)。
+    """
+    if not company_codes and not company_names:
+        print("请指定公司代码列表或公司名称列表。")
+        return 0, 0
+    dataset = dataset or company_data.CompanyDataset(company_codes=company_codes)
 
-    # 如果指定了公司代码，按照代码筛选
+    # 股票简称可能变更或重名，统一转换为股票代码后再按代码取数据
     if company_codes:
-        df_selected = df[df['股票代码'].isin(company_codes)]
-    elif company_names:
-        df_selected = df[df['股票简称'].isin(company_names)]
+        codes = list(normalize.normalize_stock_codes(company_codes))
     else:
-        print("请指定公司代码列表或公司名称列表。")
-        return
-
-    # 按照报告期排序
-    df_selected.sort_values(by='报告期', inplace=True)
-
-    for company in df_selected['股票简称'].unique():
-        df_company = df_selected[df_selected['股票简称'] == company]
+        codes = []
+        for statement_type in statement_types:
+            codes += [code for code in dataset.codes_for_names(company_names, statement_type) if code not in codes]
+
+    tasks = []
+    for code in codes:
+        slices = {}
+        for statement_type in statement_types:
+            df_company = dataset.company(statement_type, code)
+            if df_company is not None and not df_company.empty:
+                # 确保日期列为字符串类型，图表横轴按报告期顺序排列
+                slices[statement_type] = df_company.assign(报告期=df_company['报告期'].astype(str))
+        if slices:
+            tasks.append((dataset.display_name(code), slices, use_cache))
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        results = [render_company(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(render_company, *zip(*tasks)))
 
-        # 创建以公司名称命名的文件夹
-        company_dir = os.path.join('data', 'analysis', company)
-        os.makedirs(company_dir, exist_ok=True)
+    rendered = sum(r for r, _ in results)
+    skipped = sum(s for _, s in results)
+    print(f"{', '.join(statement_types)} 图表绘制完成：{len(tasks)} 家公司，绘制 {rendered} 张，未变化跳过 {skipped} 张")
+    return rendered, skipped
 
-        # 绘制营业收入的变化趋势
-        plt.figure(figsize=(12, 6))
-        plt.plot(df_company['报告期'], df_company['营业收入'], marker='o', label='营业收入')
-        plt.title(f'{company} 营业收入变化趋势', fontproperties=font_prop)
-        plt.xlabel('报告期', fontproperties=font_prop)
-        plt.ylabel('营业收入（单位：万元）', fontproperties=font_prop)
-        plt.xticks(rotation=45)
-        plt.legend(prop=font_prop)
-        plt.tight_layout()
-        output_image = os.path.join(company_dir, f'{company}_营业收入变化趋势.png')
-        plt.savefig(output_image)
-        plt.show()
-        print(f"可视化完成，图表保存至 {output_image}")
+def _visualize_statement(statement_type, input_file, company_codes, company_names, dataset=None, **kwargs):
+    dataset = dataset or company_data.CompanyDataset({statement_type: input_file}, company_codes)
+    return visualize_companies(company_codes, company_names, [statement_type], dataset, **kwargs)
 
-        # 绘制比值指标的变化趋势
-        plt.figure(figsize=(12, 6))
-        for indicator in ratio_indicators:
-            plt.plot(df_company['报告期'], df_company[indicator], marker='o', label=indicator)
-        plt.title(f'{company} 财务比率指标变化趋势', fontproperties=font_prop)
-        plt.xlabel('报告期', fontproperties=font_prop)
-        plt.ylabel('比率（单位：小数）', fontproperties=font_prop)
-        plt.xticks(rotation=45)
-        plt.legend(prop=font_prop)
-        plt.tight_layout()
-        output_image = os.path.join(company_dir, f'{company}_财务比率指标变化趋势.png')
-        plt.savefig(output_image)
-        plt.show()
-        print(f"可视化完成，图表保存至 {output_image}")
+def visualize_income_statement(input_file, company_codes=None, company_names=None, **kwargs):
+    """
+    对指定公司，绘制利润表财务指标的时间序列图。
+    """
+    return _visualize_statement('income_statement', input_file, company_codes, company_names, **kwargs)
 
-def visualize_cash_flow_statement(input_file, company_codes=None, company_names=None):
+def visualize_cash_flow_statement(input_file, company_codes=None, company_names=None, **kwargs):
     """
     对指定公司，绘制现金流量指标的时间序列图。
     """
-    df = pd.read_csv(input_file, dtype={'股票代码': str})
-
-    # 确保股票代码长度为6位，填充前导零
-    df['股票代码'] = df['股票代码'].apply(lambda x: x.zfill(6))
-
-    # 设置字体和处理负号显示
-    plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-
-    # 指定字体路径（请根据你的系统调整路径）
-    font_path = '/System/Library/Fonts/PingFang.ttc'  # macOS 苹方字体路径
-    font_prop = FontProperties(fname=font_path)
-
-    # 确保日期列为字符串类型，便于排序
-    df['报告期'] = df['报告期'].astype(str)
-
-    # 指标列表，添加“自有经营现金净额”
-    cash_flow_indicators = ['经营活动现金流净额', '投资活动现金流净额', '融资活动现金流净额', '自有经营现金净额']
-
-    # 如果指定了公司代码，按照代码筛选
-    if company_codes:
-        df_selected = df[df['股票代码'].isin(company_codes)]
-    elif company_names:
-        df_selected = df[df['股票简称'].isin(company_names)]
-    else:
-        print("请指定公司代码列表或公司名称列表。")
-        return
-
-    # 按照报告期排序
-    df_selected.sort_values(by='报告期', inplace=True)
-
-    for company in df_selected['股票简称'].unique():
-        df_company = df_selected[df_selected['股票简称'] == company]
-
-        # 创建以公司名称命名的文件夹
-        company_dir = os.path.join('data', 'analysis', company)
-        os.makedirs(company_dir, exist_ok=True)
-
-        # 绘制现金流量指标的变化趋势
-        plt.figure(figsize=(12, 6))
-
-        for indicator in cash_flow_indicators:
-            plt.plot(df_company['报告期'], df_company[indicator], marker='o', label=indicator)
-
-        # 标记 y=0 的水平线
-        plt.axhline(y=0, color='black', linestyle='--', linewidth=1)
+    return _visualize_statement('cash_flow_statement', input_file, company_codes, company_names, **kwargs)
 
-        plt.title(f'{company} 现金流量指标变化趋势', fontproperties=font_prop)
-        plt.xlabel('报告期', fontproperties=font_prop)
-        plt.ylabel('现金流量净额（单位：万元）', fontproperties=font_prop)
-        plt.xticks(rotation=45)
-        plt.legend(prop=font_prop)
-        plt.tight_layout()
-        output_image = os.path.join(company_dir, f'{company}_现金流量指标变化趋势.png')
-        plt.savefig(output_image)
-        plt.show()
-        print(f"可视化完成，图表保存至 {output_image}")
-
-def visualize_balance_sheet(input_file, company_codes=None, company_names=None):
+def visualize_balance_sheet(input_file, company_codes=None, company_names=None, **kwargs):
     """
     对指定公司，绘制资产负债表财务指标的时间序列图。
     """
-    df = pd.read_csv(input_file, dtype={'股票代码': str})
-
-    # 确保股票代码长度为6位，填充前导零
-    df['股票代码'] = df['股票代码'].apply(lambda x: x.zfill(6))
-
-    # 设置字体和处理负号显示
-    plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-
-    # 指定字体路径（请根据你的系统调整路径）
-    font_path = '/System/Library/Fonts/PingFang.ttc'  # macOS 苹方字体路径
-    font_prop = FontProperties(fname=font_path)
-
-    # 确保日期列为字符串类型，便于排序
-    df['报告期'] = df['报告期'].astype(str)
+    return _visualize_statement('balance_sheet', input_file, company_codes, company_names, **kwargs)
 
-    # 指标列表
-    amount_indicators = ['资产总额', '负债总额', '股东权益']
-    ratio_indicators = ['资产负债率', '产权比率', '流动比率', '速动比率', '现金比率']
-
-    # 如果指定了公司代码，按照代码筛选
-    if company_codes:
-        df_selected = df[df['股票代码'].isin(company_codes)]
-    elif company_names:
-        df_selected = df[df['股票简称'].isin(company_names)]
-    else:
-        print("请指定公司代码列表或公司名称列表。")
-        return
-
-    # 按照报告期排序
-    df_selected.sort_values(by='报告期', inplace=True)
-
-    for company in df_selected['股票简称'].unique():
-        df_company = df_selected[df_selected['股票简称'] == company]
-
-        # 创建以公司名称命名的文件夹
-        company_dir = os.path.join('data', 'analysis', company)
-        os.makedirs(company_dir, exist_ok=True)
-
-        # 绘制金额指标的变化趋势
-        plt.figure(figsize=(12, 6))
-        for indicator in amount_indicators:
-            plt.plot(df_company['报告期'], df_company[indicator], marker='o', label=indicator)
-        plt.title(f'{company} 资产、负债、股东权益变化趋势', fontproperties=font_prop)
-        plt.xlabel('报告期', fontproperties=font_prop)
-        plt.ylabel('金额（单位：万元）', fontproperties=font_prop)
-        plt.xticks(rotation=45)
-        plt.legend(prop=font_prop)
-        plt.tight_layout()
-        output_image = os.path.join(company_dir, f'{company}_资产负债权益变化趋势.png')
-        plt.savefig(output_image)
-        plt.show()
-        print(f"可视化完成，图表保存至 {output_image}")
-
-        # 绘制比率指标的变化趋势
-        plt.figure(figsize=(12, 6))
-        for indicator in ratio_indicators:
-            plt.plot(df_company['报告期'], df_company[indicator], marker='o', label=indicator)
-        plt.title(f'{company} 财务比率指标变化趋势', fontproperties=font_prop)
-        plt.xlabel('报告期', fontproperties=font_prop)
-        plt.ylabel('比率（单位：小数）', fontproperties=font_prop)
-        plt.xticks(rotation=45)
-        plt.legend(prop=font_prop)
-        plt.tight_layout()
-        output_image = os.path.join(company_dir, f'{company}_资产负债表比率指标变化趋势.png')
-        plt.savefig(output_image)
-        plt.show()
-        print(f"可视化完成，图表保存至 {output_image}")
-
-def visualize_dividend(input_file, company_codes=None, company_names=None):
+def visualize_dividend(input_file, company_codes=None, company_names=None, **kwargs):
     """
     对指定公司，绘制分红指标的时间序列图。
     """
-    df = pd.read_csv(input_file, dtype={'股票代码': str})
-
-    # 确保股票代码长度为6位，填充前导零
-    df['股票代码'] = df['股票代码'].apply(lambda x: x.zfill(6))
-
-    # 设置字体和处理负号显示
-    plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-
-    # 指定字体路径（请根据你的系统调整路径）
-    font_path = '/System/Library/Fonts/PingFang.ttc'  # macOS 苹方字体路径
-    font_prop = FontProperties(fname=font_path)
-
-    # 确保日期列为字符串类型，便于排序
-    df['报告期'] = df['报告期'].astype(str)
-
-    # 指标列表
-    dividend_per_share_indicator = ['每股股利']
-    ratio_indicators = ['股利支付率', '股息率', '股息覆盖率', '分红增长率']
-
-    # 如果指定了公司代码，按照代码筛选
-    if company_codes:
-        df_selected = df[df['股票代码'].isin(company_codes)]
-    elif company_names:
-        df_selected = df[df['股票简称'].isin(company_names)]
-    else:
-        print("请指定公司代码列表或公司名称列表。")
-        return
-
-    # 按照报告期排序
-    df_selected.sort_values(by='报告期', inplace=True)
-
-    for company in df_selected['股票简称'].unique():
-        df_company = df_selected[df_selected['股票简称'] == company]
-
-        # 创建以公司名称命名的文件夹
-        company_dir = os.path.join('data', 'analysis', company)
-        os.makedirs(company_dir, exist_ok=True)
-
-        # 绘制每股股利的变化趋势
-        plt.figure(figsize=(12, 6))
-        plt.plot(df_company['报告期'], df_company['每股股利'], marker='o', label='每股股利')
-        plt.title(f'{company} 每股股利变化趋势', fontproperties=font_prop)
-        plt.xlabel('报告期', fontproperties=font_prop)
-        plt.ylabel('每股股利（单位：元）', fontproperties=font_prop)
-        plt.xticks(rotation=45)
-        plt.legend(prop=font_prop)
-        plt.tight_layout()
-        output_image = os.path.join(company_dir, f'{company}_每股股利变化趋势.png')
-        plt.savefig(output_image)
-        plt.show()
-        print(f"可视化完成，图表保存至 {output_image}")
-
-        # 绘制比例指标的变化趋势
-        plt.figure(figsize=(12, 6))
-        for indicator in ratio_indicators:
-            if indicator != '股息率':
-                plt.plot(df_company['报告期'], df_company[indicator], marker='o', label=indicator)
-        plt.title(f'{company} 分红比例指标变化趋势', fontproperties=font_prop)
-        plt.xlabel('报告期', fontproperties=font_prop)
-        plt.ylabel('比率（单位：小数）', fontproperties=font_prop)
-        plt.xticks(rotation=45)
-        plt.legend(prop=font_prop)
-        plt.tight_layout()
-        output_image = os.path.join(company_dir, f'{company}_分红比例指标变化趋势.png')
-        plt.savefig(output_image)
-        plt.show()
-        print(f"可视化完成，图表保存至 {output_image}")
-
-        # 单独绘制股息率的变化趋势
-        plt.figure(figsize=(12, 6))
-        plt.plot(df_company['报告期'], df_company['股息率'], marker='o', label='股息率', color='green')
-        plt.title(f'{company} 股息率变化趋势', fontproperties=font_prop)
-        plt.xlabel('报告期', fontproperties=font_prop)
-        plt.ylabel('股息率（单位：小数）', fontproperties=font_prop)
-        plt.xticks(rotation=45)
-        plt.legend(prop=font_prop)
-        plt.tight_layout()
-        output_image = os.path.join(company_dir, f'{company}_股息率变化趋势.png')
-        plt.savefig(output_image)
-        plt.show()
-        print(f"可视化完成，图表保存至 {output_image}")
-
+    return _visualize_statement('dividend', input_file, company_codes, company_names, **kwargs)
 
 
 if __name__ == "__main__":
-    '''
-    # 可视化利润表
-    config = STATEMENT_CONFIG['income_statement']
-    input_file = os.path.join('data', 'analysis', config['analysis_file'])
-    visualize_income_statement(input_file, company_codes=COMPANY_CODES)
-
-    # 可视化现金流量表
-    config = STATEMENT_CONFIG['cash_flow_statement']
-    input_file = os.path.join('data', 'analysis', config['analysis_file'])
-    visualize_cash_flow_statement(input_file, company_codes=COMPANY_CODES)
-
-    # 可视化资产负债表
-    config = STATEMENT_CONFIG['balance_sheet']
-    input_file = os.path.join('data', 'analysis', config['analysis_file'])
-    visualize_balance_sheet(input_file, company_codes=COMPANY_CODES)
-    '''
-
-     # 可视化分红数据
-    config = STATEMENT_CONFIG['dividend']
-    input_file = os.path.join('data', 'analysis', config['analysis_file'])
-    visualize_dividend(input_file, company_codes=COMPANY_CODES)
\ No newline at end of file
+    # 一次绘制指定公司全部报表的图表，每张分析表只读取一次
+    visualize_companies(company_codes=COMPANY_CODES)
@@ -0,0 +1,10 @@
+# tests/conftest.py
+
+import sys
+import os
+
+# 添加项目根目录、src 和 benchmarks 目录到 sys.path（测试复用 benchmarks 中的合成数据和比较函数）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'src'), os.path.join(ROOT, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.append(path)
@@ -0,0 +1,119 @@
+# tests/test_data_fetch.py
+#
+# 数据获取的并发与重试测试：在 sys.modules 中放入替身 akshare 模块（固定延迟，返回合成数据，不访问网络），
+# 检查每个接口的同时调用数不超过 fetch_concurrency，以及失败调用按 FETCH_RETRIES 重试的次数。
+
+import sys
+import time
+import types
+import threading
+
+import pytest
+
+import synthetic
+import data_fetch
+import manifest
+import response_cache
+from config import STATEMENT_CONFIG, STATEMENT_TYPES
+
+class StubAkshare(types.ModuleType):
+    """
+    替身 akshare 模块：记录各接口同时执行的调用数的峰值、第一次调用返回之前的合计峰值和每个报告期的调用次数，
+    failures 为 {(接口名, 报告期): 前几次调用失败的次数}。
+    """
+
+    def __init__(self, latency=0.05, n_stocks=20, failures=None):
+        super().__init__('akshare')
+        self.latency = latency
+        self.failures = dict(failures or {})
+        self.calls = {}
+        self.current = {}
+        self.peak = {}
+        self.total = 0
+        self.total_peak = 0
+        self.initial_peak = 0
+        self.returned = False
+        self._lock = threading.Lock()
+        for statement_type in STATEMENT_TYPES:
+            name = STATEMENT_CONFIG[statement_type]['fetch_function']
+            setattr(self, name, self._endpoint(name, statement_type, n_stocks))
+
+    def _endpoint(self, name, statement_type, n_stocks):
+        def fetch(date):
+            with self._lock:
+                self.calls[(name, date)] = self.calls.get((name, date), 0) + 1
+                attempt = self.calls[(name, date)]
+                self.current[name] = self.current.get(name, 0) + 1
+                self.peak[name] = max(self.peak.get(name, 0), self.current[name])
+                self.total += 1
+                self.total_peak = max(self.total_peak, self.total)
+                if not self.returned:
+                    self.initial_peak = max(self.initial_peak, self.total)
+            try:
+                time.sleep(self.latency)
+                if attempt <= self.failures.get((name, date), 0):
+                    raise ConnectionError(f"{name}({date}) 第 {attempt} 次调用失败")
+                return synthetic.generate_statement(statement_type, date, n_stocks)
+            finally:
+                with self._lock:
+                    self.current[name] -= 1
+                    self.total -= 1
+                    self.returned = True
+        fetch.__name__ = name
+        return fetch
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(response_cache, 'MODE', 'off')
+    return tmp_path
+
+def install(monkeypatch, stub):
+    monkeypatch.setitem(sys.modules, 'akshare', stub)
+    return stub
+
+def test_per_endpoint_concurrency(workdir, monkeypatch):
+    stub = install(monkeypatch, StubAkshare())
+    report_dates = synthetic.make_report_dates(12, quarterly=True)
+    results = data_fetch.fetch_all_statements(report_dates, STATEMENT_TYPES, max_workers=32, force=True)
+
+    limits = {STATEMENT_CONFIG[st]['fetch_function']: STATEMENT_CONFIG[st]['fetch_concurrency'] for st in STATEMENT_TYPES}
+    units = {st: len(data_fetch.get_fetch_dates(report_dates, st)) for st in STATEMENT_TYPES}
+    assert len(results) == sum(units.values())
+    for statement_type in STATEMENT_TYPES:
+        name = STATEMENT_CONFIG[statement_type]['fetch_function']
+        # 不超过接口的并发上限，且单元足够多时能用满上限
+        assert stub.peak[name] == min(limits[name], units[statement_type])
+    # 各接口同时执行，总并发为各接口上限之和
+    assert stub.total_peak == sum(min(limits[STATEMENT_CONFIG[st]['fetch_function']], units[st])
+                                  for st in STATEMENT_TYPES)
+
+@pytest.mark.parametrize('max_workers', [3, 8])
+def test_max_workers_caps_total(workdir, monkeypatch, max_workers):
+    stub = install(monkeypatch, StubAkshare())
+    report_dates = synthetic.make_report_dates(12, quarterly=True)
+    data_fetch.fetch_all_statements(report_dates, STATEMENT_TYPES, max_workers=max_workers, force=True)
+    assert stub.total_peak == max_workers
+    # 线程池一启动就占满：没有线程占着池中的位置等待某个接口的名额
+    assert stub.initial_peak == max_workers
+
+def test_retry_count(workdir, monkeypatch):
+    name = STATEMENT_CONFIG['income_statement']['fetch_function']
+    report_dates = synthetic.make_report_dates(2)
+    stub = install(monkeypatch, StubAkshare(latency=0, failures={(name, report_dates[0]): 2}))
+    results = data_fetch.fetch_all_statements(report_dates, ['income_statement'], retries=3, backoff=0, force=True)
+
+    attempts = {result['report_date']: result['attempts'] for result in results}
+    assert attempts == {report_dates[0]: 3, report_dates[1]: 1}
+    assert stub.calls[(name, report_dates[0])] == 3
+
+def test_retries_exhausted(workdir, monkeypatch):
+    name = STATEMENT_CONFIG['income_statement']['fetch_function']
+    report_dates = synthetic.make_report_dates(2)
+    stub = install(monkeypatch, StubAkshare(latency=0, failures={(name, report_dates[0]): 10}))
+    with pytest.raises(RuntimeError):
+        data_fetch.fetch_all_statements(report_dates, ['income_statement'], retries=2, backoff=0, force=True)
+
+    # 首次调用加 retries 次重试后放弃，失败的单元记入检查点，--resume 时只重试它
+    assert stub.calls[(name, report_dates[0])] == 3
+    assert manifest.remaining_units(['income_statement']) == [('income_statement', report_dates[0])]
@@ -0,0 +1,73 @@
+# tests/test_engine_parity.py
+#
+# pandas 与 polars 执行引擎的小规模一致性测试：与 benchmarks/engine_parity.py 使用同样的合成数据、
+# 扰动和比较规则，修改 analysis.py、periods.py 等共用逻辑时可以及时发现两种引擎的结果不再一致。
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('polars')
+
+import synthetic
+import engine_parity
+
+N_STOCKS = 200
+N_PERIODS = 8
+
+@pytest.fixture
+def raw_dates(tmp_path, monkeypatch):
+    """
+    在 tmp_path/source 下生成扰动后的合成原始数据，返回生成函数：参数为是否使用季度报告期。
+    """
+    def make(quarterly):
+        report_dates = synthetic.make_report_dates(N_PERIODS, quarterly)
+        source = tmp_path / 'source'
+        source.mkdir()
+        monkeypatch.chdir(source)
+        synthetic.write_raw_dataset(report_dates, N_STOCKS)
+        engine_parity.perturb_raw(report_dates)
+        return report_dates
+    return make
+
+def run_engines(tmp_path, monkeypatch, report_dates):
+    """
+    在各引擎自己的目录中运行清洗、分析、宽表和选股，返回 {引擎: 目录}。
+    """
+    dirs = {}
+    for engine in engine_parity.ENGINES:
+        dirs[engine] = str(tmp_path / engine)
+        shutil.copytree(tmp_path / 'source' / 'data' / 'raw', os.path.join(dirs[engine], 'data', 'raw'))
+        monkeypatch.chdir(dirs[engine])
+        engine_parity.run_engine(engine, report_dates)
+    return dirs
+
+@pytest.mark.parametrize('quarterly', [False, True], ids=['annual', 'quarterly'])
+def test_engines_match(tmp_path, monkeypatch, raw_dates, quarterly):
+    dirs = run_engines(tmp_path, monkeypatch, raw_dates(quarterly))
+    differences = engine_parity.compare_outputs(dirs)
+    assert {table: problems for table, problems in differences.items() if problems} == {}
+
+def test_select_without_complete_rows(tmp_path, monkeypatch, raw_dates):
+    import storage
+    import fact_table
+    import stock_selection
+    import lazy_engine
+
+    dirs = run_engines(tmp_path, monkeypatch, raw_dates(False))
+    monkeypatch.chdir(dirs['pandas'])
+    facts = storage.read_table(fact_table.FACT_TABLE)
+    facts['股息率'] = np.nan
+    storage.write_table(facts, 'data/analysis/facts_no_dividend', partition_cols=['报告期'])
+
+    criteria = [('营业收入', '>=', 0), ('股息率', '>=', 0)]
+    results = [select('data/analysis/facts_no_dividend', output_file=f'data/analysis/{name}.csv', criteria=criteria)
+               for name, select in (('pandas', stock_selection.select_stocks), ('polars', lazy_engine.select_stocks))]
+    for selected_df in results:
+        assert selected_df.empty
+        assert list(selected_df.columns) == ['股票代码', '股票简称', '营业收入', '股息率', '满足条件次数']
+    expected, actual = (pd.read_csv(f'data/analysis/{name}.csv') for name in ('pandas', 'polars'))
+    assert engine_parity.compare_frames(expected, actual) == []